@@ -1,68 +1,193 @@
+"""
+The weather service's Flask app, built by create_app.
+
+Importing this module only defines the routes. Creating the app applies a configuration and
+registers the routes; the database schema, the prewarmer and the health prober are set up on the first request,
+or ahead of time with `flask --app app_init migrate`. Upstream clients and caches are created
+on first use. `app_init.app` is a default app built from APP_ENV on first access, for WSGI
+servers and scripts.
+"""
 from dotenv import load_dotenv
-from flask import Flask, jsonify, make_response, Response, request
+from flask import Blueprint, Flask, current_app, jsonify, make_response, Response, request, stream_with_context
+from flask.logging import default_handler
 from werkzeug.exceptions import BadRequest, Unauthorized
 from sqlalchemy.sql import text
-import sqlite3
-
-from config import ProductionConfig
-from db import db
+import hmac
+import math
+import json
+import threading
+
+from config import config_from_env, settings_from_env
+from db import configure_engines, db
+from utils import metrics
+from utils.circuit_breaker import CircuitOpenError
+from utils.logger import configure_logger
+from utils.tokens import get_token_signer
 from weather.models.account_model import User
+from weather.models.current_weather import weather_cache
 from weather.models.favorites_manager import FavoritesModel
-import requests
+from weather.models.forecast_store import forecast_store
+from weather.models.geo_index import get_geo_index
+from weather.models.location_index import get_location_index
+from weather.models.username_index import get_username_index
+from weather.clients.upstream_scheduler import UpstreamBusyError, get_upstream_breaker, get_upstream_scheduler
+from weather.health import HealthProber, health_prober_from_env
+from weather.prewarmer import prewarmer_from_env
 import os
 
-# Load environment variables from .env file
-load_dotenv()
 
-# Don't think we need these here
-api_key = os.getenv("API_KEY")
-weather_api = "http://api.weatherapi.com/v1"
+api = Blueprint('api', __name__)
 
-# Initialize SQLLite SQLAlchemy DB through Flask
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DB_URI")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
 
+def create_app(config: type | None = None) -> Flask:
+    """
+    Build the app. Nothing is read from the database or the upstream here.
 
+    Args:
+        config (type | None): the configuration class, by default the one named by APP_ENV.
 
+    Returns:
+        Flask: the app.
+    """
+    # Load environment variables from .env file
+    load_dotenv()
+    if config is None:
+        config = config_from_env()
+
+    app = Flask(__name__)
+    # Route logs through the shared pipeline instead of Flask's own stderr handler
+    app.logger.removeHandler(default_handler)
+    configure_logger(app.logger)
+
+    app.config.from_object(config)
+    for key, value in settings_from_env(config).items():
+        if app.config.get(key) is None:
+            app.config[key] = value
+    db.init_app(app)
+    configure_engines(app)
+
+    if metrics.metrics_enabled():
+        metrics.init_app(app)
+        metrics.instrument_sqlalchemy()
+
+    app.extensions['weather_startup'] = {'lock': threading.Lock(), 'done': False}
+    app.extensions['health_prober'] = health_prober_from_env(app)
+    app.before_request(ensure_started)
+    app.register_blueprint(api)
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Create any missing database tables."""
+        create_schema()
+
+    return app
+
+
+def create_schema() -> None:
+    """Create any missing database tables on the primary. Must run inside an app context."""
+    try:
+        # The read bind, if any, is a replica or another pool onto the primary
+        db.create_all(bind_key=None)
+    except Exception as e:
+        current_app.logger.error("Failed to create the database schema: %s", str(e))
 
 
+def ensure_started() -> None:
+    """
+    Run the app's deferred startup work once, before its first request: create the schema
+    unless AUTO_CREATE_SCHEMA is off, start the prewarmer if PREWARM_ENABLED is on, start the
+    health prober unless HEALTH_PROBE_ENABLED is off, and build the username index unless
+    USERNAME_INDEX_ENABLED is off. Must run inside an app context.
+    """
+    startup = current_app.extensions['weather_startup']
+    if startup['done']:
+        return
+    with startup['lock']:
+        if startup['done']:
+            return
+        if current_app.config['AUTO_CREATE_SCHEMA']:
+            create_schema()
+        # Keep favorited locations warm from inside this process. With several workers, prefer
+        # running `python -m weather.prewarmer` once instead.
+        if current_app.config['PREWARM_ENABLED']:
+            prewarmer_from_env(current_app._get_current_object()).start()
+        if current_app.config['HEALTH_PROBE_ENABLED']:
+            get_health_prober().start()
+        if current_app.config['USERNAME_INDEX_ENABLED']:
+            get_username_index().start(current_app._get_current_object())
+        startup['done'] = True
+
+
+_default_app: Flask | None = None
+_default_app_lock = threading.Lock()
+
+
+def get_app() -> Flask:
+    """
+    Get the default app, built from APP_ENV on first use.
+
+    Returns:
+        Flask: the default app.
+    """
+    global _default_app
+    if _default_app is None:
+        with _default_app_lock:
+            if _default_app is None:
+                _default_app = create_app()
+    return _default_app
+
+
+def get_health_prober() -> HealthProber:
+    """
+    Get the current app's health prober. Must run inside an app context.
+
+    Returns:
+        HealthProber: the prober whose results the health routes serve.
+    """
+    return current_app.extensions['health_prober']
+
+
+def __getattr__(name: str):
+    # `from app_init import app` and `gunicorn app_init:app` build the default app on first access
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-with app.app_context():
-    try:
-        db.create_all()
-    except Exception as e:
-        print(e)
-favorites_manager = FavoritesModel()
-        
 ####################################################
 #
 # Healthchecks
 #
 ####################################################
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
+@api.route('/api/health/ready', methods=['GET'])
 def healthcheck() -> Response:
     """
-    Health check route to verify the service is running.
+    Readiness route to verify the service can handle requests. Serves the health prober's last
+    result instead of calling the dependencies.
 
     Returns:
-        JSON response indicating the health status of the service.
+        JSON response with the overall status and each dependency's status and last check time.
+        503 if the database is down or nothing has been checked yet.
     """
-    app.logger.info('Initiating Health check')
-    try:
-        query = {"key": api_key, "q": "London"}
-        response = requests.get(weather_api + "/current.json", params = query, timeout = 5)
-        if response.status_code == 200:
-            return make_response(jsonify({'status': 'healthy'}), 200)
-        else:
-            return make_response(jsonify({'status': 'failed'}), 503)
-    except Exception as e:
-        return make_response(jsonify({'status': 'failed'}), 503)
-    
+    status, state = get_health_prober().readiness()
+    return make_response(jsonify(state), status)
+
+@api.route('/api/health/live', methods=['GET'])
+def liveness() -> Response:
+    """
+    Liveness route to verify the process is up, whatever the state of its dependencies.
+
+    Returns:
+        JSON response with each dependency's last known status and check time.
+        503 if the health prober has stalled.
+    """
+    status, state = get_health_prober().liveness()
+    return make_response(jsonify(state), status)
+
+
 # Don't think we need this either, it's not in the project description
-@app.route('/api/db-check', methods=['GET'])
+@api.route('/api/db-check', methods=['GET'])
 def db_check() -> Response:
     """
     Route to check if the database connection and meals table are functional.
@@ -72,68 +197,152 @@ def db_check() -> Response:
     Raises:
         404 error if there is an issue with the database.
     """
-    app.logger.info("Checking database connection...")
+    current_app.logger.info("Checking database connection...")
     try:
         db.session.execute(text("SELECT 1"))
-        app.logger.info("Database connection is OK.")
+        current_app.logger.info("Database connection is OK.")
         return make_response(jsonify({'database_status': 'healthy'}), 200)
     except Exception as e:
         return make_response(jsonify({'error': str(e)}), 404)
-    
-if __name__ == '__main__':
-    app.run(debug=True)
-    
+
+@api.route('/api/cache-stats', methods=['GET'])
+def cache_stats() -> Response:
+    """
+    Route to report the hit, miss and eviction counters of the weather and forecast caches.
+
+    Returns:
+        JSON response containing the cache statistics, including forecast memory per location, how
+        often coordinates were answered from a nearby observation, the upstream rate limit's queue
+        depth and wait times, and the upstream circuit breaker's state.
+    """
+    current_app.logger.info("Retrieving weather cache statistics")
+    return make_response(jsonify({'weather_cache': weather_cache.stats(), 'forecast_cache': forecast_store.stats(),
+                                  'location_index': get_location_index().stats(),
+                                  'geo_index': get_geo_index().stats(),
+                                  'username_index': get_username_index().stats(),
+                                  'upstream_scheduler': get_upstream_scheduler().stats(),
+                                  'upstream_breaker': get_upstream_breaker().stats()}), 200)
+
+
+@api.route('/api/metrics', methods=['GET'])
+def metrics_endpoint() -> Response:
+    """
+    Route to expose request, upstream and database metrics for Prometheus to scrape.
+
+    Returns:
+        Plain text response in the Prometheus text exposition format.
+    """
+    return Response(metrics.registry.expose(), content_type=metrics.CONTENT_TYPE)
+
+
+
 ####################################################
 #
 # Add User
 #
 ####################################################
 
-@app.route('/api/create-user', methods=['POST'])
+
+@api.route('/api/create-user', methods=['POST'])
 def create_user() -> Response:
-    app.logger.info('Adding new user')
+    current_app.logger.info('Adding new user')
 
     try:
         data = request.get_json()
         username = data.get('username')
         password = data.get('password')
-        if User.query.filter_by(username=username).first():
+        # The unique constraint rejects a taken username, so the insert is the only query
+        try:
+            User.create_user(username, password)
+        except ValueError:
             return make_response(jsonify({'error': 'Invalid username, username already taken'}), 400)
-        User.create_user(username, password)
         return make_response(jsonify({'status': 'success', 'username': username}), 200)
     except:
         return make_response(jsonify({"error": "An error occurred while creating the user"}), 500)
 
-@app.route('/api/remove-user', methods=['DELETE'])
+def get_token_claims() -> dict | None:
+    """
+    Get the claims of the session token sent in the Authorization header.
+
+    Returns:
+        dict | None: the verified claims, or None if the request carries no bearer token.
+
+    Raises:
+        ValueError: if the token is invalid, expired or revoked.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return get_token_signer().verify(token.strip())
+
+def authenticate_account_request(data: dict) -> tuple[str | None, Response | None]:
+    """
+    Get the username an account change applies to.
+
+    A request with a session token acts on the token's user. A request without one falls back to
+    the username in the body; whether that user exists is left to the account change itself, so
+    the request costs a single query either way.
+
+    Args:
+        data (dict): the request body.
+
+    Returns:
+        tuple[str | None, Response | None]: the username, or an error response to return instead.
+    """
+    try:
+        claims = get_token_claims()
+    except ValueError as e:
+        return None, make_response(jsonify({'error': str(e)}), 401)
+
+    username = data.get('username')
+    if claims is not None:
+        if username is not None and username != claims['sub']:
+            return None, make_response(jsonify({'error': 'Token does not belong to this user'}), 403)
+        return claims['sub'], None
+    return username, None
+
+@api.route('/api/remove-user', methods=['DELETE'])
 def remove_user() -> Response:
-    app.logger.info('Deleting current user')
+    current_app.logger.info('Deleting current user')
 
     try:
-        data = request.get_json()
-        username = data.get('username')
-        if not User.query.filter_by(username=username).first():
+        data = request.get_json(silent=True) or {}
+        username, error = authenticate_account_request(data)
+        if error is not None:
+            return error
+        try:
+            User.delete_user(username)
+        except ValueError:
             return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
-        User.delete_user(username)
+        get_token_signer().revoke_user(username)
         return make_response(jsonify({'status': 'success', 'username': username}), 200)
     except:
         return make_response(jsonify({"error": "An error occurred while deleting the user"}), 500)
 
-@app.route('/api/change-password', methods=['POST'])
+@api.route('/api/change-password', methods=['POST'])
 def change_password() -> Response:
-    app.logger.info('Changing user password')
+    current_app.logger.info('Changing user password')
 
     try:
         data = request.get_json()
-        username = data.get('username')
+        username, error = authenticate_account_request(data)
+        if error is not None:
+            return error
         password = data.get('password')
-        if not User.query.filter_by(username=username).first():
+        try:
+            user_id = User.update_password(username, password)
+        except ValueError:
             return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
-        User.update_password(username, password)
-        return make_response(jsonify({'status': 'success', 'username': username}), 200)
+        # Sessions opened with the old password end; the caller gets a new one
+        signer = get_token_signer()
+        signer.revoke_user(username)
+        token, expires_at = signer.issue(user_id, username)
+        return make_response(jsonify({'status': 'success', 'username': username,
+                                      'token': token, 'expires_at': expires_at}), 200)
     except:
         return make_response(jsonify({"error": "An error occurred while updating the password"}), 500)
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     """
     Route to log in a user.
@@ -143,7 +352,8 @@ def login():
         - password (str): The user's password.
 
     Returns:
-        JSON response indicating the success of the login.
+        JSON response indicating the success of the login, with a session token to send as
+        `Authorization: Bearer <token>` and the unix time it expires at.
 
     Raises:
         400 error if input validation fails.
@@ -152,7 +362,7 @@ def login():
     """
     data = request.get_json()
     if not data or 'username' not in data or 'password' not in data:
-        app.logger.error("Invalid request payload for login.")
+        current_app.logger.error("Invalid request payload for login.")
         raise BadRequest("Invalid request payload. 'username' and 'password' are required.")
 
     username = data['username']
@@ -161,18 +371,167 @@ def login():
     try:
         # Validate user credentials
         if not User.check_password(username, password):
-            app.logger.warning("Login failed for username: %s", username)
+            current_app.logger.warning("Login failed for username: %s", username)
             raise Unauthorized("Invalid username or password.")
 
-        app.logger.info("User %s logged in successfully.", username)
-        return jsonify({"message": f"User {username} logged in successfully."}), 200
+        token, expires_at = get_token_signer().issue(User.get_cached(username)['id'], username)
+        current_app.logger.info("User %s logged in successfully.", username)
+        return jsonify({"message": f"User {username} logged in successfully.",
+                        "token": token, "expires_at": expires_at}), 200
 
     except Unauthorized as e:
         return jsonify({"error": str(e)}), 401
     except Exception as e:
-        app.logger.error("Error during login for username %s: %s", username, str(e))
+        current_app.logger.error("Error during login for username %s: %s", username, str(e))
         return jsonify({"error": "An unexpected error occurred."}), 500
 
+@api.route('/api/logout', methods=['POST'])
+def logout() -> Response:
+    """
+    Route to end a session by revoking its token.
+
+    Expected Header:
+        - Authorization: Bearer <token> from login.
+
+    Returns:
+        JSON response indicating the success of the logout.
+
+    Raises:
+        401 error if the token is missing, invalid, expired or already revoked.
+    """
+    try:
+        claims = get_token_claims()
+    except ValueError as e:
+        return make_response(jsonify({'error': str(e)}), 401)
+    if claims is None:
+        return make_response(jsonify({'error': 'Missing session token'}), 401)
+    get_token_signer().revoke(claims)
+    current_app.logger.info("User %s logged out.", claims['sub'])
+    return make_response(jsonify({'status': 'success', 'username': claims['sub']}), 200)
+
+
+@api.route('/api/username-available', methods=['GET'])
+def username_available() -> Response:
+    """
+    Route to check whether a username is free to sign up with.
+
+    A username the in-memory username index has never seen is reported free without a query,
+    and only possible matches are checked against the users table. The answer is advisory: a
+    name taken moments ago by another worker may still be reported free, and create-user's
+    unique constraint has the final say.
+
+    Query Parameters:
+        - username (str): the username to check.
+
+    Returns:
+        JSON response with the username and whether it is available.
+    Raises:
+        400 error if the username is missing.
+        500 error if there is an issue checking the username.
+    """
+    username = request.args.get('username', '')
+    if not username:
+        return make_response(jsonify({'error': 'Invalid input, username is required'}), 400)
+    try:
+        available = get_username_index().is_available(username)
+        return make_response(jsonify({'username': username, 'available': available}), 200)
+    except Exception as e:
+        current_app.logger.error("Failed to check username %s: %s", username, str(e))
+        return make_response(jsonify({'error': 'An error occurred while checking the username'}), 500)
+
+
+####################################################
+#
+# Admin
+#
+####################################################
+
+def require_admin() -> Response | None:
+    """
+    Check the X-Admin-Token header against ADMIN_TOKEN.
+
+    Returns:
+        Response | None: an error response to return, or None if the caller is an admin.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        return make_response(jsonify({'error': 'Admin routes are disabled'}), 403)
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return make_response(jsonify({'error': 'Invalid admin token'}), 401)
+    return None
+
+@api.route('/api/admin/import-users', methods=['POST'])
+def import_users_route() -> Response:
+    """
+    Route to import users in bulk.
+
+    Expected Header:
+        - X-Admin-Token: the ADMIN_TOKEN.
+
+    Expected Input:
+        Newline-delimited JSON records, each either {"username", "password"} or
+        {"username", "salt", "password_hash"} as written by the export route.
+
+    Query Parameters:
+        - batch_size (int, optional): records per transaction, by default USER_IMPORT_BATCH_SIZE.
+
+    Returns:
+        Newline-delimited JSON streamed as the import runs: the running totals after each
+        batch, or an error line if the import stops.
+
+    Raises:
+        400 error if the batch size is invalid.
+        401 or 403 error if the caller is not an admin.
+    """
+    error = require_admin()
+    if error is not None:
+        return error
+    batch_size = request.args.get('batch_size', type=int)
+    if batch_size is not None and batch_size <= 0:
+        return make_response(jsonify({'error': 'Invalid batch_size, should be positive'}), 400)
+    # Imported here: the SQL dialects it needs are only worth loading when an admin uses it
+    from weather.user_transfer import import_users, parse_records
+
+    current_app.logger.info('Importing users')
+
+    def generate():
+        try:
+            # Passwords are hashed in this process: the process pool is only offered by the command line
+            for progress in import_users(parse_records(request.stream), batch_size):
+                yield json.dumps(progress) + '\n'
+        except Exception as e:
+            current_app.logger.error("User import failed: %s", str(e))
+            yield json.dumps({'error': 'An error occurred while importing users'}) + '\n'
+
+    return Response(stream_with_context(generate()), content_type='application/x-ndjson')
+
+@api.route('/api/admin/export-users', methods=['GET'])
+def export_users_route() -> Response:
+    """
+    Route to export every user, streamed a batch at a time.
+
+    Expected Header:
+        - X-Admin-Token: the ADMIN_TOKEN.
+
+    Returns:
+        Newline-delimited JSON with one {"username", "salt", "password_hash"} record per user.
+
+    Raises:
+        401 or 403 error if the caller is not an admin.
+    """
+    error = require_admin()
+    if error is not None:
+        return error
+
+    current_app.logger.info('Exporting users')
+    from weather.user_transfer import export_users
+
+    def generate():
+        for record in export_users():
+            yield json.dumps(record) + '\n'
+
+    return Response(stream_with_context(generate()), content_type='application/x-ndjson')
+
 
 ####################################################
 #
@@ -180,29 +539,80 @@ def login():
 #
 ####################################################
 
-@app.route('/api/add-favorite', methods=['POST'])
+def get_favorites_model(username: str) -> FavoritesModel | None:
+    """
+    Get the favorites of a user.
+
+    Args:
+        username (str): the username whose favorites are managed.
+
+    Returns:
+        FavoritesModel | None: the user's favorites, or None if the user does not exist.
+    """
+    user = User.get_cached(username)
+    if not user:
+        return None
+    return FavoritesModel(user['id'])
+
+def retry_after(error: UpstreamBusyError | CircuitOpenError) -> str:
+    """
+    Get the Retry-After header value for a request shed or refused by the upstream guards.
+
+    Args:
+        error (UpstreamBusyError | CircuitOpenError): the error raised by the call.
+
+    Returns:
+        str: the whole seconds until the upstream may take the call, at least 1.
+    """
+    return str(max(1, math.ceil(getattr(error, 'retry_after', 1))))
+
+def upstream_unavailable_response(error: UpstreamBusyError | CircuitOpenError) -> Response:
+    """
+    Build the response for a request whose weather api call was shed by the rate limit, or
+    refused because the upstream is down and nothing usable was cached.
+
+    Args:
+        error (UpstreamBusyError | CircuitOpenError): the error raised by the call.
+
+    Returns:
+        Response: a 503 telling the client when to retry.
+    """
+    current_app.logger.warning("Weather api unavailable: %s", str(error))
+    response = make_response(jsonify({'error': 'Weather service is unavailable, please retry shortly'}), 503)
+    response.headers['Retry-After'] = retry_after(error)
+    return response
+
+@api.route('/api/add-favorite', methods=['POST'])
 def add_favorite() -> Response:
     """
     Route to add a new location to the favorites dictionary.
 
     Expected JSON Input:
+        - username (str): the user whose favorites are updated.
         - location (str): the location whose weather will be retrieved.
 
     Returns:
-        JSON response indicating the success of the location addition.
+        JSON response indicating the success of the location addition, with the 'age' in seconds of
+        the weather saved and whether it was 'stale', i.e. served while being refreshed.
     Raises:
-        400 error if input validation fails.
+        400 error if input validation fails or the location does not match any place.
+        503 error if the weather api rate limit is saturated or the weather api is down.
         500 error if there is an issue adding the location to favorites.
     """
-    app.logger.info('Adding a location to favorites')
+    current_app.logger.info('Adding a location to favorites')
 
     try:
         data = request.get_json()
+        username = data.get('username')
         location = data.get('location')
         
-        if not location:
+        if not username or not location:
             return make_response(jsonify({'error': 'Invalid input, all fields are required with valid values'}), 400)
 
+        favorites_manager = get_favorites_model(username)
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+
         # Check that location is a string
         try:
             location = str(location)
@@ -210,16 +620,335 @@ def add_favorite() -> Response:
             return make_response(jsonify({'error': 'Location must be a string'}), 400)
 
         # Call the get_weather function to call the api and retrieve the weather
-        app.logger.info('Getting weather for %s', location)
-        temp, wind, precipitation, humidity = favorites_manager.get_weather(location)
+        current_app.logger.info('Getting weather for %s', location)
+        (temp, wind, precipitation, humidity), age = favorites_manager.get_weather_api_with_age(location)
 
         # Call the add_favorites function to add the location and its current weather to the favorites dictionary
-        app.logger.info('Adding location and weather to favorites')
+        current_app.logger.info('Adding location and weather to favorites')
         favorites_manager.add_favorite(location, temp, wind, precipitation, humidity)
 
-        app.logger.info("Location added: %s", location)
-        return make_response(jsonify({'status': 'success', 'location': location}), 200)
-    
+        current_app.logger.info("Location added: %s", location)
+        return make_response(jsonify({'status': 'success', 'location': location, 'age': round(age, 1),
+                                      'stale': age >= weather_cache.ttl}), 200)
+
+    except ValueError as e:
+        current_app.logger.error("Failed to add favorite: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 400)
+    except (UpstreamBusyError, CircuitOpenError) as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        current_app.logger.error("Failed to add favorite: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/add-favorites', methods=['POST'])
+def add_favorites() -> Response:
+    """
+    Route to add many locations to the favorites dictionary at once.
+
+    The weather for every location is fetched through the bulk weather api, then each
+    location is added on its own so that one bad location does not fail the rest.
+
+    Expected JSON Input:
+        - username (str): the user whose favorites are updated.
+        - locations (list[str]): the locations whose weather will be retrieved.
+
+    Returns:
+        JSON response with a per-location 'results' list. The status is 'partial' when
+        some locations could not be added.
+    Raises:
+        400 error if input validation fails.
+        500 error if there is an issue retrieving the weather.
+    """
+    current_app.logger.info('Adding a batch of locations to favorites')
+
+    try:
+        data = request.get_json(silent=True) or {}
+        username = data.get('username')
+        locations = data.get('locations')
+        max_batch = int(os.getenv("FAVORITES_BATCH_MAX", "500"))
+
+        if not username:
+            return make_response(jsonify({'error': 'Invalid input, username is required'}), 400)
+        if not isinstance(locations, list) or not locations:
+            return make_response(jsonify({'error': 'Invalid input, locations must be a non-empty list'}), 400)
+        if len(locations) > max_batch:
+            return make_response(jsonify({'error': f'Invalid input, at most {max_batch} locations per request'}), 400)
+        if not all(isinstance(location, str) and location.strip() for location in locations):
+            return make_response(jsonify({'error': 'Every location must be a non-empty string'}), 400)
+
+        favorites_manager = get_favorites_model(username)
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+
+        current_app.logger.info('Getting weather for %d locations', len(locations))
+        weather = favorites_manager.get_weather_bulk(locations)
+
+        results = []
+        for location in locations:
+            try:
+                if isinstance(weather[location], Exception):
+                    raise weather[location]
+                favorites_manager.add_favorite(location, *weather[location])
+                results.append({'location': location, 'status': 'success'})
+            except Exception as e:
+                results.append({'location': location, 'status': 'failed', 'error': str(e)})
+
+        added = sum(1 for result in results if result['status'] == 'success')
+        current_app.logger.info("Added %d of %d locations", added, len(locations))
+        status = 'success' if added == len(locations) else 'partial'
+        return make_response(jsonify({'status': status, 'results': results}), 200)
+
+    except Exception as e:
+        current_app.logger.error("Failed to add favorites: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/refresh-favorites', methods=['POST'])
+def refresh_favorites() -> Response:
+    """
+    Route to refresh the current weather of every favorite location in parallel.
+
+    Expected JSON Input:
+        - username (str): the user whose favorites are refreshed.
+        - deadline (float, optional): seconds to wait for the whole batch.
+
+    Returns:
+        JSON response with the refreshed weather, plus any locations that timed out or failed.
+        The status is 'partial' when some locations did not refresh.
+    Raises:
+        400 error if the deadline is invalid or there are no favorites.
+        500 error if there is an issue refreshing the favorites.
+    """
+    current_app.logger.info('Refreshing weather for all favorites')
+
+    try:
+        data = request.get_json(silent=True) or {}
+        favorites_manager = get_favorites_model(data.get('username'))
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+
+        deadline = data.get('deadline')
+        if deadline is not None:
+            try:
+                deadline = float(deadline)
+            except (TypeError, ValueError):
+                return make_response(jsonify({'error': 'Deadline must be a number of seconds'}), 400)
+            if deadline <= 0:
+                return make_response(jsonify({'error': 'Deadline must be positive'}), 400)
+
+        result = favorites_manager.refresh_all_favorites(deadline)
+        status = 'partial' if result['timed_out'] or result['failed'] else 'success'
+        return make_response(jsonify({'status': status, **result}), 200)
+
+    except ValueError as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+    except Exception as e:
+        current_app.logger.error("Failed to refresh favorites: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/get-favorites', methods=['GET'])
+def get_favorites() -> Response:
+    """
+    Route to get the saved weather for every one of a user's favorite locations.
+
+    Query Parameters:
+        - username (str): the user whose favorites are listed.
+
+    Returns:
+        JSON response with each favorite location mapped to its weather.
+    Raises:
+        400 error if the user does not exist.
+        500 error if there is an issue reading the favorites.
+    """
+    current_app.logger.info('Listing favorites')
+
+    try:
+        favorites_manager = get_favorites_model(request.args.get('username'))
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+        return make_response(jsonify({'status': 'success', 'favorites': favorites_manager.favorites}), 200)
+    except Exception as e:
+        current_app.logger.error("Failed to list favorites: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/stream-favorites-weather', methods=['GET'])
+def stream_favorites_weather() -> Response:
+    """
+    Route to stream the current weather of every one of a user's favorite locations, each
+    location sent as soon as it is available from the cache or the weather api.
+
+    Query Parameters:
+        - username (str): the user whose favorites are streamed.
+
+    Returns:
+        Newline-delimited JSON with one line per location: its 'location', 'weather', 'age' and
+        whether it is 'stale', or the 'error' that stopped it being fetched. Sent as server-sent
+        events instead when the request accepts text/event-stream.
+    Raises:
+        400 error if the user does not exist or has no favorites.
+    """
+    current_app.logger.info('Streaming weather for all favorites')
+
+    favorites_manager = get_favorites_model(request.args.get('username'))
+    if favorites_manager is None:
+        return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+    try:
+        lines = favorites_manager.iter_all_favorites_current_weather()
+    except ValueError as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+
+    events = request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+
+    def generate():
+        for line in lines:
+            yield f"data: {json.dumps(line)}\n\n" if events else json.dumps(line) + '\n'
+
+    response = Response(stream_with_context(generate()),
+                        content_type='text/event-stream' if events else 'application/x-ndjson')
+    # Ask proxies to pass each line on as it is written instead of buffering the response
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api.route('/api/get-favorite-weather', methods=['GET'])
+def get_favorite_weather() -> Response:
+    """
+    Route to get the saved weather for one of a user's favorite locations.
+
+    Query Parameters:
+        - username (str): the user whose favorite is read.
+        - location (str): the favorite location.
+
+    Returns:
+        JSON response with the location's weather and its 'age' in seconds since it was saved.
+    Raises:
+        400 error if the user does not exist.
+        404 error if the location is not a favorite.
+        500 error if there is an issue reading the favorite.
+    """
+    current_app.logger.info('Getting weather for a favorite')
+
+    try:
+        favorites_manager = get_favorites_model(request.args.get('username'))
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+        location = request.args.get('location', '')
+        weather, age = favorites_manager.get_favorite_weather_with_age(location)
+        return make_response(jsonify({'status': 'success', 'location': location, 'weather': weather,
+                                      'age': round(age, 1)}), 200)
+    except ValueError as e:
+        return make_response(jsonify({'error': str(e)}), 404)
+    except Exception as e:
+        current_app.logger.error("Failed to get favorite weather: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/clear-favorites', methods=['DELETE'])
+def clear_favorites() -> Response:
+    """
+    Route to clear all of a user's favorite locations.
+
+    Expected JSON Input:
+        - username (str): the user whose favorites are cleared.
+
+    Returns:
+        JSON response indicating the success of the clear.
+    Raises:
+        400 error if the user does not exist.
+        500 error if there is an issue clearing the favorites.
+    """
+    current_app.logger.info('Clearing favorites')
+
+    try:
+        data = request.get_json(silent=True) or {}
+        favorites_manager = get_favorites_model(data.get('username'))
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+        favorites_manager.clear_favorites()
+        return make_response(jsonify({'status': 'success'}), 200)
     except Exception as e:
-        app.logger.error("Failed to add favorite: %s", str(e))
+        current_app.logger.error("Failed to clear favorites: %s", str(e))
         return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/get-favorite-forecast', methods=['GET'])
+def get_favorite_forecast() -> Response:
+    """
+    Route to get the 5 day forecast for one of a user's favorite locations.
+
+    Query Parameters:
+        - username (str): the user whose favorite is read.
+        - location (str): the favorite location.
+
+    Returns:
+        JSON response with the location's daily forecast.
+    Raises:
+        400 error if the user does not exist.
+        404 error if the location is not a favorite.
+        503 error if the weather api rate limit is saturated or the weather api is down.
+        500 error if there is an issue retrieving the forecast.
+    """
+    current_app.logger.info('Getting forecast for a favorite')
+
+    try:
+        favorites_manager = get_favorites_model(request.args.get('username'))
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+        location = request.args.get('location', '')
+        forecast = favorites_manager.get_favorites_forecast_5_days(location)
+        return make_response(jsonify({'status': 'success', 'forecast': forecast}), 200)
+    except ValueError as e:
+        return make_response(jsonify({'error': str(e)}), 404)
+    except (UpstreamBusyError, CircuitOpenError) as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        current_app.logger.error("Failed to get favorite forecast: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+@api.route('/api/get-favorite-historical', methods=['GET'])
+def get_favorite_historical() -> Response:
+    """
+    Route to get the recorded weather history for one of a user's favorite locations.
+
+    Query Parameters:
+        - username (str): the user whose favorite is read.
+        - location (str): the favorite location.
+        - start (int, optional): the unix time to start from, defaults to 24 hours before end.
+        - end (int, optional): the unix time to stop at, defaults to now.
+        - resolution (str, optional): 'raw', 'hour' or 'day'.
+
+    Returns:
+        JSON response with the location's observations, or min/max/mean per hour or day.
+    Raises:
+        400 error if the user does not exist or the range or resolution is invalid.
+        404 error if the location is not a favorite.
+        500 error if there is an issue reading the history.
+    """
+    current_app.logger.info('Getting history for a favorite')
+
+    try:
+        favorites_manager = get_favorites_model(request.args.get('username'))
+        if favorites_manager is None:
+            return make_response(jsonify({'error': 'Invalid username, user does not exist'}), 400)
+        location = request.args.get('location', '')
+        if not favorites_manager.is_favorite(location):
+            return make_response(jsonify({'error': f"{location} not found in Favorites."}), 404)
+        try:
+            start = request.args.get('start', type=int)
+            end = request.args.get('end', type=int)
+            history = favorites_manager.get_favorite_historical(
+                location, start, end, request.args.get('resolution', 'raw'))
+        except ValueError as e:
+            return make_response(jsonify({'error': str(e)}), 400)
+        return make_response(jsonify({'status': 'success', 'history': history}), 200)
+    except Exception as e:
+        current_app.logger.error("Failed to get favorite history: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+
+if __name__ == '__main__':
+    get_app().run(debug=True)
@@ -0,0 +1,204 @@
+"""
+ASGI entry point: serve with `uvicorn asgi:application`.
+
+The upstream-bound route /api/add-favorite runs natively on the event loop, so a call waiting
+on weatherapi.com holds a coroutine instead of a worker thread and one worker can keep hundreds
+of them in flight. The health routes also run there, serving the health prober's last result
+without a thread hop. Their short database steps run on worker threads
+inside an app context. Every other route is served by the Flask app through a thread pool of
+ASGI_WSGI_WORKERS threads.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable
+
+from a2wsgi import WSGIMiddleware
+
+from app_init import ensure_started, get_app, get_favorites_model, retry_after
+from utils import metrics
+from utils.circuit_breaker import CircuitOpenError
+from utils.logger import configure_logger
+from weather.clients.async_weather_client import close_async_weather_client
+from weather.clients.upstream_scheduler import UpstreamBusyError
+from weather.models.current_weather import get_current_weather_with_age_async, weather_cache
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+app = get_app()
+wsgi_application = WSGIMiddleware(app, workers=int(os.getenv("ASGI_WSGI_WORKERS", "10")))
+
+
+async def in_app_context(func: Callable, *args) -> Any:
+    """
+    Run a blocking function on a worker thread inside the Flask app context.
+
+    Args:
+        func (Callable): the function to run, e.g. one that queries the database.
+        *args: the arguments to call it with.
+
+    Returns:
+        Any: the function's return value.
+    """
+    def run():
+        with app.app_context():
+            # These routes bypass Flask's request hooks, so run its deferred startup here
+            ensure_started()
+            return func(*args)
+
+    return await asyncio.to_thread(run)
+
+
+async def read_json(receive) -> Any:
+    """
+    Read and parse the JSON body of an ASGI request.
+
+    Returns:
+        Any: the parsed body.
+
+    Raises:
+        ValueError: if the body is not valid JSON.
+    """
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return json.loads(body or b'null')
+
+
+async def send_json(send, status: int, payload: Any, headers: dict[str, str] | None = None) -> None:
+    """Send a JSON response, with any extra headers."""
+    body = json.dumps(payload).encode()
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    raw_headers.extend((name.lower().encode(), value.encode()) for name, value in (headers or {}).items())
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def healthcheck(receive) -> tuple[int, dict]:
+    """
+    Readiness route, as /api/health and /api/health/ready in app_init.
+
+    Returns:
+        tuple[int, dict]: the status code and JSON response with the overall status and each
+        dependency's status and last check time. 503 if the database is down or nothing has been checked yet.
+    """
+    prober = app.extensions['health_prober']
+    if not app.extensions['weather_startup']['done'] or (prober.is_stale() and not prober.is_running()):
+        # Starts the prober on the first request, or checks on a worker thread if it is not running
+        return await in_app_context(prober.readiness)
+    return prober.readiness()
+
+
+async def liveness(receive) -> tuple[int, dict]:
+    """
+    Liveness route, as /api/health/live in app_init.
+
+    Returns:
+        tuple[int, dict]: the status code and JSON response with each dependency's last known status
+        and check time. 503 if the health prober has stalled.
+    """
+    return app.extensions['health_prober'].liveness()
+
+
+async def add_favorite(receive) -> tuple[int, dict] | tuple[int, dict, dict]:
+    """
+    Route to add a new location to the favorites dictionary, as /api/add-favorite in app_init.
+
+    Expected JSON Input:
+        - username (str): the user whose favorites are updated.
+        - location (str): the location whose weather will be retrieved.
+
+    Returns:
+        tuple[int, dict] | tuple[int, dict, dict]: the status code and JSON response indicating the success
+        of the location addition, with the weather's 'age' and whether it was 'stale'. 400 if input validation
+        fails or the location does not match any place, 503 with a Retry-After header if the weather api is
+        saturated or down, 500 if adding it fails.
+    """
+    logger.info('Adding a location to favorites')
+    try:
+        try:
+            data = await read_json(receive)
+        except ValueError:
+            return 400, {'error': 'Invalid JSON body'}
+        if not isinstance(data, dict):
+            return 400, {'error': 'Invalid input, all fields are required with valid values'}
+        username = data.get('username')
+        location = data.get('location')
+
+        if not username or not location:
+            return 400, {'error': 'Invalid input, all fields are required with valid values'}
+
+        favorites_manager = await in_app_context(get_favorites_model, username)
+        if favorites_manager is None:
+            return 400, {'error': 'Invalid username, user does not exist'}
+
+        location = str(location)
+        logger.info('Getting weather for %s', location)
+        (temp, wind, precipitation, humidity), age = await get_current_weather_with_age_async(location)
+
+        logger.info('Adding location and weather to favorites')
+        await in_app_context(favorites_manager.add_favorite, location, temp, wind, precipitation, humidity)
+
+        logger.info("Location added: %s", location)
+        return 200, {'status': 'success', 'location': location, 'age': round(age, 1),
+                     'stale': age >= weather_cache.ttl}
+
+    except ValueError as e:
+        logger.error("Failed to add favorite: %s", str(e))
+        return 400, {'error': str(e)}
+    except (UpstreamBusyError, CircuitOpenError) as e:
+        logger.warning("Weather api unavailable: %s", str(e))
+        return 503, {'error': 'Weather service is unavailable, please retry shortly'}, {'Retry-After': retry_after(e)}
+    except Exception as e:
+        logger.error("Failed to add favorite: %s", str(e))
+        return 500, {'error': str(e)}
+
+
+# (method, path) served on the event loop; everything else goes to Flask
+ASYNC_ROUTES = {
+    ('GET', '/api/health'): healthcheck,
+    ('GET', '/api/health/ready'): healthcheck,
+    ('GET', '/api/health/live'): liveness,
+    ('POST', '/api/add-favorite'): add_favorite,
+}
+
+
+async def lifespan(receive, send) -> None:
+    """Handle the ASGI lifespan protocol, closing the async upstream client on shutdown."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_weather_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    route = ASYNC_ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if route is None:
+        await wsgi_application(scope, receive, send)
+        return
+
+    start = time.perf_counter()
+    metrics.http_in_flight.inc()
+    try:
+        # Routes return (status, payload), or (status, payload, headers)
+        status, payload, *headers = await route(receive)
+        await send_json(send, status, payload, *headers)
+    finally:
+        metrics.http_in_flight.dec()
+    metrics.observe_request(scope['path'], scope['method'], status, time.perf_counter() - start)
@@ -0,0 +1,112 @@
+"""
+Cold start benchmark: how long a fresh worker takes to import the app, build it and answer its
+first request. Every run is a new interpreter, so nothing is shared between runs.
+
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --importtime 15
+
+Results are printed and saved as JSON under benchmarks/results/ (see benchmarks.compare).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import print_table, save_results, summarize
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child interpreter; prints the seconds each stage took as JSON
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app_init
+imported = time.perf_counter()
+app = app_init.create_app()
+created = time.perf_counter()
+response = app.test_client().get('/api/db-check')
+served = time.perf_counter()
+assert response.status_code == 200, response.get_data(as_text=True)
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': served - created, 'total': served - start}))
+"""
+
+
+def child_env(workdir: str) -> dict:
+    """The environment of a cold worker: a fresh database, no cache backend and no upstream."""
+    env = dict(os.environ)
+    env.update({
+        'DB_URI': f"sqlite:///{os.path.join(workdir, 'app.db')}",
+        'HISTORY_DB_PATH': os.path.join(workdir, 'history.db'),
+        'CACHE_BACKEND': 'none',
+        'PREWARM_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+    })
+    return env
+
+
+def run_cold_starts(runs: int) -> dict:
+    """
+    Start the app in fresh interpreters and time each stage.
+
+    Args:
+        runs (int): the number of interpreters to start.
+
+    Returns:
+        dict: the latency summary per stage.
+    """
+    stages: dict[str, list[float]] = {}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=child_env(workdir),
+                                    capture_output=True, text=True, check=True).stdout
+        for stage, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            stages.setdefault(stage, []).append(seconds)
+    return {f"cold_start_{stage}": summarize(latencies, sum(latencies)) for stage, latencies in stages.items()}
+
+
+def slowest_imports(count: int) -> list[tuple[str, float]]:
+    """
+    Get the modules whose import, including their own imports, took longest for `import app_init`.
+
+    Args:
+        count (int): the number of modules to return.
+
+    Returns:
+        list[tuple[str, float]]: (module, cumulative milliseconds), slowest first.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app_init'], cwd=ROOT,
+                                env=child_env(workdir), capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda module: module[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help="fresh interpreters to start")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="also print the N slowest modules imported by app_init")
+    parser.add_argument('--output', help="the JSON file to write, defaults to benchmarks/results/")
+    args = parser.parse_args()
+
+    results = run_cold_starts(args.runs)
+    print_table(results)
+    if args.importtime:
+        print(f"\n{'module':<48} {'cumulative ms':>14}")
+        for name, milliseconds in slowest_imports(args.importtime):
+            print(f"{name:<48} {milliseconds:>14.1f}")
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    print(f"Saved {save_results('cold_start', config, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Get a percentile of a list of values by linear interpolation.
+
+    Args:
+        values (list[float]): the measured values, in any order.
+        pct (float): the percentile, between 0 and 100.
+
+    Returns:
+        float: the percentile, or 0.0 for no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """
+    Summarize the latencies of one benchmark.
+
+    Args:
+        latencies (list[float]): the seconds each call took.
+        elapsed (float): the wall clock seconds the benchmark ran for.
+        errors (int): the number of calls that failed.
+
+    Returns:
+        dict: the call and error counts, throughput, and mean/p50/p95/p99/max latency in milliseconds.
+    """
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+def git_revision() -> str:
+    """Get the short commit hash of the working tree, with a suffix if it has uncommitted changes."""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(name: str, config: dict, results: dict[str, Any], output: str | None = None) -> str:
+    """
+    Save benchmark results as JSON, tagged with the commit they were measured on.
+
+    Args:
+        name (str): the benchmark suite, e.g. "load" or "micro".
+        config (dict): the settings the suite ran with.
+        results (dict[str, Any]): the summary per benchmark.
+        output (str | None): the file to write, defaults to benchmarks/results/<name>-<revision>.json.
+
+    Returns:
+        str: the path written.
+    """
+    revision = git_revision()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{revision}.json")
+    document = {
+        'suite': name,
+        'revision': revision,
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return output
+
+
+def print_table(results: dict[str, dict]) -> None:
+    """Print one line of summary per benchmark."""
+    print(f"{'benchmark':<36} {'count':>7} {'errors':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in results.items():
+        print(f"{name:<36} {summary['count']:>7} {summary['errors']:>6} {summary['rps']:>9} "
+              f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9}")
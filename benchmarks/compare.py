@@ -0,0 +1,62 @@
+"""
+Compare two saved benchmark results, e.g. from before and after a change:
+
+    python -m benchmarks.compare benchmarks/results/micro-abc1234.json benchmarks/results/micro-def5678.json
+
+Exits with status 1 if any benchmark's p50 or p95 regressed by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+
+METRICS = ('rps', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> tuple[list[tuple], bool]:
+    """
+    Compare the benchmarks present in both result documents.
+
+    Args:
+        baseline (dict): the saved results to compare against.
+        candidate (dict): the saved results being checked.
+        threshold (float): the percent increase in p50 or p95 latency counted as a regression.
+
+    Returns:
+        tuple[list[tuple], bool]: one (benchmark, metric, before, after, percent change) row per
+        metric, and whether any benchmark regressed.
+    """
+    rows, regressed = [], False
+    for name, before in baseline['results'].items():
+        after = candidate['results'].get(name)
+        if after is None or 'count' not in before:
+            continue
+        for metric in METRICS:
+            change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            rows.append((name, metric, before[metric], after[metric], change))
+            if metric in ('p50_ms', 'p95_ms') and change > threshold:
+                regressed = True
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent latency increase counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{baseline['suite']}: {baseline['revision']} -> {candidate['revision']}")
+    rows, regressed = compare(baseline, candidate, args.threshold)
+    for name, metric, before, after, change in rows:
+        print(f"{name:<36} {metric:<7} {before:>10} {after:>10} {change:>+8.1f}%")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
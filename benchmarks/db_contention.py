@@ -0,0 +1,136 @@
+"""
+Read throughput under a concurrent write load, on a SQLite file, with SQLite's default settings
+and with the tuned engine (WAL, synchronous=NORMAL, mmap, and reads on a separate read pool).
+
+Writer threads keep changing passwords while reader threads look users up the way login does,
+with no cache in front of the database.
+
+    python -m benchmarks.db_contention --readers 8 --writers 2 --duration 5
+
+Results are printed and saved as JSON under benchmarks/results/ (see benchmarks.compare).
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app_init import create_app
+from benchmarks.common import print_table, save_results, summarize
+from config import DevelopmentConfig
+from db import READ_BIND, db
+from utils.redis_cache import NullBackend, set_cache_backend
+from weather.models.account_model import User
+
+
+# Environment of each scenario; anything not listed keeps the tuned defaults
+SCENARIOS = {
+    'default': {'DB_SQLITE_JOURNAL_MODE': 'DELETE', 'DB_SQLITE_SYNCHRONOUS': 'FULL', 'DB_SQLITE_MMAP_SIZE': '0'},
+    'tuned': {},
+    'tuned_read_bind': {'DB_READ_URI': None},  # filled with the scenario's database
+}
+SCENARIO_KEYS = ('DB_URI', 'DB_READ_URI', 'DB_SQLITE_JOURNAL_MODE', 'DB_SQLITE_SYNCHRONOUS', 'DB_SQLITE_MMAP_SIZE')
+
+
+def run_scenario(name: str, workdir: str, readers: int, writers: int, duration: float, users: int) -> dict:
+    """
+    Run readers and writers against a fresh database with one scenario's settings.
+
+    Args:
+        name (str): the scenario, a key of SCENARIOS.
+        workdir (str): the directory to keep the database in.
+        readers (int): the number of reader threads.
+        writers (int): the number of writer threads.
+        duration (float): seconds to run for.
+        users (int): the number of users to seed.
+
+    Returns:
+        dict: the latency summary of reads and of writes.
+    """
+    uri = f"sqlite:///{os.path.join(workdir, f'{name}.db')}"
+    saved = {key: os.environ.get(key) for key in SCENARIO_KEYS}
+    os.environ['DB_URI'] = uri
+    for key, value in SCENARIOS[name].items():
+        os.environ[key] = uri if key == 'DB_READ_URI' else value
+    try:
+        app = create_app(DevelopmentConfig)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    with app.app_context():
+        db.create_all(bind_key=None)
+        for i in range(users):
+            db.session.add(User(username=f"user{i}", salt='00' * 16, password='00' * 32))
+        db.session.commit()
+
+    stop = threading.Event()
+    latencies = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+
+    def worker(kind: str, operation) -> None:
+        local, failed = [], 0
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    operation(f"user{random.randrange(users)}")
+                    local.append(time.perf_counter() - start)
+                except Exception:
+                    db.session.rollback()
+                    failed += 1
+                finally:
+                    db.session.remove()
+        latencies[kind].extend(local)
+        errors[kind] += failed
+
+    threads = [threading.Thread(target=worker, args=('read', User.get_cached)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=('write', lambda username: User.update_password(username, 'x')))
+                for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    db.metadatas.pop(READ_BIND, None)
+    return {f"{name}_{kind}": summarize(latencies[kind], elapsed, errors[kind]) for kind in ('read', 'write')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--scenario', choices=list(SCENARIOS), action='append',
+                        help="run only these scenarios, by default all of them")
+    parser.add_argument('--output', help="the JSON file to write, defaults to benchmarks/results/")
+    args = parser.parse_args()
+
+    # Per-call logging would dominate the measurements
+    logging.disable(logging.INFO)
+    set_cache_backend(NullBackend())
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.scenario or SCENARIOS:
+            results.update(run_scenario(name, workdir, args.readers, args.writers, args.duration, args.users))
+    print_table(results)
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    print(f"Saved {save_results('db_contention', config, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Memory held by users' favorites in the old layout, one dict per favorite holding a dict of
+weather, and in FavoriteRecords' columnar layout, along with the size of each layout's cached JSON.
+
+    python -m benchmarks.favorites_memory --users 10000 --favorites 20
+
+Results are printed and saved as JSON under benchmarks/results/ (see benchmarks.compare).
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable
+
+from benchmarks.common import save_results
+from weather.models.favorite_model import FavoriteRecords
+
+
+def dict_layout(favorites: list[tuple]) -> dict[str, dict]:
+    """Build one user's favorites the way they were held before FavoriteRecords."""
+    return {key: {'label': label, 'weather': {'temp': temp, 'wind': wind, 'precipitation': precipitation,
+                                              'humidity': humidity}}
+            for key, label, temp, wind, precipitation, humidity in favorites}
+
+
+def columnar_layout(favorites: list[tuple]) -> FavoriteRecords:
+    """Build one user's favorites as FavoriteRecords."""
+    records = FavoriteRecords()
+    for favorite in favorites:
+        records.append(*favorite)
+    return records
+
+
+LAYOUTS: dict[str, tuple[Callable, Callable]] = {
+    'dict': (dict_layout, lambda rows: rows),
+    'columnar': (columnar_layout, FavoriteRecords.to_columns),
+}
+
+
+def generate_favorites(users: int, favorites: int, locations: int, seed: int = 0) -> list[list[tuple]]:
+    """
+    Generate every user's favorites from a shared pool of locations.
+
+    Keys and labels are allocated here, before anything is measured, so the figures count only
+    what each layout adds on top of the strings.
+
+    Args:
+        users (int): the number of users.
+        favorites (int): the number of favorites per user.
+        locations (int): the number of distinct locations favorited across users.
+        seed (int): the random seed.
+
+    Returns:
+        list[list[tuple]]: the (key, label, temp, wind, precipitation, humidity) favorites of each user.
+    """
+    rng = random.Random(seed)
+    return [[(f"id:{location}", f"Location {location}", round(rng.uniform(-20, 110), 1),
+              round(rng.uniform(0, 40), 1), round(rng.uniform(0, 2), 2), rng.randrange(101))
+             for location in rng.sample(range(locations), favorites)]
+            for _ in range(users)]
+
+
+def measure_layout(name: str, users: list[list[tuple]]) -> dict:
+    """
+    Build every user's favorites in one layout and measure them.
+
+    Args:
+        name (str): the layout, a key of LAYOUTS.
+        users (list[list[tuple]]): the favorites of each user.
+
+    Returns:
+        dict: the bytes held in total and per favorite, the cached JSON bytes per user, and the
+        seconds taken to build and to serialize every user.
+    """
+    build, columns = LAYOUTS[name]
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = [build(favorites) for favorites in users]
+    built = time.perf_counter()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start_json = time.perf_counter()
+    cached = sum(len(json.dumps(columns(layout))) for layout in held)
+    serialized = time.perf_counter()
+    count = sum(len(favorites) for favorites in users)
+    del held
+    return {
+        'bytes': allocated,
+        'bytes_per_favorite': round(allocated / count, 1),
+        'cached_bytes_per_user': round(cached / len(users), 1),
+        'build_s': round(built - start, 3),
+        'serialize_s': round(serialized - start_json, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--favorites', type=int, default=20, help="favorites per user")
+    parser.add_argument('--locations', type=int, default=2000, help="distinct locations across users")
+    parser.add_argument('--output', help="the JSON file to write, defaults to benchmarks/results/")
+    args = parser.parse_args()
+
+    users = generate_favorites(args.users, args.favorites, args.locations)
+    results = {f"favorites_memory_{name}": measure_layout(name, users) for name in LAYOUTS}
+
+    print(f"{'layout':<36} {'MiB':>9} {'B/favorite':>11} {'cached B/user':>14} {'build s':>8}")
+    for name, result in results.items():
+        print(f"{name:<36} {result['bytes'] / 2 ** 20:>9.1f} {result['bytes_per_favorite']:>11} "
+              f"{result['cached_bytes_per_user']:>14} {result['build_s']:>8}")
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    print(f"Saved {save_results('favorites_memory', config, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Drive the API at a fixed concurrency and report latency percentiles and throughput per route.
+
+Against a running app (pointed at the stub with WEATHER_API_URL):
+
+    python -m benchmarks.load_test --base-url http://localhost:5000 --concurrency 32
+
+Or let the load test start the stub and the app itself, on a throwaway database:
+
+    python -m benchmarks.load_test --serve wsgi --latency 0.05 --concurrency 32
+    python -m benchmarks.load_test --serve asgi --latency 0.05 --concurrency 32
+
+Results are printed and saved as JSON under benchmarks/results/ (see benchmarks.compare).
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from benchmarks.common import print_table, save_results, summarize
+from benchmarks.stub_server import start_stub_server
+
+
+LOCATIONS = ['Boston', 'New York', 'Paris', 'London', 'Tokyo', 'Sydney', 'Cairo', 'Lima', 'Oslo', 'Seoul',
+             'Denver', 'Austin', 'Dublin', 'Madrid', 'Rome', 'Berlin', 'Vienna', 'Prague', 'Warsaw', 'Athens']
+
+
+def run_phase(name: str, calls: list[Callable[[], requests.Response]], concurrency: int) -> dict:
+    """
+    Run calls on a fixed number of threads and summarize their latency.
+
+    Args:
+        name (str): the phase name, for progress output.
+        calls (list[Callable[[], requests.Response]]): the calls to make, each returning its response.
+        concurrency (int): the number of calls in flight at once.
+
+    Returns:
+        dict: the latency summary; non-2xx responses and exceptions count as errors.
+    """
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def timed(call):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = call().ok
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += not ok
+
+    print(f"Running {name}: {len(calls)} calls at concurrency {concurrency}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, calls))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def run_load_test(base_url: str, users: int, favorites: int, reads: int, concurrency: int) -> dict:
+    """
+    Create users, log them in, add favorites and read them back, one phase per route.
+
+    Args:
+        base_url (str): the app's base url.
+        users (int): the number of users to create.
+        favorites (int): the number of favorites each user adds.
+        reads (int): the number of calls made to each read route.
+        concurrency (int): the number of calls in flight at once.
+
+    Returns:
+        dict: the latency summary per route.
+    """
+    api = base_url.rstrip('/') + '/api'
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    # Unique per run so the load test can be repeated against the same database
+    run = uuid.uuid4().hex[:8]
+    usernames = [f"bench-{run}-{i}" for i in range(users)]
+    rng = random.Random(0)
+    user_locations = {username: rng.sample(LOCATIONS, min(favorites, len(LOCATIONS))) for username in usernames}
+
+    results = {}
+    results['create-user'] = run_phase('create-user', [
+        lambda u=u: session.post(f"{api}/create-user", json={'username': u, 'password': 'password'})
+        for u in usernames], concurrency)
+    results['login'] = run_phase('login', [
+        lambda u=u: session.post(f"{api}/login", json={'username': u, 'password': 'password'})
+        for u in usernames], concurrency)
+    results['add-favorite'] = run_phase('add-favorite', [
+        lambda u=u, loc=loc: session.post(f"{api}/add-favorite", json={'username': u, 'location': loc})
+        for u in usernames for loc in user_locations[u]], concurrency)
+
+    picks = [rng.choice(usernames) for _ in range(reads)]
+    results['get-favorites'] = run_phase('get-favorites', [
+        lambda u=u: session.get(f"{api}/get-favorites", params={'username': u})
+        for u in picks], concurrency)
+    results['get-favorite-weather'] = run_phase('get-favorite-weather', [
+        lambda u=u, loc=rng.choice(user_locations[u]): session.get(
+            f"{api}/get-favorite-weather", params={'username': u, 'location': loc})
+        for u in picks], concurrency)
+    return results
+
+
+def serve_app(mode: str, workdir: str, stub_url: str, port: int) -> str:
+    """
+    Start the app on a background thread against the stub and a throwaway database.
+
+    Args:
+        mode (str): 'wsgi' for the threaded Flask server or 'asgi' for uvicorn.
+        workdir (str): the directory to keep the databases in.
+        stub_url (str): the stub server's base url.
+        port (int): the port to listen on.
+
+    Returns:
+        str: the app's base url.
+    """
+    # app_init reads its configuration when the default app is first built
+    os.environ['WEATHER_API_URL'] = stub_url
+    os.environ['API_KEY'] = 'bench'
+    os.environ['DB_URI'] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    os.environ['HISTORY_DB_PATH'] = os.path.join(workdir, 'history.db')
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    os.environ['PREWARM_ENABLED'] = 'false'
+    # Measure the app, not the rate limit in front of the stub
+    os.environ.setdefault('WEATHER_RATE_LIMIT', '100000')
+    os.environ.setdefault('WEATHER_RATE_BURST', '100000')
+
+    # Per-request logging would dominate the measurements
+    logging.disable(logging.INFO)
+
+    if mode == 'asgi':
+        import uvicorn
+        from asgi import application
+
+        server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=port, log_level='warning'))
+        threading.Thread(target=server.run, name="bench-app", daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+    else:
+        from werkzeug.serving import make_server
+        from app_init import app
+
+        server = make_server('127.0.0.1', port, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000', help="the app to load, unless --serve is set")
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'], help="start the stub and the app in this process")
+    parser.add_argument('--port', type=int, default=5099, help="the port --serve listens on")
+    parser.add_argument('--latency', type=float, default=0.05, help="stub latency in seconds, with --serve")
+    parser.add_argument('--jitter', type=float, default=0.0, help="stub latency jitter in seconds, with --serve")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="stub error rate, with --serve")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--favorites', type=int, default=5, help="favorites added per user")
+    parser.add_argument('--reads', type=int, default=1000, help="calls made to each read route")
+    parser.add_argument('--output', help="the JSON file to write, defaults to benchmarks/results/")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    base_url = args.base_url
+    if args.serve:
+        stub = start_stub_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+        workdir = tempfile.mkdtemp(prefix='weather-bench-')
+        base_url = serve_app(args.serve, workdir, stub.base_url, args.port)
+        config['base_url'] = base_url
+
+    results = run_load_test(base_url, args.users, args.favorites, args.reads, args.concurrency)
+    if args.serve:
+        results['upstream'] = {'calls': stub.calls}
+    print_table({name: summary for name, summary in results.items() if 'count' in summary})
+    print(f"Saved {save_results('load', config, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Micro-benchmarks of the account and favorites models, run in-process on an in-memory database
+with no upstream calls.
+
+    python -m benchmarks.micro --iterations 2000
+    python -m benchmarks.micro --cache-backend memory
+
+Results are printed and saved as JSON under benchmarks/results/ (see benchmarks.compare).
+"""
+import argparse
+import gc
+import logging
+import time
+from typing import Callable
+
+from app_init import create_app
+from benchmarks.common import print_table, save_results, summarize
+from config import TestConfig
+from db import db
+from utils.redis_cache import InMemoryBackend, NullBackend, set_cache_backend
+from weather.models.account_model import User
+from weather.models.current_weather import weather_cache
+from weather.models.favorites_manager import FavoritesModel
+from weather.models.history_store import HistoryStore, set_history_store
+from weather.models.location_index import CanonicalLocation, LocationIndex, set_location_index
+
+
+LOCATIONS = ['Boston', 'New York', 'Paris', 'London', 'Tokyo', 'Sydney', 'Cairo', 'Lima', 'Oslo', 'Seoul']
+
+
+def measure(func: Callable[[], object], iterations: int, warmup: int = 50) -> dict:
+    """
+    Time a function call by call, after a warmup, with the garbage collector paused.
+
+    Args:
+        func (Callable[[], object]): the call to time.
+        iterations (int): the number of timed calls.
+        warmup (int): the number of untimed calls made first.
+
+    Returns:
+        dict: the latency summary.
+    """
+    for _ in range(warmup):
+        func()
+    latencies = []
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            call_start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    return summarize(latencies, elapsed)
+
+
+def run_micro_benchmarks(iterations: int, favorites: int) -> dict:
+    """
+    Benchmark User.check_password and the FavoritesModel methods.
+
+    Args:
+        iterations (int): the number of timed calls per benchmark.
+        favorites (int): the number of favorites the benchmark user has.
+
+    Returns:
+        dict: the latency summary per benchmark.
+    """
+    app = create_app(TestConfig)
+
+    index = LocationIndex()
+    for location_id, name in enumerate(LOCATIONS, start=1):
+        index.add(name, CanonicalLocation(location_id, name))
+    set_location_index(index)
+    set_history_store(HistoryStore(':memory:'))
+
+    results = {}
+    with app.app_context():
+        db.create_all()
+        User.create_user('bench', 'password')
+        model = FavoritesModel(User.query.filter_by(username='bench').first().id)
+        locations = LOCATIONS[:favorites]
+        for location in locations:
+            model.add_favorite(location, 41.0, 9.4, 0.0, 70)
+        weather_cache.set('id:1', (41.0, 9.4, 0.0, 70))
+
+        results['check_password'] = measure(lambda: User.check_password('bench', 'password'), iterations)
+        results['check_password_wrong'] = measure(lambda: User.check_password('bench', 'wrong'), iterations)
+        results['favorites'] = measure(lambda: model.favorites, iterations)
+        results['get_favorite_weather'] = measure(lambda: model.get_favorite_weather(locations[-1]), iterations)
+        results['get_favorite_weather_alias'] = measure(
+            lambda: model.get_favorite_weather(f" {locations[-1].upper()} "), iterations)
+        results['get_all_favorites'] = measure(model.get_all_favorites, iterations)
+        results['get_all_favorites_current_weather'] = measure(model.get_all_favorites_current_weather, iterations)
+        results['get_weather_api_cached'] = measure(lambda: model.get_weather_api('Boston'), iterations)
+        results['add_favorite_update'] = measure(lambda: model.add_favorite('Boston', 42.0, 9.4, 0.0, 70), iterations)
+
+        db.session.remove()
+        db.drop_all()
+
+    set_location_index(None)
+    set_history_store(None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--favorites', type=int, default=5, help="favorites the benchmark user has")
+    parser.add_argument('--cache-backend', choices=['none', 'memory'], default='none')
+    parser.add_argument('--output', help="the JSON file to write, defaults to benchmarks/results/")
+    args = parser.parse_args()
+
+    # Per-call logging would dominate the measurements
+    logging.disable(logging.INFO)
+    set_cache_backend(InMemoryBackend() if args.cache_backend == 'memory' else NullBackend())
+    results = run_micro_benchmarks(args.iterations, min(args.favorites, len(LOCATIONS)))
+    print_table(results)
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    print(f"Saved {save_results('micro', config, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
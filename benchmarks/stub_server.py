@@ -0,0 +1,193 @@
+"""
+A local stand-in for the weatherapi.com endpoints the app calls, with configurable latency
+and error rate.
+
+Run it on its own and point the app at it with WEATHER_API_URL=http://127.0.0.1:8099/v1:
+
+    python -m benchmarks.stub_server --port 8099 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import zlib
+
+
+CONDITIONS = [(1000, 'Sunny'), (1003, 'Partly cloudy'), (1063, 'Patchy rain possible'), (1183, 'Light rain')]
+
+
+def location_id(query: str) -> int:
+    """Get the stable id the stub assigns to a location query."""
+    query = query.strip().lower()
+    if query.startswith('id:'):
+        return int(query[3:])
+    return zlib.crc32(query.encode()) % 10_000_000 + 1
+
+
+def stub_location(query: str) -> dict:
+    """Get the location object the stub returns for a query."""
+    location = location_id(query)
+    name = query.strip().title() if not query.strip().lower().startswith('id:') else f"Place {location}"
+    return {'id': location, 'name': name, 'region': '', 'country': 'Stubland',
+            'lat': round(location % 18000 / 100 - 90, 2), 'lon': round(location % 36000 / 100 - 180, 2)}
+
+
+def stub_current(query: str) -> dict:
+    """Get a current weather object that varies by location and by the minute."""
+    seed = location_id(query) + int(time.time() // 60)
+    code, text = CONDITIONS[seed % len(CONDITIONS)]
+    return {'last_updated_epoch': int(time.time()) // 60 * 60, 'temp_f': float(seed % 100),
+            'wind_mph': seed % 300 / 10, 'precip_in': seed % 50 / 100, 'humidity': seed % 100,
+            'condition': {'text': text, 'code': code}}
+
+
+def stub_forecast(query: str, days: int) -> list[dict]:
+    """Get the forecastday list for a location."""
+    seed = location_id(query)
+    today = int(time.time()) // 86400 * 86400
+    forecastdays = []
+    for day in range(days):
+        code, text = CONDITIONS[(seed + day) % len(CONDITIONS)]
+        temps = [float((seed + day + hour) % 100) for hour in range(24)]
+        forecastdays.append({
+            'date_epoch': today + day * 86400,
+            'day': {'maxtemp_f': max(temps), 'mintemp_f': min(temps), 'avgtemp_f': round(sum(temps) / 24, 1),
+                    'maxwind_mph': (seed + day) % 300 / 10, 'totalprecip_in': (seed + day) % 50 / 100,
+                    'avghumidity': (seed + day) % 100, 'condition': {'text': text, 'code': code}},
+            'hour': [{'time_epoch': today + day * 86400 + hour * 3600, 'temp_f': temp} for hour, temp in enumerate(temps)],
+        })
+    return forecastdays
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves current.json, forecast.json, search.json and bulk current.json queries."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def delay_or_fail(self) -> bool:
+        """Apply the configured latency, then report whether this call should fail."""
+        server = self.server
+        time.sleep(server.latency + random.uniform(0, server.jitter))
+        with server.lock:
+            server.calls += 1
+        if random.random() < server.error_rate:
+            self.send_json(503, {'error': {'code': 9999, 'message': 'Stub injected failure.'}})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        query = params.get('q', '')
+        if self.delay_or_fail():
+            return
+
+        endpoint = url.path.rsplit('/', 1)[-1]
+        if endpoint == 'search.json':
+            results = [] if query.strip().lower().startswith('nowhere') else [stub_location(query)]
+            self.send_json(200, results)
+        elif endpoint == 'current.json':
+            self.send_json(200, {'location': stub_location(query), 'current': stub_current(query)})
+        elif endpoint == 'forecast.json':
+            days = int(params.get('days', 3))
+            self.send_json(200, {'location': stub_location(query), 'current': stub_current(query),
+                                 'forecast': {'forecastday': stub_forecast(query, days)}})
+        else:
+            self.send_json(404, {'error': {'code': 1005, 'message': 'API request url is invalid.'}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.delay_or_fail():
+            return
+
+        if url.path.endswith('current.json'):
+            bulk = [{'query': {'custom_id': item.get('custom_id'), 'q': item['q'],
+                               'location': stub_location(item['q']), 'current': stub_current(item['q'])}}
+                    for item in body.get('locations', [])]
+            self.send_json(200, {'bulk': bulk})
+        else:
+            self.send_json(404, {'error': {'code': 1005, 'message': 'API request url is invalid.'}})
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    The stub weatherapi.com server.
+
+    Attributes:
+        latency (float): Seconds every call waits before answering.
+        jitter (float): Up to this many extra seconds are added to each call at random.
+        error_rate (float): The fraction of calls answered with a 503.
+        calls (int): The number of calls received.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """The url to set WEATHER_API_URL to."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                      error_rate: float = 0.0) -> StubServer:
+    """
+    Start the stub server on a daemon thread.
+
+    Args:
+        host (str): the interface to listen on.
+        port (int): the port to listen on, 0 for any free port.
+        latency (float): seconds every call waits before answering.
+        jitter (float): up to this many extra seconds added to each call at random.
+        error_rate (float): the fraction of calls answered with a 503.
+
+    Returns:
+        StubServer: the running server; call shutdown() to stop it.
+    """
+    server = StubServer((host, port), latency, jitter, error_rate)
+    threading.Thread(target=server.serve_forever, name="weather-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds every call waits")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra seconds per call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of calls answered with a 503")
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), args.latency, args.jitter, args.error_rate)
+    print(f"Stub weatherapi listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
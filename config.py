@@ -1,15 +1,139 @@
 import os
 
-class ProductionConfig():
+from sqlalchemy.engine import make_url
+
+
+class Config():
+    """
+    Settings shared by every environment.
+
+    Settings left as None are read from the environment when create_app builds the app, not
+    when this module is imported, so tests and commands can set them first.
+    """
+    DEBUG = False
+    TESTING = False
+    SQLALCHEMY_DATABASE_URI = None  # DB_URI, or DATABASE_URL as set by docker compose
+    SQLALCHEMY_TRACK_MODIFICATIONS = False  # The Redis write-throughs listen to session events instead
+    DEFAULT_DATABASE_URI = 'sqlite:///app.db'
+    SQLALCHEMY_ENGINE_OPTIONS = None  # DB_POOL_*, connection pool sizing
+    SQLALCHEMY_BINDS = None  # DB_READ_URI, a read-only bind for login and favorites reads
+    SQLITE_PRAGMAS = None  # DB_SQLITE_*, applied to every new SQLite connection
+    AUTO_CREATE_SCHEMA = None  # AUTO_CREATE_SCHEMA, create missing tables on the first request
+    PREWARM_ENABLED = None  # PREWARM_ENABLED, start the prewarmer on the first request
+    HEALTH_PROBE_ENABLED = None  # HEALTH_PROBE_ENABLED, start the background health prober on the first request
+    USERNAME_INDEX_ENABLED = None  # USERNAME_INDEX_ENABLED, build the username index in the background on the first request
+
+class DevelopmentConfig(Config):
+    """Local development configuration, the default."""
+
+class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
-    SQLALCHEMY_TRACK_MODIFICATIONS = True  # This would almost universally be false in a Flask app
-                                           # But we are doing unnecessarily complicated Redis
-                                           # write-throughs
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', "DATABASE_URL=sqlite:////app/db/app.db")  # Production database URI from environment
+    DEFAULT_DATABASE_URI = 'sqlite:////app/db/app.db'
 
-class TestConfig():
+class TestConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory database for tests
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory database for tests
+    PREWARM_ENABLED = False
+    HEALTH_PROBE_ENABLED = False
+    USERNAME_INDEX_ENABLED = False
+
+
+CONFIGS = {'development': DevelopmentConfig, 'production': ProductionConfig, 'test': TestConfig}
+
+
+def config_from_env() -> type:
+    """
+    Get the configuration named by APP_ENV.
+
+    Returns:
+        type: the configuration class, DevelopmentConfig when APP_ENV is unset.
+
+    Raises:
+        ValueError: if APP_ENV names no configuration.
+    """
+    name = os.getenv("APP_ENV", "development").lower()
+    if name not in CONFIGS:
+        raise ValueError(f"Invalid APP_ENV: {name}, should be development, production or test.")
+    return CONFIGS[name]
+
+
+def settings_from_env(config: type) -> dict:
+    """
+    Read the settings a configuration leaves to the environment.
+
+    Args:
+        config (type): the configuration class.
+
+    Returns:
+        dict: the database uri, engine options and read bind, and startup switches.
+    """
+    uri = config.SQLALCHEMY_DATABASE_URI or os.getenv("DB_URI") or os.getenv("DATABASE_URL") \
+        or config.DEFAULT_DATABASE_URI
+    read_uri = os.getenv("DB_READ_URI")
+    return {
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options_from_env(uri),
+        'SQLALCHEMY_BINDS': {'read': {'url': read_uri, **engine_options_from_env(read_uri)}} if read_uri else {},
+        'SQLITE_PRAGMAS': sqlite_pragmas_from_env(),
+        'AUTO_CREATE_SCHEMA': os.getenv("AUTO_CREATE_SCHEMA", "true").lower() == "true",
+        'PREWARM_ENABLED': os.getenv("PREWARM_ENABLED", "false").lower() == "true",
+        'HEALTH_PROBE_ENABLED': os.getenv("HEALTH_PROBE_ENABLED", "true").lower() == "true",
+        'USERNAME_INDEX_ENABLED': os.getenv("USERNAME_INDEX_ENABLED", "true").lower() == "true",
+    }
+
+
+def engine_options_from_env(uri: str) -> dict:
+    """
+    Read the connection pool settings for an engine from DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE and DB_POOL_PRE_PING.
+
+    Args:
+        uri (str): the database uri the engine connects to.
+
+    Returns:
+        dict: the engine options, empty for an in-memory SQLite database, which shares one connection.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'pool_size': int(os.getenv("DB_POOL_SIZE", "10")),
+        'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        'pool_timeout': float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        'pool_recycle': int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        'pool_pre_ping': os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+
+SQLITE_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SQLITE_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def sqlite_pragmas_from_env() -> dict:
+    """
+    Read the pragmas applied to SQLite connections from DB_SQLITE_JOURNAL_MODE,
+    DB_SQLITE_SYNCHRONOUS, DB_SQLITE_BUSY_TIMEOUT (milliseconds) and DB_SQLITE_MMAP_SIZE (bytes).
+
+    Returns:
+        dict: each pragma mapped to its value. WAL lets readers carry on while a writer commits.
+
+    Raises:
+        ValueError: if the journal mode or synchronous setting is not one SQLite knows.
+    """
+    journal_mode = os.getenv("DB_SQLITE_JOURNAL_MODE", "WAL").upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"Invalid DB_SQLITE_JOURNAL_MODE: {journal_mode}, "
+                         f"should be one of {', '.join(sorted(SQLITE_JOURNAL_MODES))}.")
+    synchronous = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    if synchronous not in SQLITE_SYNCHRONOUS:
+        raise ValueError(f"Invalid DB_SQLITE_SYNCHRONOUS: {synchronous}, "
+                         f"should be one of {', '.join(sorted(SQLITE_SYNCHRONOUS))}.")
+    return {
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'busy_timeout': int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000")),
+        'mmap_size': int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    }
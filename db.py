@@ -1,3 +1,85 @@
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+# The bind key of the optional read-only engine, configured by DB_READ_URI
+READ_BIND = 'read'
+
+
+def configure_engines(app: Flask) -> None:
+    """
+    Apply the app's SQLITE_PRAGMAS to every new connection of its SQLite engines.
+
+    Args:
+        app (Flask): an app already registered with db.init_app.
+    """
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite' and pragmas:
+            event.listen(engine, 'connect', lambda connection, record: apply_sqlite_pragmas(connection, pragmas))
+
+
+def apply_sqlite_pragmas(connection, pragmas: dict) -> None:
+    """
+    Set pragmas on a new SQLite connection.
+
+    Args:
+        connection: the DBAPI connection.
+        pragmas (dict): each pragma mapped to its value, validated when the config was read.
+    """
+    cursor = connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def read_bind() -> dict:
+    """
+    Get the bind arguments that send a query to the read-only engine.
+
+    Pass them as Session.execute(statement, bind_arguments=read_bind()) for reads that can
+    tolerate replica lag. Without DB_READ_URI they are empty and the query uses the primary.
+    Must run inside an app context.
+
+    Returns:
+        dict: {'bind': the read engine}, or {} when no read bind is configured.
+    """
+    engine = db.engines.get(READ_BIND)
+    return {'bind': engine} if engine is not None else {}
+
+
+# The error codes each driver reports for a duplicate key: the SQLSTATE of PostgreSQL and
+# other standard databases, MySQL's ER_DUP_ENTRY, and SQLite's extended result codes
+UNIQUE_VIOLATION_SQLSTATE = '23505'
+MYSQL_DUP_ENTRY = 1062
+SQLITE_UNIQUE_ERRORS = ('SQLITE_CONSTRAINT_UNIQUE', 'SQLITE_CONSTRAINT_PRIMARYKEY')
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    """
+    Check whether an integrity error was raised by a unique constraint, rather than by a NOT
+    NULL, foreign key or check constraint.
+
+    Args:
+        error (IntegrityError): the error raised by the session.
+
+    Returns:
+        bool: True if the statement would have duplicated a unique key.
+    """
+    orig = error.orig
+    sqlstate = getattr(orig, 'sqlstate', None) or getattr(orig, 'pgcode', None)
+    if sqlstate is not None:
+        return sqlstate == UNIQUE_VIOLATION_SQLSTATE
+    errorname = getattr(orig, 'sqlite_errorname', None)
+    if errorname is not None:
+        return errorname in SQLITE_UNIQUE_ERRORS
+    if getattr(orig, 'args', None) and orig.args[0] == MYSQL_DUP_ENTRY:
+        return True
+    return 'UNIQUE constraint failed' in str(orig)
@@ -104,7 +104,7 @@ logout_user() {
 add_favorite() {
   echo "Adding a favorite..."
   curl -s -X POST "$BASE_URL/add-favorite" -H "Content-Type: application/json" \
-    -d '{"location":"Boston"}' | grep -q '"status": "success"'
+    -d '{"username":"testuser", "location":"Boston"}' | grep -q '"status": "success"'
   if [ $? -eq 0 ]; then
     echo "Location added successfully."
   else
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+# Apps built from the environment check their dependencies on demand instead of on a background
+# thread, and leave the username index for the tests to build
+os.environ.setdefault("HEALTH_PROBE_ENABLED", "false")
+os.environ.setdefault("USERNAME_INDEX_ENABLED", "false")
+
+from app_init import create_app
+from config import TestConfig
+from db import db
+
+
+@pytest.fixture
+def app():
+    """Fixture to provide a Flask app bound to an in-memory database."""
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def session(app):
+    """Fixture to provide the database session for the test app."""
+    yield db.session
+
+
+@pytest.fixture
+def cache_backend():
+    """Fixture to serve the Redis cache from an in-memory stand-in for the test."""
+    from utils.redis_cache import InMemoryBackend, set_cache_backend
+
+    backend = InMemoryBackend()
+    set_cache_backend(backend)
+    yield backend
+    set_cache_backend(None)
+
+
+@pytest.fixture(autouse=True)
+def history_store():
+    """Fixture to record weather history in a fresh in-memory store for every test."""
+    from weather.models.history_store import HistoryStore, set_history_store
+
+    store = HistoryStore(':memory:')
+    set_history_store(store)
+    yield store
+    set_history_store(None)
+    store.close()
+
+
+# Canonical locations every test can resolve without calling the search api
+KNOWN_LOCATIONS = {'Boston': 1, 'New York': 2, 'Paris': 3, 'London': 4}
+
+
+@pytest.fixture(autouse=True)
+def location_index():
+    """Fixture to resolve locations through a fresh index seeded with the known locations."""
+    from weather.models.location_index import CanonicalLocation, LocationIndex, set_location_index
+
+    index = LocationIndex()
+    for name, location_id in KNOWN_LOCATIONS.items():
+        index.add(name, CanonicalLocation(location_id, name))
+    set_location_index(index)
+    yield index
+    set_location_index(None)
+
+
+@pytest.fixture(autouse=True)
+def geo_index():
+    """Fixture to give every test an empty geo index."""
+    from weather.models.geo_index import GeoIndex, set_geo_index
+
+    index = GeoIndex()
+    set_geo_index(index)
+    yield index
+    set_geo_index(None)
+
+
+@pytest.fixture(autouse=True)
+def upstream_guards():
+    """Fixture to give every test a fresh upstream rate limit and circuit breaker."""
+    from weather.clients.upstream_scheduler import set_upstream_breaker, set_upstream_scheduler
+
+    set_upstream_scheduler(None)
+    set_upstream_breaker(None)
+    yield
+    set_upstream_scheduler(None)
+    set_upstream_breaker(None)
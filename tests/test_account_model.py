@@ -32,6 +32,11 @@ def test_create_duplicate_user(session, sample_user):
     with pytest.raises(ValueError, match="User with username 'testuser' already exists"):
         User.create_user(**sample_user)
 
+def test_create_user_other_integrity_error(session):
+    """Test that a constraint other than the unique username is not reported as a duplicate."""
+    with pytest.raises(IntegrityError, match="NOT NULL"):
+        User.create_user(None, "password")
+
 ##########################################################
 # User Authentication
 ##########################################################
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import inspect
+
+from app_init import create_app
+from config import DevelopmentConfig, ProductionConfig, TestConfig, config_from_env
+from db import db
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tables(app) -> set[str]:
+    with app.app_context():
+        return set(inspect(db.engine).get_table_names())
+
+
+def test_create_app_applies_config():
+    """Test that the app is built from the given configuration."""
+    app = create_app(TestConfig)
+    assert app.config['TESTING'] is True
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///:memory:'
+    assert app.config['PREWARM_ENABLED'] is False
+    assert '/api/login' in {rule.rule for rule in app.url_map.iter_rules()}
+
+def test_create_app_reads_environment(monkeypatch):
+    """Test that settings left to the environment are read when the app is built."""
+    monkeypatch.setenv("APP_ENV", "production")
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///production.db")
+    monkeypatch.delenv("DB_URI", raising=False)
+    monkeypatch.setenv("AUTO_CREATE_SCHEMA", "false")
+    app = create_app()
+    assert app.config['DEBUG'] is False
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///production.db'
+    assert app.config['AUTO_CREATE_SCHEMA'] is False
+
+def test_config_from_env(monkeypatch):
+    """Test that APP_ENV picks the configuration, and error when it names none."""
+    monkeypatch.delenv("APP_ENV", raising=False)
+    assert config_from_env() is DevelopmentConfig
+    monkeypatch.setenv("APP_ENV", "Production")
+    assert config_from_env() is ProductionConfig
+    monkeypatch.setenv("APP_ENV", "staging")
+    with pytest.raises(ValueError, match="Invalid APP_ENV: staging"):
+        config_from_env()
+
+def test_schema_created_on_first_request(monkeypatch):
+    """Test that building the app leaves the database alone until the first request."""
+    monkeypatch.setenv("DB_URI", "sqlite://")
+    app = create_app(DevelopmentConfig)
+    assert tables(app) == set()
+
+    assert app.test_client().get('/api/db-check').status_code == 200
+    assert {'users', 'favorites', 'locations'} <= tables(app)
+
+def test_migrate_command(monkeypatch):
+    """Test that the migrate command creates the schema when it is not created on first request."""
+    monkeypatch.setenv("DB_URI", "sqlite://")
+    monkeypatch.setenv("AUTO_CREATE_SCHEMA", "false")
+    app = create_app(DevelopmentConfig)
+    app.test_client().get('/api/db-check')
+    assert tables(app) == set()
+
+    result = app.test_cli_runner().invoke(args=['migrate'])
+    assert result.exit_code == 0, result.output
+    assert 'users' in tables(app)
+
+def test_import_is_cheap(tmp_path):
+    """
+    Test that importing the app module builds no app, touches no database, skips the HTTP
+    client and starts no thread, not even the log listener.
+    """
+    database = tmp_path / 'app.db'
+    env = {**os.environ, 'DB_URI': f"sqlite:///{database}"}
+    code = "import sys, threading, app_init; " \
+        "print(app_init._default_app is None, 'requests' in sys.modules, threading.active_count())"
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout.split()
+    assert output == ['True', 'False', '1']
+    assert not database.exists()
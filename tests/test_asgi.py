@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+# app_init builds its default app on first access, from DB_URI
+os.environ.setdefault("DB_URI", "sqlite://")
+
+from asgi import application
+from app_init import app as flask_app
+from db import db
+from utils.circuit_breaker import CircuitOpenError
+from weather.models.account_model import User
+from weather.health import HealthProber
+from weather.models.favorites_manager import FavoritesModel
+
+
+@pytest.fixture
+def asgi_db():
+    """Fixture to give the ASGI app a fresh database with one user."""
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        User.create_user("testuser", "password")
+        user_id = User.query.filter_by(username="testuser").first().id
+    yield user_id
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def request(method, path, **kwargs) -> httpx.Response:
+    """Send one request through the ASGI application."""
+    async def call():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://app") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(call())
+
+
+def test_add_favorite_async(asgi_db, mocker):
+    """Test that add-favorite fetches the weather on the event loop and saves the favorite."""
+    fetch = mocker.patch('asgi.get_current_weather_with_age_async',
+                         mocker.AsyncMock(return_value=((41.0, 9.4, 0.0, 70), 0.0)))
+
+    response = request('POST', '/api/add-favorite', json={'username': 'testuser', 'location': 'boston'})
+
+    assert response.status_code == 200
+    assert response.json() == {'status': 'success', 'location': 'boston', 'age': 0.0, 'stale': False}
+    fetch.assert_awaited_once_with('boston')
+    with flask_app.app_context():
+        assert FavoritesModel(asgi_db).favorites == {'Boston': {'temp': 41.0, 'wind': 9.4, 'precipitation': 0.0, 'humidity': 70}}
+
+def test_add_favorite_async_invalid_input(asgi_db):
+    """Test error when add-favorite is missing fields or names an unknown user."""
+    assert request('POST', '/api/add-favorite', json={'username': 'testuser'}).status_code == 400
+    assert request('POST', '/api/add-favorite', content=b'not json').status_code == 400
+    response = request('POST', '/api/add-favorite', json={'username': 'nobody', 'location': 'Boston'})
+    assert response.status_code == 400
+    assert response.json() == {'error': 'Invalid username, user does not exist'}
+
+def test_add_favorite_async_upstream_error(asgi_db, mocker):
+    """Test that an upstream failure is reported without saving the favorite."""
+    mocker.patch('asgi.get_current_weather_with_age_async', mocker.AsyncMock(side_effect=httpx.ConnectError("down")))
+
+    response = request('POST', '/api/add-favorite', json={'username': 'testuser', 'location': 'Boston'})
+
+    assert response.status_code == 500
+    with flask_app.app_context():
+        assert FavoritesModel(asgi_db).favorites == {}
+
+def test_add_favorite_async_upstream_unavailable(asgi_db, mocker):
+    """Test that a call refused by the upstream guards is a 503 telling the client when to retry."""
+    mocker.patch('asgi.get_current_weather_with_age_async',
+                 mocker.AsyncMock(side_effect=CircuitOpenError('weatherapi', 12.2)))
+
+    response = request('POST', '/api/add-favorite', json={'username': 'testuser', 'location': 'Boston'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '13'
+    assert response.json() == {'error': 'Weather service is unavailable, please retry shortly'}
+
+@pytest.fixture
+def prober(mocker):
+    """Fixture to give the ASGI app a health prober that has not checked anything yet."""
+    prober = HealthProber(flask_app, interval=60)
+    mocker.patch.dict(flask_app.extensions, {'health_prober': prober})
+    return prober
+
+def test_healthcheck_async(asgi_db, prober, mocker):
+    """Test that the health routes serve the prober's cached result, checking once when it has none."""
+    get = mocker.patch('weather.health.get_weather_client').return_value.get
+    get.return_value = httpx.Response(200)
+
+    response = request('GET', '/api/health')
+    assert response.status_code == 200
+    assert response.json()['status'] == 'healthy'
+    assert request('GET', '/api/health/ready').json()['checks']['weatherapi']['status'] == 'healthy'
+    assert request('GET', '/api/health/live').json()['status'] == 'alive'
+    assert get.call_count == 1
+
+def test_healthcheck_async_degraded(asgi_db, prober, mocker):
+    """Test that a failing upstream degrades readiness without failing it."""
+    mocker.patch('weather.health.get_weather_client').return_value.get.side_effect = httpx.ConnectError("down")
+
+    response = request('GET', '/api/health/ready')
+    assert response.status_code == 200
+    assert response.json()['status'] == 'degraded'
+    assert response.json()['checks']['weatherapi']['error'] == 'down'
+
+def test_other_routes_served_by_flask(asgi_db):
+    """Test that routes without an async version fall through to the Flask app."""
+    response = request('GET', '/api/get-favorites', params={'username': 'testuser'})
+    assert response.status_code == 200
+    assert response.json() == {'status': 'success', 'favorites': {}}
+
+def test_metrics_endpoint(asgi_db, prober, mocker):
+    """Test that native and Flask routes both show up in the Prometheus metrics."""
+    mocker.patch('weather.health.get_weather_client').return_value.get.return_value = httpx.Response(200)
+    request('GET', '/api/health')
+    request('GET', '/api/get-favorites', params={'username': 'testuser'})
+
+    response = request('GET', '/api/metrics')
+
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'http_requests_total{route="/api/health",method="GET",status="200"}' in response.text
+    assert 'http_requests_total{route="/api/get-favorites",method="GET",status="200"}' in response.text
+    assert 'db_query_duration_seconds_count{operation="SELECT"}' in response.text
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import httpx
+import pytest
+
+from weather.clients.async_weather_client import AsyncWeatherClient, close_async_weather_client, get_async_weather_client
+from weather.models.current_weather import get_current_weather_async, weather_cache
+
+
+CURRENT = {'current': {'temp_f': 41.0, 'wind_mph': 9.4, 'precip_in': 0.0, 'humidity': 70}}
+
+@pytest.fixture(autouse=True)
+def clear_weather_cache():
+    weather_cache.clear()
+    yield
+    weather_cache.clear()
+
+@pytest.fixture
+def upstream(mocker):
+    """Fixture to replace the async client used for weather lookups with a slow canned upstream."""
+    async def get(endpoint, params=None, timeout=None):
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=CURRENT, request=httpx.Request('GET', 'http://weather.test/v1/current.json'))
+
+    client = mocker.patch('weather.models.current_weather.get_async_weather_client').return_value
+    client.get = mocker.AsyncMock(side_effect=get)
+    return client.get
+
+
+def test_get_sends_key_and_params():
+    """Test that calls go to the endpoint url with the api key and query parameters."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=CURRENT)
+
+    async def call():
+        client = AsyncWeatherClient("http://weather.test/v1/", "test-key", transport=httpx.MockTransport(handler))
+        response = await client.get("/current.json", {"q": "id:1"})
+        await client.aclose()
+        return response
+
+    response = asyncio.run(call())
+    assert response.json() == CURRENT
+    assert str(requests[0].url) == "http://weather.test/v1/current.json?key=test-key&q=id%3A1"
+
+def test_shared_client_per_event_loop(monkeypatch):
+    """Test that one loop reuses its client and is configured from the environment."""
+    monkeypatch.setenv("WEATHER_API_URL", "http://weather.test/v1")
+
+    async def call():
+        client = get_async_weather_client()
+        assert get_async_weather_client() is client
+        await close_async_weather_client()
+        return client
+
+    first, second = asyncio.run(call()), asyncio.run(call())
+    assert first.base_url == "http://weather.test/v1"
+    assert first is not second
+
+def test_get_current_weather_async_cached(upstream):
+    """Test that async lookups share the weather cache with the synchronous path."""
+    assert asyncio.run(get_current_weather_async("Boston")) == (41.0, 9.4, 0.0, 70)
+    assert weather_cache.get('id:1') == (41.0, 9.4, 0.0, 70)
+    assert asyncio.run(get_current_weather_async(" boston")) == (41.0, 9.4, 0.0, 70)
+    assert upstream.call_count == 1
+    upstream.assert_called_once_with("current.json", {"q": "id:1"})
+
+def test_get_current_weather_async_coalesces(upstream):
+    """Test that concurrent misses for one location share a single upstream call."""
+    async def call():
+        return await asyncio.gather(*(get_current_weather_async("Boston") for _ in range(50)))
+
+    assert set(asyncio.run(call())) == {(41.0, 9.4, 0.0, 70)}
+    assert upstream.call_count == 1
+
+def test_get_current_weather_async_concurrent_locations(upstream):
+    """Test that different locations are fetched concurrently, not one after another."""
+    async def call():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(get_current_weather_async(location) for location in ("Boston", "New York", "Paris")))
+        return loop.time() - start
+
+    assert asyncio.run(call()) < 0.12
+    assert upstream.call_count == 3
+
+def test_get_current_weather_async_refresh(upstream):
+    """Test that refresh skips a fresh cache entry."""
+    weather_cache.set('id:1', (0.0, 0.0, 0.0, 0))
+    assert asyncio.run(get_current_weather_async("Boston", refresh=True)) == (41.0, 9.4, 0.0, 70)
+    assert upstream.call_count == 1
+
+def test_history_recorded_off_the_event_loop(upstream, mocker):
+    """Test that the SQLite history write runs on a worker thread instead of blocking the loop."""
+    threads = []
+    record = mocker.patch('weather.models.current_weather.record_observation',
+                          side_effect=lambda *args: threads.append(threading.current_thread()))
+
+    asyncio.run(get_current_weather_async("Boston"))
+
+    record.assert_called_once_with('id:1', (41.0, 9.4, 0.0, 70), None)
+    assert threads != [threading.main_thread()]
@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks.common import percentile, summarize
+from benchmarks.compare import compare
+from benchmarks.stub_server import start_stub_server
+from weather.clients.weather_client import WeatherClient
+from weather.models.forecast_store import CompactForecast
+
+
+@pytest.fixture
+def stub():
+    server = start_stub_server()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def client(stub):
+    client = WeatherClient(stub.base_url, "test-key", max_retries=0)
+    yield client
+    client.close()
+
+
+def test_stub_search_and_current(client):
+    """Test that the stub resolves a location and serves its current weather by id."""
+    [location] = client.get("search.json", {"q": "Boston"}).json()
+    current = client.get("current.json", {"q": f"id:{location['id']}"}).json()['current']
+    assert {'temp_f', 'wind_mph', 'precip_in', 'humidity'} <= set(current)
+    assert client.get("search.json", {"q": "nowhere"}).json() == []
+
+def test_stub_bulk_and_forecast(client):
+    """Test that the stub answers bulk queries and forecasts the app can parse."""
+    body = {'locations': [{'q': 'id:1', 'custom_id': '0'}, {'q': 'id:2', 'custom_id': '1'}]}
+    bulk = client.post("current.json", {"q": "bulk"}, json=body).json()['bulk']
+    assert [item['query']['custom_id'] for item in bulk] == ['0', '1']
+
+    forecastdays = client.get("forecast.json", {"q": "id:1", "days": 5}).json()['forecast']['forecastday']
+    assert len(CompactForecast('id:1', forecastdays, 0, 0).to_dict()['days']) == 5
+
+def test_stub_error_rate(stub, client):
+    """Test that the stub injects failures at the configured rate."""
+    stub.error_rate = 1.0
+    assert client.get("current.json", {"q": "id:1"}).status_code == 503
+    assert stub.calls == 1
+
+def test_summarize():
+    """Test the latency percentiles and throughput of a summary."""
+    latencies = [i / 1000 for i in range(1, 101)]
+    assert percentile(latencies, 50) == pytest.approx(0.0505)
+    summary = summarize(latencies, elapsed=2.0, errors=3)
+    assert summary['count'] == 100 and summary['errors'] == 3 and summary['rps'] == 50.0
+    assert summary['p99_ms'] == pytest.approx(99.01)
+
+def test_compare_flags_regressions():
+    """Test that a latency increase beyond the threshold counts as a regression."""
+    before = {'results': {'login': summarize([0.010] * 10, 1.0)}}
+    after = {'results': {'login': summarize([0.012] * 10, 1.0)}}
+    assert compare(before, after, threshold=10)[1]
+    assert not compare(before, after, threshold=25)[1]
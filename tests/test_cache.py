@@ -0,0 +1,142 @@
+import pytest
+import threading
+
+from utils.cache import TTLCache
+
+
+class FakeClock:
+    """A manually advanced clock for expiring entries without sleeping."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return TTLCache(maxsize=2, ttl=10, clock=clock)
+
+
+def test_invalid_arguments():
+    """Test that a non-positive size or negative ttl is rejected."""
+    with pytest.raises(ValueError, match="Invalid maxsize"):
+        TTLCache(maxsize=0)
+    with pytest.raises(ValueError, match="Invalid ttl"):
+        TTLCache(ttl=-1)
+
+def test_get_and_set(cache):
+    """Test storing and retrieving a value."""
+    cache.set("boston", 1)
+    assert cache.get("boston") == 1
+    assert cache.get("london") is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_entries_expire(cache, clock):
+    """Test that entries are not served after their ttl."""
+    cache.set("boston", 1)
+    clock.now = 10
+    assert cache.get("boston") is None
+    assert len(cache) == 0
+
+def test_lru_eviction(cache):
+    """Test that the least recently used entry is evicted when full."""
+    cache.set("boston", 1)
+    cache.set("london", 2)
+    cache.get("boston")
+    cache.set("paris", 3)
+    assert cache.get("london") is None
+    assert cache.get("boston") == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_get_or_load_caches_result(cache):
+    """Test that the loader only runs on a miss."""
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "sunny"
+
+    assert cache.get_or_load("boston", loader) == "sunny"
+    assert cache.get_or_load("boston", loader) == "sunny"
+    assert len(calls) == 1
+
+def test_get_or_load_force_reloads(cache):
+    """Test that force skips a fresh entry."""
+    cache.set("boston", "sunny")
+    assert cache.get_or_load("boston", lambda: "rainy", force=True) == "rainy"
+    assert cache.get("boston") == "rainy"
+
+def test_get_or_load_error_not_cached(cache):
+    """Test that a failing loader leaves nothing behind."""
+    def loader():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError, match="upstream down"):
+        cache.get_or_load("boston", loader)
+    assert cache.get_or_load("boston", lambda: "sunny") == "sunny"
+
+def test_get_or_load_coalesces(cache):
+    """Test that concurrent misses wait on the first loader."""
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "sunny"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_load("boston", loader)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_load("boston", loader))) for _ in range(4)]
+    for follower in followers:
+        follower.start()
+    while cache.stats()['coalesced'] < 4:
+        pass
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert results == ["sunny"] * 5
+    assert len(calls) == 1
+
+def test_get_with_age_serves_stale(clock):
+    """Test that expired entries are served with their age until stale_ttl runs out."""
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock, stale_ttl=20)
+    cache.set("boston", 1)
+    clock.now = 4
+    assert cache.get_with_age("boston") == (1, 4)
+    clock.now = 15
+    assert cache.get("boston") is None
+    assert cache.get_with_age("boston") == (1, 15)
+    assert cache.stats()['stale_hits'] == 1
+    clock.now = 30
+    assert cache.get_with_age("boston") is None
+    assert len(cache) == 0
+
+def test_peek_with_age_leaves_stats_and_order(clock):
+    """Test that peeking counts nothing and does not save an entry from eviction."""
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock, stale_ttl=20)
+    cache.set("boston", 1)
+    cache.set("paris", 2)
+    clock.now = 15
+    assert cache.peek_with_age("boston") == (1, 15)
+    assert cache.peek_with_age("london") is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['stale_hits'], stats['misses']) == (0, 0, 0)
+
+    cache.set("london", 3)
+    assert cache.peek_with_age("boston") is None
+    clock.now = 30
+    assert cache.peek_with_age("paris") is None
@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import event, text
+
+from app_init import create_app
+from config import DevelopmentConfig, engine_options_from_env, sqlite_pragmas_from_env
+from db import READ_BIND, db
+from weather.models.account_model import User
+from weather.models.favorite_model import favorites_cache_key
+from weather.models.favorites_manager import FavoritesModel
+
+
+@pytest.fixture
+def file_app(tmp_path, monkeypatch):
+    """Fixture to provide an app on a SQLite file with a read bind on a second pool to the same file."""
+    uri = f"sqlite:///{tmp_path / 'app.db'}"
+    monkeypatch.setenv("DB_URI", uri)
+    monkeypatch.setenv("DB_READ_URI", uri)
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    app = create_app(DevelopmentConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # The read bind's metadata is shared by every app using db, and only this one has the bind
+    db.metadatas.pop(READ_BIND, None)
+
+def record_statements(engine) -> list[str]:
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_sqlite_pragmas_applied(file_app):
+    """Test that every new connection runs in WAL mode with the configured busy timeout and mmap size."""
+    for engine in db.engines.values():
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+            assert connection.execute(text("PRAGMA mmap_size")).scalar() == 256 * 1024 * 1024
+
+def test_pool_options_applied(file_app):
+    """Test that the pool settings reach both engines."""
+    assert db.engine.pool.size() == 3
+    assert db.engines[READ_BIND].pool.size() == 3
+    assert db.engine.pool._pre_ping is True
+
+def test_reads_use_read_bind(file_app):
+    """Test that login and favorites reads go to the read engine and writes to the primary."""
+    reads = record_statements(db.engines[READ_BIND])
+    writes = record_statements(db.engine)
+
+    User.create_user("testuser", "password")
+    assert User.check_password("testuser", "password")
+    assert FavoritesModel(User.get_cached("testuser")['id']).favorites == {}
+
+    assert any(statement.lstrip().startswith('INSERT INTO users') for statement in writes)
+    assert not any('FROM favorites' in statement or 'FROM users' in statement for statement in writes)
+    assert any('FROM users' in statement for statement in reads)
+    assert any('FROM favorites' in statement for statement in reads)
+
+def test_replica_reads_not_cached(file_app, cache_backend):
+    """Test that rows read from the read bind are not cached, so a lagging replica cannot refill the cache."""
+    User.create_user("testuser", "password")
+    user_id = User.get_cached("testuser")['id']
+    cache_backend.delete("user:testuser")
+
+    assert User.get_cached("testuser")['id'] == user_id
+    assert FavoritesModel(user_id).favorites == {}
+    assert cache_backend.get("user:testuser") is None
+    assert cache_backend.get(favorites_cache_key(user_id)) is None
+
+def test_engine_options_from_env(monkeypatch):
+    """Test that in-memory SQLite gets no pool settings and other databases get the configured ones."""
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    assert engine_options_from_env("sqlite://") == {}
+    assert engine_options_from_env("sqlite:///:memory:") == {}
+    options = engine_options_from_env("postgresql://db/weather")
+    assert options['max_overflow'] == 5 and options['pool_pre_ping'] is False
+
+def test_invalid_sqlite_pragmas(monkeypatch):
+    """Test error when a pragma value is not one SQLite knows."""
+    monkeypatch.setenv("DB_SQLITE_JOURNAL_MODE", "wal; DROP TABLE users")
+    with pytest.raises(ValueError, match="Invalid DB_SQLITE_JOURNAL_MODE"):
+        sqlite_pragmas_from_env()
+    monkeypatch.setenv("DB_SQLITE_JOURNAL_MODE", "delete")
+    monkeypatch.setenv("DB_SQLITE_SYNCHRONOUS", "sometimes")
+    with pytest.raises(ValueError, match="Invalid DB_SQLITE_SYNCHRONOUS"):
+        sqlite_pragmas_from_env()
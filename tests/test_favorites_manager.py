@@ -1,64 +1,84 @@
-import pytest
-import requests
-import os
+from concurrent.futures import ThreadPoolExecutor
 import json
+import pytest
+import sys
+import threading
+import time
 
+from weather.clients.upstream_scheduler import Priority, current_priority, upstream_priority
+from weather.models.account_model import User
+from weather.models.favorite_model import Favorite, FavoriteRecords
+from weather.models.current_weather import normalize_location, weather_cache
 from weather.models.favorites_manager import FavoritesModel
 
-load_dotenv()
-api_key = os.getenv("API_KEY")
-weather_api = "http://api.weatherapi.com/v1"
 
 @pytest.fixture
-def favorites_model():
+def user(session):
+    """Fixture to provide a saved user to own the favorites."""
+    User.create_user("testuser", "securepassword123")
+    return User.query.filter_by(username="testuser").first()
+
+@pytest.fixture
+def favorites_model(user):
     """Fixture to provide a new instance of FavoritesModel for each test."""
-    return FavoritesModel()
+    return FavoritesModel(user.id)
+
+def add_sample_favorites(favorites_model, sample_favorites):
+    """Save the sample favorites through the model."""
+    for location, weather in sample_favorites.items():
+        favorites_model.add_favorite(location, weather['temp'], weather['wind'], weather['precipitation'], weather['humidity'])
+
+@pytest.fixture(autouse=True)
+def clear_weather_cache():
+    """Fixture to keep cached weather from leaking between tests."""
+    weather_cache.clear()
+    yield
+    weather_cache.clear()
 
 # Fixture providing a sample favorites dictionary
 @pytest.fixture
 def sample_favorites():
     sample_favs = {}
-
-    query = {"key": api_key, "q": "Boston"}
-    response = requests.get(weather_api + "/current.json", params = query)
-    
-    parsed = json.loads(response)
-    sample_favs['Boston']['temp'] = parsed['current']['temp_f']
-    sample_favs['Boston']['wind'] = parsed['current']['wind_mph']
-    sample_favs['Boston']['precipitation'] = parsed['current']['precip_in']
-    sample_favs['Boston']['humidity'] = parsed['current']['humidity']
-
-    query = {"key": api_key, "q": "New York"}
-    response = requests.get(weather_api + "/current.json", params = query)
-
-    sample_favs['New York']['temp'] = parsed['current']['temp_f']
-    sample_favs['New York']['wind'] = parsed['current']['wind_mph']
-    sample_favs['New York']['precipitation'] = parsed['current']['precip_in']
-    sample_favs['New York']['humidity'] = parsed['current']['humidity']
+    sample_favs['Boston'] = {'temp': 41.0, 'wind': 9.4, 'precipitation': 0.0, 'humidity': 70}
+    sample_favs['New York'] = {'temp': 45.0, 'wind': 6.9, 'precipitation': 0.02, 'humidity': 65}
     return sample_favs
 
-def test_add_favorite():
+@pytest.fixture
+def mock_weather_response(mocker):
+    """Fixture to replace the weatherapi call with a canned current weather response."""
+    response = mocker.Mock()
+    response.json.return_value = {
+        'current': {'temp_f': 41.0, 'wind_mph': 9.4, 'precip_in': 0.0, 'humidity': 70}
+    }
+    client = mocker.patch('weather.models.current_weather.get_weather_client').return_value
+    client.get.return_value = response
+    return client.get
+
+def test_add_favorite(favorites_model):
     """testing adding a location to the favorites dictionary."""
     favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
     assert len(favorites_model.favorites) == 1
-    assert favorites_model.favorites[0] == 'Boston'
+    assert 'Boston' in favorites_model.favorites
     
 
-def test_add_favorite_invalid_temp():
+def test_add_favorite_invalid_temp(favorites_model):
     """Test error when adding a location with an invalid temperature """
-    pass
+    with pytest.raises(ValueError, match="Invalid temperature"):
+        favorites_model.add_favorite("Boston", "warm", 12.0, 3.5, 20)
 
-def test_add_favorite_invalid_wind():
+def test_add_favorite_invalid_wind(favorites_model):
     """Test error when adding a location with an invalid wind value."""
-    pass
+    with pytest.raises(ValueError, match="Invalid wind"):
+        favorites_model.add_favorite("Boston", 32.0, "windy", 3.5, 20)
 
-def test_add_favorite_invalid_precipitation():
+def test_add_favorite_invalid_precipitation(favorites_model):
     """Test error when adding a location with an invalid precipitation value."""
-    pass
+    with pytest.raises(ValueError, match="Invalid precipitation"):
+        favorites_model.add_favorite("Boston", 32.0, 12.0, "wet", 20)
 
 def test_clear_favorites(favorites_model, sample_favorites):
     """Test that clear_favorites empties the dictionary."""
-    favorites_model.favorites.extend(sample_favorites)
+    add_sample_favorites(favorites_model, sample_favorites)
 
     # Call the clear_favorites method
     favorites_model.clear_favorites()
@@ -75,10 +95,377 @@ def test_clear_favorites_empty(favorites_model):
     # Assert that the favorites dictionary is still empty
     assert len(favorites_model.favorites) == 0, "Favorites dictionary should remain empty if it was already empty."
 
-def test_get_favorite_weather(favorites_model):
+def test_get_favorite_weather(favorites_model, sample_favorites):
     """Test that get_favorite_weather retrieves the weather."""
-    favorites_model.favorites.extend(sample_favorites)
+    add_sample_favorites(favorites_model, sample_favorites)
 
     # Call the function and verify the result
     favorites = favorites_model.get_favorite_weather('Boston')
     assert favorites == favorites_model.favorites['Boston'], "Expected get_favorites_weather to return the correct weather dictionary."
+
+def test_get_favorite_weather_not_found(favorites_model):
+    """Test error when getting the weather for a location that is not a favorite."""
+    with pytest.raises(ValueError, match="Paris not found in Favorites."):
+        favorites_model.get_favorite_weather('Paris')
+
+def test_add_favorite_updates_existing(favorites_model):
+    """Test that adding a location twice updates its weather instead of duplicating it."""
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    favorites_model.add_favorite(" boston", 40.0, 2.0, 0.0, 50)
+    assert favorites_model.favorites == {'Boston': {'temp': 40.0, 'wind': 2.0, 'precipitation': 0.0, 'humidity': 50}}
+    assert Favorite.query.one().location_id == 1
+
+def test_add_favorite_unknown_location(favorites_model, mocker):
+    """Test error when adding a location the search api does not know."""
+    client = mocker.patch('weather.models.location_index.get_weather_client').return_value
+    client.get.return_value.json.return_value = []
+    with pytest.raises(ValueError, match="nowhere did not match any location."):
+        favorites_model.add_favorite("Nowhere", 32.0, 12.0, 3.5, 20)
+
+def test_favorite_lookups_accept_any_spelling(favorites_model, sample_favorites):
+    """Test that favorites are found by any spelling that resolves to the same location."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    assert favorites_model.is_favorite('new  york')
+    assert favorites_model.is_favorite('id:2')
+    assert not favorites_model.is_favorite('Paris')
+    assert favorites_model.get_favorite_weather('NEW YORK') == sample_favorites['New York']
+
+def test_favorites_are_per_user(favorites_model, session):
+    """Test that users only see their own favorites."""
+    User.create_user("otheruser", "password")
+    other = FavoritesModel(User.query.filter_by(username="otheruser").first().id)
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    other.add_favorite("Paris", 50.0, 3.0, 0.0, 80)
+
+    assert favorites_model.get_all_favorites() == ['Boston']
+    assert other.get_all_favorites() == ['Paris']
+    other.clear_favorites()
+    assert favorites_model.get_all_favorites() == ['Boston']
+
+def test_get_all_favorites_current_weather(favorites_model, sample_favorites):
+    """Test that every favorite's temperature is returned."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    assert favorites_model.get_all_favorites_current_weather() == {'Boston': 41.0, 'New York': 45.0}
+
+def test_get_all_favorites_empty(favorites_model):
+    """Test error when listing favorites with none saved."""
+    with pytest.raises(ValueError, match="Favorites dictionary is empty."):
+        favorites_model.get_all_favorites()
+
+def test_delete_user_removes_favorites(favorites_model, user):
+    """Test that deleting a user deletes their favorites."""
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    User.delete_user(user.username)
+    assert Favorite.query.count() == 0
+
+##########################################################
+# Weather API Cache
+##########################################################
+
+def test_normalize_location():
+    """Test that spacing and case differences normalize to the same key."""
+    assert normalize_location("  Boston ") == normalize_location("boston")
+    assert normalize_location("New   York") == "new york"
+
+def test_get_weather_api_cached(favorites_model, mock_weather_response):
+    """Test that repeated lookups for the same location only call the api once."""
+    hits = weather_cache.stats()['hits']
+    assert favorites_model.get_weather_api("Boston") == (41.0, 9.4, 0.0, 70)
+    assert favorites_model.get_weather_api(" boston") == (41.0, 9.4, 0.0, 70)
+    assert mock_weather_response.call_count == 1
+    assert weather_cache.stats()['hits'] == hits + 1
+
+def test_get_weather_api_coalesces_concurrent_misses(favorites_model, mock_weather_response):
+    """Test that concurrent misses for the same location share one api call."""
+    response = mock_weather_response.return_value
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.05)
+        return response
+
+    mock_weather_response.side_effect = slow_get
+    threads = [threading.Thread(target=favorites_model.get_weather_api, args=("Boston",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_weather_response.call_count == 1
+
+##########################################################
+# Stale Weather
+##########################################################
+
+def test_get_weather_api_serves_stale_and_revalidates(favorites_model, mock_weather_response, monkeypatch):
+    """Test that an expired entry is served with its age while it is fetched again in the background."""
+    favorites_model.get_weather_api("Boston")
+    monkeypatch.setattr(weather_cache, 'ttl', 0)
+    mock_weather_response.return_value.json.return_value = {
+        'current': {'temp_f': 50.0, 'wind_mph': 9.4, 'precip_in': 0.0, 'humidity': 70}}
+
+    weather, age = favorites_model.get_weather_api_with_age("Boston")
+
+    assert weather == (41.0, 9.4, 0.0, 70)
+    assert age > 0
+    deadline = time.monotonic() + 2
+    while weather_cache.get_with_age("id:1")[0][0] != 50.0:
+        assert time.monotonic() < deadline, "stale entry was never revalidated"
+        time.sleep(0.01)
+    assert mock_weather_response.call_count == 2
+
+def test_get_weather_api_circuit_open(favorites_model, mock_weather_response):
+    """Test that an open breaker fails fast when nothing is cached."""
+    from utils.circuit_breaker import CircuitOpenError
+
+    mock_weather_response.side_effect = CircuitOpenError('weatherapi.com', 30)
+    with pytest.raises(CircuitOpenError):
+        favorites_model.get_weather_api("Boston")
+
+def test_get_favorite_weather_with_age(favorites_model):
+    """Test that a saved favorite reports how long ago its weather was saved."""
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    weather, age = favorites_model.get_favorite_weather_with_age("Boston")
+    assert weather['temp'] == 32.0
+    assert 0 <= age < 60
+
+##########################################################
+# Bulk Refresh
+##########################################################
+
+def test_refresh_all_favorites(favorites_model, sample_favorites, mock_weather_response):
+    """Test that every favorite is refreshed from the api."""
+    add_sample_favorites(favorites_model, sample_favorites)
+
+    result = favorites_model.refresh_all_favorites(deadline=5)
+
+    assert set(result['weather']) == {'Boston', 'New York'}
+    assert result['timed_out'] == [] and result['failed'] == {}
+    assert favorites_model.favorites['New York']['temp'] == 41.0
+    assert mock_weather_response.call_count == 2
+
+def test_refresh_all_favorites_bypasses_cache(favorites_model, sample_favorites, mock_weather_response):
+    """Test that a refresh fetches even when the cache is fresh."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    favorites_model.get_weather_api('Boston')
+
+    favorites_model.refresh_all_favorites(deadline=5)
+
+    assert mock_weather_response.call_count == 3
+
+def test_refresh_all_favorites_keeps_context(favorites_model, sample_favorites, mock_weather_response):
+    """Test that each location is fetched at the caller's upstream priority."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    priorities = []
+
+    def get(endpoint, params):
+        priorities.append(current_priority())
+        return mock_weather_response.return_value
+
+    mock_weather_response.side_effect = get
+    with upstream_priority(Priority.BACKGROUND):
+        favorites_model.refresh_all_favorites(deadline=5)
+
+    assert priorities == [Priority.BACKGROUND, Priority.BACKGROUND]
+
+def test_refresh_all_favorites_partial(favorites_model, sample_favorites, mock_weather_response):
+    """Test that slow and failing locations are reported without blocking the rest."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    favorites_model.add_favorite('Paris', 50.0, 3.0, 0.0, 80)
+    response = mock_weather_response.return_value
+
+    def get(endpoint, params):
+        if params['q'] == 'id:2':
+            time.sleep(0.5)
+        if params['q'] == 'id:3':
+            raise RuntimeError("upstream error")
+        return response
+
+    mock_weather_response.side_effect = get
+    result = favorites_model.refresh_all_favorites(deadline=0.2)
+
+    assert list(result['weather']) == ['Boston']
+    assert result['timed_out'] == ['New York']
+    assert result['failed'] == {'Paris': 'upstream error'}
+    assert favorites_model.favorites['New York'] == sample_favorites['New York']
+
+def test_refresh_all_favorites_cancels_queued(favorites_model, sample_favorites, mock_weather_response, mocker):
+    """Test that locations still queued when the deadline passes are cancelled instead of holding the pool."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    executor = ThreadPoolExecutor(max_workers=1)
+    mocker.patch('weather.models.favorites_manager.get_refresh_executor', return_value=executor)
+
+    def get(endpoint, params):
+        time.sleep(0.3)
+        return mock_weather_response.return_value
+
+    mock_weather_response.side_effect = get
+    result = favorites_model.refresh_all_favorites(deadline=0.1)
+    executor.shutdown(wait=True)
+
+    assert sorted(result['timed_out']) == ['Boston', 'New York']
+    assert mock_weather_response.call_count == 1
+
+def test_refresh_all_favorites_empty(favorites_model):
+    """Test error when refreshing with no favorites."""
+    with pytest.raises(ValueError, match="No locations saved in favorites."):
+        favorites_model.refresh_all_favorites()
+
+##########################################################
+# Bulk Weather
+##########################################################
+
+def bulk_item(custom_id, temp=41.0):
+    return {'query': {'custom_id': custom_id, 'q': '', 'current': {'temp_f': temp, 'wind_mph': 9.4, 'precip_in': 0.0, 'humidity': 70}}}
+
+def test_get_weather_bulk(favorites_model, mocker):
+    """Test that uncached locations are fetched in one bulk call and cached."""
+    client = mocker.patch('weather.models.current_weather.get_weather_client').return_value
+    client.post.return_value.json.return_value = {'bulk': [
+        bulk_item('0', 41.0),
+        {'query': {'custom_id': '1', 'q': 'id:4', 'error': {'code': 1006, 'message': 'No matching location found.'}}},
+    ]}
+    search = mocker.patch('weather.models.location_index.get_weather_client').return_value
+    search.get.return_value.json.return_value = []
+    weather_cache.set('id:3', (50.0, 3.0, 0.0, 80))
+
+    weather = favorites_model.get_weather_bulk(['Boston', 'Paris', 'London', 'nowhere', 'boston '])
+
+    assert client.post.call_count == 1
+    body = client.post.call_args.kwargs['json']
+    assert body == {'locations': [{'q': 'id:1', 'custom_id': '0'}, {'q': 'id:4', 'custom_id': '1'}]}
+    assert weather['Boston'] == weather['boston '] == (41.0, 9.4, 0.0, 70)
+    assert weather['Paris'] == (50.0, 3.0, 0.0, 80)
+    assert isinstance(weather['London'], ValueError)
+    assert isinstance(weather['nowhere'], ValueError)
+    assert weather_cache.get('id:1') == (41.0, 9.4, 0.0, 70)
+
+def test_get_weather_bulk_batches(favorites_model, mocker, monkeypatch):
+    """Test that misses are split into batches of WEATHER_BULK_SIZE."""
+    monkeypatch.setenv("WEATHER_BULK_SIZE", "2")
+    client = mocker.patch('weather.models.current_weather.get_weather_client').return_value
+
+    def post(endpoint, params, json):
+        response = mocker.Mock()
+        response.json.return_value = {'bulk': [bulk_item(item['custom_id']) for item in json['locations']]}
+        return response
+
+    client.post.side_effect = post
+
+    weather = favorites_model.get_weather_bulk(['Boston', 'New York', 'Paris'])
+
+    assert client.post.call_count == 2
+    assert weather['Boston'] == weather['New York'] == weather['Paris'] == (41.0, 9.4, 0.0, 70)
+
+def test_get_weather_bulk_falls_back(favorites_model, mocker):
+    """Test that a rejected bulk call falls back to one call per location."""
+    client = mocker.patch('weather.models.current_weather.get_weather_client').return_value
+    client.post.return_value.raise_for_status.side_effect = RuntimeError("403 Forbidden")
+    client.get.return_value.json.return_value = bulk_item('0')['query']
+
+    weather = favorites_model.get_weather_bulk(['Boston', 'Paris'])
+
+    assert client.get.call_count == 2
+    assert weather['Paris'] == (41.0, 9.4, 0.0, 70)
+
+
+##########################################################
+# Compact Records
+##########################################################
+
+def test_favorite_records_round_trip(favorites_model, sample_favorites):
+    """Test that favorites survive the columnar cache form unchanged and in order."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    records = favorites_model._records()
+
+    restored = FavoriteRecords.from_columns(records.to_columns())
+    assert restored.to_dict() == records.to_dict() == favorites_model.favorites
+    assert restored.labels == list(sample_favorites)
+    assert restored.weather(restored.position_of_label('New York')) == sample_favorites['New York']
+    assert restored.position('id:999') is None
+
+def test_favorite_records_smaller_than_dicts():
+    """Test that columnar records hold less memory than one dict per favorite."""
+    records = FavoriteRecords()
+    for i in range(100):
+        records.append(f"id:{i}", f"City {i}", 50.5, 3.25, 0.1, 80)
+    rows = {key: {'label': label, 'weather': records.weather(i)} for i, (key, label)
+            in enumerate(zip(records.keys, records.labels))}
+    dict_bytes = sys.getsizeof(rows) + sum(sys.getsizeof(row) + sys.getsizeof(row['weather']) for row in rows.values())
+    assert records.nbytes() * 4 < dict_bytes
+
+##########################################################
+# Streaming
+##########################################################
+
+def test_iter_all_favorites_current_weather(favorites_model, sample_favorites, mock_weather_response):
+    """Test that cached locations come first and the rest as they finish, so a slow one holds up nothing."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    favorites_model.add_favorite('Paris', 50.0, 3.0, 0.0, 80)
+    weather_cache.set('id:2', (45.0, 6.9, 0.02, 65))
+    response = mock_weather_response.return_value
+
+    def get(endpoint, params):
+        if params['q'] == 'id:1':
+            time.sleep(0.3)
+        if params['q'] == 'id:3':
+            raise RuntimeError("upstream error")
+        return response
+
+    mock_weather_response.side_effect = get
+    start = time.monotonic()
+    lines = favorites_model.iter_all_favorites_current_weather()
+    first = next(lines)
+
+    assert time.monotonic() - start < 0.1
+    assert first == {'location': 'New York', 'weather': sample_favorites['New York'], 'age': 0.0, 'stale': False}
+    assert next(lines) == {'location': 'Paris', 'error': 'upstream error'}
+    assert next(lines)['weather'] == {'temp': 41.0, 'wind': 9.4, 'precipitation': 0.0, 'humidity': 70}
+    assert list(lines) == []
+
+def test_iter_all_favorites_current_weather_window(favorites_model, mock_weather_response):
+    """Test that no more than window locations are fetched at once."""
+    for location in ('Boston', 'New York', 'Paris', 'London'):
+        favorites_model.add_favorite(location, 50.0, 3.0, 0.0, 80)
+    response = mock_weather_response.return_value
+    calls = {'now': 0, 'most': 0}
+    lock = threading.Lock()
+
+    def get(endpoint, params):
+        with lock:
+            calls['now'] += 1
+            calls['most'] = max(calls['most'], calls['now'])
+        time.sleep(0.02)
+        with lock:
+            calls['now'] -= 1
+        return response
+
+    mock_weather_response.side_effect = get
+    assert len(list(favorites_model.iter_all_favorites_current_weather(window=2))) == 4
+    assert calls['most'] <= 2
+
+def test_iter_all_favorites_current_weather_empty(favorites_model):
+    """Test error when streaming with no favorites or a bad window."""
+    with pytest.raises(ValueError, match="No locations saved in favorites."):
+        favorites_model.iter_all_favorites_current_weather()
+    favorites_model.add_favorite('Boston', 50.0, 3.0, 0.0, 80)
+    with pytest.raises(ValueError, match="Invalid window"):
+        favorites_model.iter_all_favorites_current_weather(window=0)
+
+def test_stream_favorites_weather_route(app, favorites_model, sample_favorites):
+    """Test that the route streams one line per location, as NDJSON or as server-sent events."""
+    add_sample_favorites(favorites_model, sample_favorites)
+    weather_cache.set('id:1', (41.0, 9.4, 0.0, 70))
+    weather_cache.set('id:2', (45.0, 6.9, 0.02, 65))
+    client = app.test_client()
+
+    response = client.get('/api/stream-favorites-weather', query_string={'username': 'testuser'})
+    assert response.content_type == 'application/x-ndjson'
+    assert [json.loads(line)['location'] for line in response.data.splitlines()] == ['Boston', 'New York']
+
+    response = client.get('/api/stream-favorites-weather', query_string={'username': 'testuser'},
+                          headers={'Accept': 'text/event-stream'})
+    assert response.content_type.startswith('text/event-stream')
+    events = [json.loads(event.removeprefix('data: ')) for event in response.text.split('\n\n') if event]
+    assert events[1]['weather'] == sample_favorites['New York']
+
+    assert client.get('/api/stream-favorites-weather', query_string={'username': 'nobody'}).status_code == 400
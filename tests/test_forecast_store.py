@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+import json
+import pytest
+
+from weather.models.account_model import User
+from weather.models.favorites_manager import FavoritesModel
+from weather.models.forecast_store import CompactForecast, ForecastStore, forecast_store, next_model_run
+
+
+def utc(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+def forecast_day(date_epoch, temp):
+    return {
+        'date': '', 'date_epoch': date_epoch,
+        'day': {'maxtemp_f': temp + 5, 'mintemp_f': temp - 5, 'avgtemp_f': temp, 'maxwind_mph': 10.0,
+                'totalprecip_in': 0.1, 'avghumidity': 71, 'condition': {'text': 'Sunny', 'code': 1000},
+                'uv': 3.0, 'daily_chance_of_rain': 0},
+        'astro': {'sunrise': '07:00 AM', 'sunset': '04:20 PM'},
+        'hour': [{'time_epoch': date_epoch + hour * 3600, 'temp_f': temp + hour / 10, 'wind_mph': 5.0,
+                  'condition': {'text': 'Sunny', 'icon': '//cdn.weatherapi.com/x.png', 'code': 1000}}
+                 for hour in range(24)],
+    }
+
+def forecast_response(days=5):
+    start = int(utc(2024, 12, 1))
+    return {'location': {'name': 'Boston'}, 'current': {},
+            'forecast': {'forecastday': [forecast_day(start + day * 86400, 40.0 + day) for day in range(days)]}}
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock(utc(2024, 12, 1, 8, 30))
+
+@pytest.fixture
+def mock_forecast(mocker):
+    client = mocker.patch('weather.models.forecast_store.get_weather_client').return_value
+    payload = forecast_response()
+    client.get.return_value.json.return_value = payload
+    client.get.return_value.content = json.dumps(payload).encode()
+    return client.get
+
+@pytest.fixture
+def store(clock):
+    return ForecastStore(maxsize=4, run_hours=6, lag=3600, clock=clock)
+
+
+def test_next_model_run():
+    """Test that forecasts expire at the next 6-hourly run plus the publish lag."""
+    assert next_model_run(utc(2024, 12, 1, 8, 30)) == utc(2024, 12, 1, 13)
+    assert next_model_run(utc(2024, 12, 1, 6, 30)) == utc(2024, 12, 1, 7)
+    assert next_model_run(utc(2024, 12, 1, 23, 30)) == utc(2024, 12, 2, 1)
+
+def test_compact_forecast_to_dict():
+    """Test that the compact layout serves the same values as the upstream."""
+    forecast = CompactForecast('boston', forecast_response()['forecast']['forecastday'], 0, 1)
+    result = forecast.to_dict()
+    assert len(result['days']) == 5
+    day = result['days'][1]
+    assert day['date'] == '2024-12-02'
+    assert (day['max_temp'], day['min_temp'], day['avg_temp']) == (46.0, 36.0, 41.0)
+    assert day['avg_humidity'] == 71
+    assert day['condition'] == 'Sunny'
+    assert len(day['hourly_temp']) == 24 and day['hourly_temp'][10] == 42.0
+
+def test_compact_forecast_smaller_than_raw():
+    """Test that a compact forecast holds far less memory than the upstream payload."""
+    payload = forecast_response()
+    forecast = CompactForecast('boston', payload['forecast']['forecastday'], 0, 1, raw_bytes=len(json.dumps(payload)))
+    assert forecast.nbytes() < forecast.raw_bytes / 4
+
+def test_get_caches_until_next_run(store, clock, mock_forecast):
+    """Test that a forecast is reused until its model run passes."""
+    store.get('Boston')
+    clock.now = utc(2024, 12, 1, 12, 59)
+    store.get(' boston')
+    assert mock_forecast.call_count == 1
+    assert mock_forecast.call_args.args[1]['days'] == 5
+
+    clock.now = utc(2024, 12, 1, 13, 0)
+    store.get('Boston')
+    assert mock_forecast.call_count == 2
+
+def test_stats_reports_memory(store, mock_forecast):
+    """Test that memory per cached location is reported."""
+    store.get('Boston')
+    stats = store.stats()
+    assert stats['size'] == 1
+    assert 0 < stats['bytes_per_location'] < stats['raw_bytes_per_location']
+
+def test_get_favorites_forecast_5_days(session, mock_forecast):
+    """Test the forecast for a favorite location."""
+    forecast_store.clear()
+    User.create_user("testuser", "password")
+    favorites_model = FavoritesModel(User.query.filter_by(username="testuser").first().id)
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+
+    assert len(favorites_model.get_favorites_forecast_5_days("Boston")['days']) == 5
+    with pytest.raises(ValueError, match="Paris not found in Favorites."):
+        favorites_model.get_favorites_forecast_5_days("Paris")
+    forecast_store.clear()
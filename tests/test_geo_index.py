@@ -0,0 +1,150 @@
+import pytest
+
+from weather.models.account_model import User
+from weather.models.current_weather import (get_current_weather, get_current_weather_with_age, get_nearby_weather,
+                                            weather_cache)
+from weather.models.favorites_manager import FavoritesModel
+from weather.models.geo_index import GeoIndex, haversine_km
+from weather.models.location_index import CanonicalLocation, LocationIndex, parse_coordinates
+
+
+BOSTON = (42.36, -71.06)
+
+@pytest.fixture(autouse=True)
+def clear_weather_cache():
+    weather_cache.clear()
+    yield
+    weather_cache.clear()
+
+@pytest.fixture
+def weather_api(mocker):
+    """Fixture to replace the weatherapi call with a response from a station in Boston."""
+    client = mocker.patch('weather.models.current_weather.get_weather_client').return_value
+    client.get.return_value.json.return_value = {
+        'location': {'name': 'Boston', 'lat': BOSTON[0], 'lon': BOSTON[1]},
+        'current': {'temp_f': 41.0, 'wind_mph': 9.4, 'precip_in': 0.0, 'humidity': 70},
+    }
+    return client.get
+
+
+##########################################################
+# Index
+##########################################################
+
+def test_invalid_arguments():
+    """Test that an empty radius, negative max_age or empty index is rejected."""
+    with pytest.raises(ValueError, match="Invalid radius_km"):
+        GeoIndex(radius_km=0)
+    with pytest.raises(ValueError, match="Invalid max_age"):
+        GeoIndex(max_age=-1)
+    with pytest.raises(ValueError, match="Invalid maxsize"):
+        GeoIndex(maxsize=0)
+
+def test_haversine_km():
+    """Test the distance between two known points."""
+    assert haversine_km(51.5072, -0.1276, 48.8566, 2.3522) == pytest.approx(343.5, abs=0.5)
+
+def test_within_radius_nearest_first():
+    """Test that only points within the radius are found, nearest first."""
+    index = GeoIndex(radius_km=2)
+    index.add('id:1', *BOSTON)
+    index.add('id:2', 42.37, -71.06)
+    index.add('id:3', 42.40, -71.06)
+
+    found = index.within(42.368, -71.06)
+    assert [key for _, key in found] == ['id:2', 'id:1']
+    assert found[0][0] == pytest.approx(0.22, abs=0.01)
+
+def test_within_across_cells():
+    """Test that neighbouring cells are searched, across the antimeridian and near the poles."""
+    index = GeoIndex(radius_km=5)
+    index.add('fiji', -17.0, 179.99)
+    index.add('north', 89.99, 0.0)
+    assert [key for _, key in index.within(-17.0, -179.99)] == ['fiji']
+    assert [key for _, key in index.within(89.99, 120.0)] == ['north']
+
+def test_nearest_skips_unusable_observations():
+    """Test that a point whose observation is gone is skipped for the next nearest, and hits are counted."""
+    index = GeoIndex(radius_km=2)
+    index.add('id:1', *BOSTON)
+    index.add('id:2', 42.37, -71.06)
+
+    assert index.nearest(42.369, -71.06, {'id:1': 'sunny'}.get) == ('id:1', 'sunny', pytest.approx(1.0, abs=0.05))
+    assert index.nearest(40.71, -74.01, {'id:1': 'sunny'}.get) is None
+    stats = index.stats()
+    assert (stats['queries'], stats['hits'], stats['misses'], stats['hit_rate']) == (2, 1, 1, 0.5)
+
+def test_moves_and_evicts():
+    """Test that re-adding a key moves it, and the least recently added points are dropped past maxsize."""
+    index = GeoIndex(radius_km=2, maxsize=2)
+    index.add('id:1', *BOSTON)
+    index.add('id:1', 40.71, -74.01)
+    assert index.within(*BOSTON) == []
+    index.add('id:2', *BOSTON)
+    index.add('id:3', 48.86, 2.35)
+    assert len(index) == 2
+    assert index.within(40.71, -74.01) == []
+
+def test_parse_coordinates():
+    """Test that only valid lat,lon pairs are parsed."""
+    assert parse_coordinates(" 42.36, -71.06 ") == BOSTON
+    assert parse_coordinates("Boston") is None
+    assert parse_coordinates("91,0") is None
+
+
+##########################################################
+# Nearby Weather
+##########################################################
+
+def test_nearby_coordinates_served_from_cache(weather_api, geo_index, location_index):
+    """
+    Test that coordinates near a cached station are answered without calling the api or searching,
+    and without counting as a weather cache hit.
+    """
+    get_current_weather("Boston")
+    cache_hits = weather_cache.stats()['hits']
+
+    weather, age = get_current_weather_with_age("42.3634,-71.0552")
+
+    assert weather == (41.0, 9.4, 0.0, 70)
+    assert age < 1
+    assert weather_api.call_count == 1
+    assert weather_cache.stats()['hits'] == cache_hits
+    assert location_index.lookup("42.3634,-71.0552").key == 'id:1'
+    assert geo_index.stats()['hits'] == 1
+
+def test_nearby_weather_misses(weather_api, geo_index):
+    """Test that coordinates out of range, or near only an observation older than max_age, are not answered."""
+    get_current_weather("Boston")
+    assert get_nearby_weather("42.50,-71.06") is None
+    assert get_nearby_weather("Boston") is None
+
+    geo_index.max_age = 0
+    assert get_nearby_weather("42.3634,-71.0552") is None
+    assert geo_index.stats()['misses'] == 2
+
+def test_nearby_alias_expires():
+    """Test that coordinates only resolve to the nearby location for nearby_ttl."""
+    index = LocationIndex(nearby_ttl=0)
+    index.add_nearby("42.3634,-71.0552", CanonicalLocation(1, 'Boston'))
+    assert index.lookup("42.3634,-71.0552") is None
+
+    index = LocationIndex(nearby_ttl=60)
+    index.add_nearby("42.3634,-71.0552", CanonicalLocation(1, 'Boston'))
+    assert index.resolve("42.3634,-71.0552").key == 'id:1'
+    assert index.searches == 0
+
+def test_nearby_add_favorite_makes_no_upstream_calls(app, weather_api, mocker):
+    """Test that adding coordinates near a cached station as a favorite neither searches nor fetches."""
+    search = mocker.patch('weather.models.location_index.get_weather_client').return_value.get
+    User.create_user("testuser", "password")
+    get_current_weather("Boston")
+    weather_api.reset_mock()
+
+    response = app.test_client().post('/api/add-favorite',
+                                      json={'username': 'testuser', 'location': '42.3634,-71.0552'})
+
+    assert response.status_code == 200
+    assert weather_api.call_count == 0 and search.call_count == 0
+    user_id = User.get_cached("testuser")['id']
+    assert list(FavoritesModel(user_id).favorites) == ['Boston']
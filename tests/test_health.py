@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from utils import metrics
+from weather.health import HealthProber
+
+
+@pytest.fixture
+def weather_api(mocker):
+    """Fixture to replace the weather api with one that answers the health check."""
+    get = mocker.patch('weather.health.get_weather_client').return_value.get
+    get.return_value = mocker.Mock(status_code=200)
+    return get
+
+@pytest.fixture
+def prober(app):
+    return HealthProber(app, interval=60)
+
+
+def test_invalid_arguments(app):
+    """Test that a bad interval or timeout is rejected."""
+    with pytest.raises(ValueError, match="Invalid interval"):
+        HealthProber(app, interval=0)
+    with pytest.raises(ValueError, match="Invalid timeout"):
+        HealthProber(app, timeout=0)
+
+def test_check_once(prober, weather_api):
+    """Test that every dependency is checked and reported with its status and check time."""
+    state = prober.check_once()
+
+    assert state['status'] == 'healthy'
+    assert set(state['checks']) == {'database', 'weatherapi', 'cache'}
+    assert all(check['status'] == 'healthy' and check['checked_at'] for check in state['checks'].values())
+    assert state['checks']['database']['required'] is True
+    weather_api.assert_called_once_with("current.json", {"q": "London"}, timeout=5.0)
+    assert 'dependency_up{dependency="database"} 1' in metrics.registry.expose()
+
+def test_results_cached(prober, weather_api):
+    """Test that readiness reuses the last result until it is older than the interval."""
+    for _ in range(5):
+        assert prober.readiness()[0] == 200
+    assert weather_api.call_count == 1
+
+    prober._checked_mono = time.monotonic() - 60
+    prober.readiness()
+    assert weather_api.call_count == 2
+
+def test_required_dependency_fails_readiness(prober, weather_api, mocker):
+    """Test that a database failure fails readiness, while liveness still reports the process alive."""
+    prober.checks[0] = ('database', True, mocker.Mock(side_effect=RuntimeError("database is locked")))
+
+    status, state = prober.readiness()
+    assert status == 503
+    assert state['status'] == 'failed'
+    assert state['checks']['database']['error'] == 'database is locked'
+    assert prober.liveness()[0] == 200
+
+def test_optional_dependency_degrades(prober, weather_api):
+    """Test that an upstream error marks the service degraded but still ready."""
+    weather_api.return_value.status_code = 500
+    status, state = prober.readiness()
+    assert status == 200
+    assert state['status'] == 'degraded'
+    assert state['checks']['weatherapi']['error'] == "weather api returned 500"
+
+def test_background_thread(prober, weather_api):
+    """Test that a running prober checks on its own and readiness never checks inline."""
+    prober.start()
+    try:
+        deadline = time.monotonic() + 2
+        while prober._state()['status'] == 'starting':
+            assert time.monotonic() < deadline, "prober never checked"
+            time.sleep(0.01)
+        prober._checked_mono = time.monotonic() - 60
+        assert prober.readiness()[0] == 200
+        assert weather_api.call_count == 1
+    finally:
+        prober.stop(timeout=2)
+
+def test_routes(app, weather_api):
+    """Test that the Flask health routes serve the prober's state."""
+    client = app.test_client()
+    response = client.get('/api/health/ready')
+    assert response.status_code == 200
+    assert response.get_json()['checks']['database']['status'] == 'healthy'
+    assert client.get('/api/health').get_json()['status'] == 'healthy'
+    assert client.get('/api/health/live').get_json()['status'] == 'alive'
+    assert weather_api.call_count == 1
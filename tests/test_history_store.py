@@ -0,0 +1,115 @@
+import pytest
+
+from weather.models.account_model import User
+from weather.models.current_weather import get_current_weather, weather_cache
+from weather.models.favorites_manager import FavoritesModel
+from weather.models.history_store import HistoryStore
+
+DAY = 86400
+START = 1_700_000_000 // DAY * DAY
+
+
+@pytest.fixture
+def store():
+    store = HistoryStore(':memory:', raw_retention=7 * DAY, retention=30 * DAY)
+    yield store
+    store.close()
+
+def fill(store, location, start, hours, step=900):
+    """Record one observation every step seconds with the temperature rising each hour."""
+    for ts in range(start, start + hours * 3600, step):
+        store.record(location, 40.0 + (ts - start) // 3600, 5.5, 0.01, 60, ts=ts)
+
+
+def test_record_and_query(store):
+    """Test that values round trip through the scaled integer columns."""
+    store.record("boston", 41.3, 9.4, 0.02, 70, ts=START)
+    store.record("paris", 50.0, 3.0, 0.0, 80, ts=START)
+    assert store.query("boston", START, START + 1) == [
+        {'time': START, 'temp': 41.3, 'wind': 9.4, 'precipitation': 0.02, 'humidity': 70}]
+
+def test_record_same_timestamp_replaces(store):
+    """Test that refetching the same observation does not duplicate it."""
+    store.record("boston", 41.0, 9.4, 0.0, 70, ts=START)
+    store.record("boston", 42.0, 9.4, 0.0, 70, ts=START)
+    assert [row['temp'] for row in store.query("boston", START, START + 1)] == [42.0]
+
+def test_query_range_is_half_open(store):
+    """Test that the end of the range is excluded."""
+    fill(store, "boston", START, 2)
+    assert len(store.query("boston", START, START + 3600)) == 4
+
+def test_query_unknown_location(store):
+    """Test that an unknown location has no history."""
+    assert store.query("nowhere", START, START + DAY) == []
+
+def test_query_invalid_resolution(store):
+    """Test error for an unsupported resolution."""
+    with pytest.raises(ValueError, match="Invalid resolution"):
+        store.query("boston", START, START + DAY, "minute")
+
+def test_query_hourly_and_daily(store):
+    """Test min/max/mean downsampling."""
+    fill(store, "boston", START, 48)
+    hourly = store.query("boston", START, START + DAY, "hour")
+    assert len(hourly) == 24
+    assert hourly[1]['temp'] == {'min': 41.0, 'max': 41.0, 'mean': 41.0}
+    assert hourly[1]['count'] == 4
+
+    daily = store.query("boston", START, START + 2 * DAY, "day")
+    assert [day['time'] for day in daily] == [START, START + DAY]
+    assert daily[0]['temp'] == {'min': 40.0, 'max': 63.0, 'mean': 51.5}
+
+def test_range_query_uses_primary_key(store):
+    """Test that a range query for one location is an index range scan."""
+    plan = store._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM observations WHERE location_id = 1 AND ts >= 0 AND ts < 10").fetchall()
+    assert 'PRIMARY KEY' in plan[0][-1]
+
+def test_compact(store):
+    """Test that old raw rows collapse to hourly means and expired rows are dropped."""
+    fill(store, "boston", START, 24)
+    now = START + 10 * DAY
+
+    assert store.compact(now) == {'compacted': 96, 'dropped': 0}
+    rows = store.query("boston", START, START + DAY)
+    assert len(rows) == 24
+    assert rows[0]['time'] == START and rows[0]['temp'] == 40.0
+    assert store.compact(now) == {'compacted': 0, 'dropped': 0}
+
+    assert store.compact(START + 31 * DAY)['dropped'] == 24
+    assert store.query("boston", START, START + DAY) == []
+
+def test_compact_keeps_recent_raw_rows(store):
+    """Test that observations inside the raw retention are left alone."""
+    fill(store, "boston", START, 2)
+    assert store.compact(START + DAY) == {'compacted': 0, 'dropped': 0}
+    assert len(store.query("boston", START, START + DAY)) == 8
+
+def test_upstream_fetch_records_history(history_store, mocker):
+    """Test that every current weather fetch is recorded."""
+    weather_cache.clear()
+    client = mocker.patch('weather.models.current_weather.get_weather_client').return_value
+    client.get.return_value.json.return_value = {'current': {
+        'temp_f': 41.0, 'wind_mph': 9.4, 'precip_in': 0.0, 'humidity': 70, 'last_updated_epoch': START}}
+
+    get_current_weather("Boston")
+    weather_cache.clear()
+
+    assert history_store.query("id:1", START, START + 1)[0]['temp'] == 41.0
+
+def test_get_favorite_historical(session, history_store):
+    """Test reading a favorite's history through the favorites model."""
+    User.create_user("testuser", "password")
+    favorites_model = FavoritesModel(User.query.filter_by(username="testuser").first().id)
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    fill(history_store, "id:1", START, 3)
+
+    history = favorites_model.get_favorite_historical("Boston", START, START + 3 * 3600, "hour")
+    assert history['resolution'] == 'hour'
+    assert len(history['observations']) == 3
+
+    with pytest.raises(ValueError, match="Invalid range"):
+        favorites_model.get_favorite_historical("Boston", START, START)
+    with pytest.raises(ValueError, match="Paris not found in Favorites."):
+        favorites_model.get_favorite_historical("Paris")
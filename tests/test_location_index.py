@@ -0,0 +1,100 @@
+import pytest
+import threading
+import time
+
+from weather.models.location_index import CanonicalLocation, LocationIndex, normalize_location
+
+
+SEARCH_RESULT = [{'id': 2801268, 'name': 'London', 'region': 'City of London, Greater London',
+                  'country': 'United Kingdom', 'lat': 51.52, 'lon': -0.11, 'url': 'london-city-of-london-greater-london-united-kingdom'}]
+
+@pytest.fixture
+def search(mocker):
+    """Fixture to replace the search api with a canned response for London."""
+    client = mocker.patch('weather.models.location_index.get_weather_client').return_value
+    client.get.return_value.json.return_value = SEARCH_RESULT
+    return client.get
+
+@pytest.fixture
+def index():
+    return LocationIndex()
+
+
+def test_normalize_location():
+    """Test that spacing, case and coordinate precision differences normalize to the same key."""
+    assert normalize_location("  London ") == normalize_location("london")
+    assert normalize_location("51.5072, -0.1276") == normalize_location("51.51,-0.13") == "51.51,-0.13"
+
+def test_resolve_searches_once_per_alias(index, search):
+    """Test that an alias is searched once and then answered from the index."""
+    location = index.resolve("London")
+    assert location.key == "id:2801268"
+    assert location.label == "London, City of London, Greater London, United Kingdom"
+    assert index.resolve(" LONDON") is location
+    assert search.call_count == 1
+    assert index.stats()['searches'] == 1
+
+def test_resolve_label_after_search(index, search):
+    """Test that the full label of a resolved location resolves without another search."""
+    location = index.resolve("London")
+    assert index.resolve(location.label) is location
+    assert search.call_count == 1
+
+def test_resolve_canonical_key(index, search):
+    """Test that canonical keys resolve without a search."""
+    index.resolve("London")
+    assert index.resolve("id:2801268").name == "London"
+    assert index.resolve("id:42") == CanonicalLocation(42)
+    assert search.call_count == 1
+
+def test_resolve_no_match(index, search):
+    """Test error when the search api returns no locations."""
+    search.return_value.json.return_value = []
+    with pytest.raises(ValueError, match="atlantis did not match any location."):
+        index.resolve("Atlantis")
+
+def test_resolve_coalesces_concurrent_searches(index, search):
+    """Test that concurrent lookups of a new alias share one search call."""
+    response = search.return_value
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.05)
+        return response
+
+    search.side_effect = slow_get
+    threads = [threading.Thread(target=index.resolve, args=("London",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert search.call_count == 1
+
+def test_resolve_shared_through_cache_backend(cache_backend, search):
+    """Test that an alias resolved by one index is served to another from the cache backend."""
+    LocationIndex().resolve("London")
+    assert LocationIndex().resolve("London").key == "id:2801268"
+    assert search.call_count == 1
+
+def test_canonical_location_round_trip():
+    """Test that a canonical location survives serialization."""
+    location = CanonicalLocation.from_dict(SEARCH_RESULT[0])
+    assert CanonicalLocation.from_dict(location.to_dict()) == location
+
+def test_save_canonical_tolerates_concurrent_insert(session, mocker):
+    """Test that saving a location another request saved first returns the saved row."""
+    from weather.models.location_model import Location
+
+    Location.save_canonical(CanonicalLocation(7, 'Paris'))
+    session.commit()
+    session.expunge_all()
+    # The first lookup misses as if another request inserted the row right after it
+    original_get = session.get
+    get = mocker.patch.object(session, 'get', side_effect=[None, original_get(Location, 7)])
+    session.expunge_all()
+
+    row = Location.save_canonical(CanonicalLocation(7, 'Paris'))
+    session.commit()
+
+    assert row.name == 'Paris' and get.call_count == 2
+    assert Location.query.count() == 1
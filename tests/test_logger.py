@@ -0,0 +1,170 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from utils.logger import (JsonFormatter, LogPipeline, NonBlockingQueueHandler, configure_logger,
+                          get_log_pipeline, log_level, sample_rates_from_env, set_log_pipeline)
+
+
+class BlockingHandler(logging.Handler):
+    """A sink that holds the listener until released, to fill the queue."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.gate.wait()
+        self.records.append(record)
+
+
+@pytest.fixture
+def stream():
+    return io.StringIO()
+
+@pytest.fixture
+def pipeline(stream):
+    """Fixture to route configured loggers through a pipeline writing JSON to a buffer."""
+    sink = logging.StreamHandler(stream)
+    sink.setFormatter(JsonFormatter())
+    pipeline = LogPipeline(sink, sample_rates={"retrieving weather from %s.": 0.25})
+    pipeline.start()
+    set_log_pipeline(pipeline)
+    yield pipeline
+    pipeline.stop()
+    set_log_pipeline(None)
+
+@pytest.fixture
+def logger(pipeline, monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "DEBUG")
+    logger = logging.getLogger("tests.pipeline")
+    logger.propagate = False
+    configure_logger(logger)
+    yield logger
+    logger.handlers.clear()
+
+def queue_handlers(logger) -> list:
+    return [handler for handler in logger.handlers if isinstance(handler, NonBlockingQueueHandler)]
+
+def lines(stream) -> list[dict]:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_configure_logger_is_idempotent(logger, pipeline, stream):
+    """Test that configuring a logger again does not duplicate its lines."""
+    configure_logger(logger)
+    configure_logger(logger)
+    logger.info("hello %s", "world")
+    pipeline.stop()
+
+    assert queue_handlers(logger) == [pipeline.handler]
+    assert [(line['level'], line['logger'], line['message']) for line in lines(stream)] == [
+        ('INFO', 'tests.pipeline', 'hello world')]
+
+def test_reconfigure_replaces_old_pipeline(logger, pipeline):
+    """Test that a logger configured again after the pipeline is replaced only uses the new one."""
+    replacement = LogPipeline(logging.NullHandler())
+    set_log_pipeline(replacement)
+    configure_logger(logger)
+    assert queue_handlers(logger) == [replacement.handler]
+
+def test_json_output_includes_exception(logger, pipeline, stream):
+    """Test that exceptions are written in the JSON line."""
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logger.exception("failed")
+    pipeline.stop()
+
+    [line] = lines(stream)
+    assert line['level'] == 'ERROR' and line['message'] == 'failed'
+    assert 'RuntimeError: boom' in line['exception']
+
+def test_sampling(logger, pipeline, stream):
+    """Test that sampled templates keep one line in every 1/rate, and other lines are all kept."""
+    for i in range(8):
+        logger.info("retrieving weather from %s.", f"location{i}")
+    logger.info("unsampled")
+    logger.warning("retrieving weather from %s.", "warned")
+    pipeline.stop()
+
+    messages = [(line['message'], line.get('sample_rate')) for line in lines(stream)]
+    assert messages == [('retrieving weather from location0.', 0.25), ('retrieving weather from location4.', 0.25),
+                        ('unsampled', None), ('retrieving weather from warned.', None)]
+    assert pipeline.stats()['sampled_out'] == 6
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test that the caller never waits on a slow sink: lines past the queue size are dropped."""
+    sink = BlockingHandler()
+    pipeline = LogPipeline(sink, queue_size=2)
+    logger = logging.getLogger("tests.blocking")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.handler)
+    pipeline.start()
+    try:
+        for i in range(10):
+            logger.info("line %d", i)
+        assert pipeline.stats()['dropped'] >= 7
+    finally:
+        sink.gate.set()
+        pipeline.stop()
+        logger.handlers.clear()
+    assert 1 <= len(sink.records) <= 3
+
+def test_record_is_formatted_on_the_listener(logger, pipeline):
+    """Test that the record is enqueued unformatted."""
+    class Expensive:
+        formatted_on = None
+
+        def __str__(self):
+            Expensive.formatted_on = threading.current_thread()
+            return "expensive"
+
+    logger.info("value %s", Expensive())
+    pipeline.stop()
+    assert Expensive.formatted_on not in (None, threading.current_thread())
+
+def test_listener_starts_with_first_record(stream):
+    """Test that configuring a logger starts no thread, and the first record starts the listener."""
+    pipeline = LogPipeline(logging.StreamHandler(stream))
+    logger = logging.getLogger("tests.lazy")
+    logger.propagate = False
+    set_log_pipeline(pipeline)
+    try:
+        configure_logger(logger)
+        assert not pipeline.is_running()
+
+        logger.warning("first")
+        assert pipeline.is_running()
+        pipeline.stop()
+        assert stream.getvalue() == "first\n"
+    finally:
+        set_log_pipeline(None)
+        logger.handlers.clear()
+
+def test_log_level_from_environment(monkeypatch):
+    """Test that APP_ENV picks the default level and LOG_LEVEL overrides it."""
+    monkeypatch.delenv("LOG_LEVEL", raising=False)
+    monkeypatch.setenv("APP_ENV", "production")
+    assert log_level() == logging.INFO
+    monkeypatch.setenv("APP_ENV", "test")
+    assert log_level() == logging.WARNING
+    monkeypatch.setenv("LOG_LEVEL", "error")
+    assert log_level() == logging.ERROR
+    monkeypatch.setenv("LOG_LEVEL", "loud")
+    with pytest.raises(ValueError, match="Invalid LOG_LEVEL: loud"):
+        log_level()
+
+def test_sample_rates_from_environment(monkeypatch):
+    """Test that LOG_SAMPLE_RATES replaces the default rates."""
+    monkeypatch.setenv("LOG_SAMPLE_RATES", "retrieving weather from %s.=0.5; Adding location=0")
+    assert sample_rates_from_env() == {"retrieving weather from %s.": 0.5, "Adding location": 0.0}
+
+def test_default_pipeline_is_shared():
+    """Test that every logger shares one pipeline and listener."""
+    assert get_log_pipeline() is get_log_pipeline()
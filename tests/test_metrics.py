@@ -0,0 +1,111 @@
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy.sql import text
+
+from utils import metrics
+from utils.metrics import MetricsRegistry
+from weather.clients.weather_client import WeatherClient
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+@pytest.fixture
+def instrumented_app():
+    """Fixture to provide an app whose requests are recorded in the metrics."""
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/api/metrics-test/<name>')
+    def hello(name):
+        if name == 'boom':
+            raise RuntimeError("boom")
+        return jsonify({'name': name})
+
+    return app
+
+def sample(registry, line_prefix: str) -> float:
+    """Get the value of the one exposed sample starting with a prefix."""
+    [line] = [line for line in registry.expose().splitlines() if line.startswith(line_prefix)]
+    return float(line.rsplit(' ', 1)[1])
+
+
+def test_counter_and_gauge_exposition(registry):
+    """Test the Prometheus text format of counters and gauges."""
+    requests = registry.counter('requests_total', "Requests.", ('route', 'status'))
+    requests.labels('/a', 200).inc()
+    requests.labels('/a', '200').inc(2)
+    in_flight = registry.gauge('in_flight', "In flight.")
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    exposition = registry.expose()
+    assert "# TYPE requests_total counter" in exposition
+    assert 'requests_total{route="/a",status="200"} 3.0' in exposition
+    assert "in_flight 1.0" in exposition
+
+def test_histogram_buckets_are_cumulative(registry):
+    """Test that histogram buckets count every observation at or below their bound."""
+    latency = registry.histogram('latency_seconds', "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    assert sample(registry, 'latency_seconds_bucket{le="0.1"}') == 2
+    assert sample(registry, 'latency_seconds_bucket{le="1.0"}') == 3
+    assert sample(registry, 'latency_seconds_bucket{le="+Inf"}') == 4
+    assert sample(registry, 'latency_seconds_count') == 4
+    assert sample(registry, 'latency_seconds_sum') == pytest.approx(3.65)
+
+def test_registry_returns_existing_metric(registry):
+    """Test that registering a name twice returns the first metric, unless the type differs."""
+    assert registry.counter('hits_total', "Hits.") is registry.counter('hits_total', "Hits.")
+    with pytest.raises(ValueError, match="already registered as a counter"):
+        registry.gauge('hits_total', "Hits.")
+
+def test_labels_must_match(registry):
+    """Test error when recording with the wrong number of label values."""
+    with pytest.raises(ValueError, match="Invalid labels"):
+        registry.counter('calls_total', "Calls.", ('endpoint',)).labels('a', 'b')
+
+def test_requests_recorded_by_route(instrumented_app):
+    """Test that requests are recorded under their route pattern with their status."""
+    client = instrumented_app.test_client()
+    before = metrics.http_requests.labels('/api/metrics-test/<name>', 'GET', 200).value
+
+    client.get('/api/metrics-test/a')
+    client.get('/api/metrics-test/b')
+    client.get('/api/metrics-test/boom')
+    client.get('/api/no-such-route')
+
+    assert metrics.http_requests.labels('/api/metrics-test/<name>', 'GET', 200).value == before + 2
+    assert metrics.http_requests.labels('/api/metrics-test/<name>', 'GET', 500).value >= 1
+    assert metrics.http_requests.labels('unmatched', 'GET', 404).value >= 1
+    assert metrics.http_in_flight.labels().value == 0
+
+def test_database_queries_recorded(session):
+    """Test that queries are timed by statement type."""
+    metrics.instrument_sqlalchemy()
+    selects = metrics.db_query_seconds.labels('SELECT')
+    before = sum(selects.counts)
+
+    session.execute(text("SELECT 1"))
+
+    assert sum(selects.counts) == before + 1
+
+def test_upstream_calls_recorded(mocker):
+    """Test that weatherapi calls are timed by endpoint and status, including failures."""
+    client = WeatherClient("http://weather.test/v1", "test-key")
+    mocker.patch.object(client.session, 'get', return_value=mocker.Mock(status_code=200))
+    ok = metrics.upstream_request_seconds.labels('current.json', 'GET', 200)
+    failed = metrics.upstream_request_seconds.labels('current.json', 'GET', 'error')
+    ok_before, failed_before = sum(ok.counts), sum(failed.counts)
+
+    client.get("/current.json", {"q": "id:1"})
+    client.session.get.side_effect = ConnectionError("down")
+    with pytest.raises(ConnectionError):
+        client.get("current.json", {"q": "id:1"})
+
+    assert sum(ok.counts) == ok_before + 1
+    assert sum(failed.counts) == failed_before + 1
@@ -0,0 +1,90 @@
+import pytest
+import threading
+
+from weather.models.account_model import User
+from weather.models.current_weather import weather_cache
+from weather.models.favorites_manager import FavoritesModel, get_favorited_locations
+from weather.prewarmer import WeatherPrewarmer
+
+
+@pytest.fixture
+def users(session):
+    """Fixture to provide two users who share a favorite location."""
+    for username in ("alice", "bob"):
+        User.create_user(username, "password")
+    alice = FavoritesModel(User.query.filter_by(username="alice").first().id)
+    bob = FavoritesModel(User.query.filter_by(username="bob").first().id)
+    alice.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    alice.add_favorite("Paris", 50.0, 3.0, 0.0, 80)
+    bob.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    return alice, bob
+
+@pytest.fixture
+def prewarmer(app):
+    return WeatherPrewarmer(app, interval=10, jitter=0.2)
+
+@pytest.fixture(autouse=True)
+def clear_weather_cache():
+    weather_cache.clear()
+    yield
+    weather_cache.clear()
+
+
+def test_invalid_arguments(app):
+    """Test that a bad interval or jitter is rejected."""
+    with pytest.raises(ValueError, match="Invalid interval"):
+        WeatherPrewarmer(app, interval=0)
+    with pytest.raises(ValueError, match="Invalid jitter"):
+        WeatherPrewarmer(app, jitter=1)
+
+def test_next_delay_within_jitter(prewarmer):
+    """Test that delays stay within the jitter bounds."""
+    delays = [prewarmer.next_delay() for _ in range(100)]
+    assert all(8 <= delay <= 12 for delay in delays)
+
+def test_get_favorited_locations_distinct(users):
+    """Test that shared locations are collected once."""
+    assert get_favorited_locations() == ['id:1', 'id:3']
+
+def test_refresh_once(users, prewarmer, mocker):
+    """Test that one cycle fetches each location once and updates every user's favorites."""
+    bulk = mocker.patch('weather.prewarmer.get_current_weather_bulk', return_value={
+        'id:1': (40.0, 5.0, 0.0, 60),
+        'id:3': RuntimeError("upstream error"),
+    })
+    alice, bob = users
+
+    result = prewarmer.refresh_once()
+
+    bulk.assert_called_once_with(['id:1', 'id:3'], refresh=True)
+    assert result == {'locations': 2, 'failed': 1, 'updated': 2}
+    assert alice.get_favorite_weather('Boston')['temp'] == 40.0
+    assert bob.get_favorite_weather('Boston')['temp'] == 40.0
+    assert alice.get_favorite_weather('Paris')['temp'] == 50.0
+
+def test_refresh_once_invalidates_cached_favorites(users, prewarmer, mocker, cache_backend):
+    """Test that users' cached favorites do not hide the refreshed weather."""
+    alice, _ = users
+    assert alice.get_favorite_weather('Boston')['temp'] == 32.0
+    mocker.patch('weather.prewarmer.get_current_weather_bulk', return_value={
+        'id:1': (40.0, 5.0, 0.0, 60), 'id:3': (51.0, 3.0, 0.0, 80),
+    })
+
+    prewarmer.refresh_once()
+
+    assert alice.get_favorite_weather('Boston')['temp'] == 40.0
+
+def test_refresh_once_no_favorites(session, prewarmer, mocker):
+    """Test that a cycle with no favorites makes no upstream calls."""
+    bulk = mocker.patch('weather.prewarmer.get_current_weather_bulk')
+    assert prewarmer.refresh_once() == {'locations': 0, 'failed': 0, 'updated': 0}
+    bulk.assert_not_called()
+
+def test_start_and_stop(session, prewarmer, mocker):
+    """Test that the background thread runs a cycle and stops promptly."""
+    ran = threading.Event()
+    refresh = mocker.patch.object(prewarmer, 'refresh_once', side_effect=lambda: ran.set())
+    prewarmer.start()
+    assert ran.wait(5)
+    prewarmer.stop(timeout=5)
+    assert refresh.call_count == 1
@@ -0,0 +1,180 @@
+import json
+import pytest
+from sqlalchemy import event
+
+from db import db
+from utils.redis_cache import (InMemoryBackend, NullBackend, RedisBackend, cache_add_json, cache_get_json,
+                               get_cache_backend, set_cache_backend)
+from weather.models.account_model import User
+from weather.models.favorite_model import favorites_cache_key
+from weather.models.favorites_manager import FavoritesModel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def cached_user(backend, username):
+    value = backend.get(f"user:{username}")
+    return None if value is None else json.loads(value)
+
+
+##########################################################
+# Backends
+##########################################################
+
+def test_in_memory_backend_expiry():
+    """Test that keys expire after their ttl."""
+    clock = FakeClock()
+    backend = InMemoryBackend(clock=clock)
+    backend.set("a", "1", ex=10)
+    backend.set("b", "2")
+    clock.now = 10
+    assert backend.get("a") is None
+    assert backend.get("b") == "2"
+    backend.delete("b", "missing")
+    assert backend.get("b") is None
+
+def test_in_memory_backend_set_nx():
+    """Test that a set with nx only writes a missing or expired key."""
+    clock = FakeClock()
+    backend = InMemoryBackend(clock=clock)
+    backend.set("a", "1", ex=10, nx=True)
+    backend.set("a", "2", nx=True)
+    assert backend.get("a") == "1"
+    clock.now = 10
+    backend.set("a", "3", nx=True)
+    assert backend.get("a") == "3"
+
+def test_redis_backend_with_fakeredis():
+    """Test the redis backend against a fakeredis client."""
+    fakeredis = pytest.importorskip("fakeredis")
+    backend = RedisBackend(fakeredis.FakeRedis())
+    backend.set("a", "1", ex=10)
+    assert backend.get("a") == "1"
+    backend.delete("a")
+    assert backend.get("a") is None
+    assert backend.ping()
+
+def test_backend_from_env(monkeypatch):
+    """Test that the backend is chosen by CACHE_BACKEND."""
+    monkeypatch.setenv("CACHE_BACKEND", "memory")
+    set_cache_backend(None)
+    assert isinstance(get_cache_backend(), InMemoryBackend)
+    monkeypatch.setenv("CACHE_BACKEND", "none")
+    set_cache_backend(None)
+    assert isinstance(get_cache_backend(), NullBackend)
+    monkeypatch.setenv("CACHE_BACKEND", "bogus")
+    set_cache_backend(None)
+    with pytest.raises(ValueError, match="Invalid CACHE_BACKEND"):
+        get_cache_backend()
+    set_cache_backend(None)
+
+def test_backend_errors_are_misses(cache_backend, mocker):
+    """Test that a failing backend is treated as a miss instead of failing the request."""
+    mocker.patch.object(cache_backend, 'get', side_effect=ConnectionError("redis down"))
+    assert cache_get_json("user:testuser") is None
+
+
+##########################################################
+# User write-through
+##########################################################
+
+def test_create_user_writes_through(session, cache_backend):
+    """Test that a committed user is written to the cache."""
+    User.create_user("testuser", "password")
+    cached = cached_user(cache_backend, "testuser")
+    assert cached['username'] == "testuser"
+    assert len(cached['password']) == 64
+
+def test_failed_create_user_not_cached(session, cache_backend):
+    """Test that a rolled back duplicate does not overwrite the cached user."""
+    User.create_user("testuser", "password")
+    before = cached_user(cache_backend, "testuser")
+    with pytest.raises(ValueError):
+        User.create_user("testuser", "other")
+    assert cached_user(cache_backend, "testuser") == before
+
+def test_check_password_served_from_cache(session, cache_backend):
+    """Test that password checks for a cached user do not query the database."""
+    User.create_user("testuser", "password")
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert User.check_password("testuser", "password") is True
+        cache_backend.delete("user:testuser")
+        assert User.check_password("testuser", "password") is True
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 1, "Only the lookup after the cache was cleared should query."
+
+def test_check_password_populates_cache(session, cache_backend):
+    """Test that a cache miss loads the user and caches it."""
+    User.create_user("testuser", "password")
+    cache_backend.delete("user:testuser")
+    assert User.check_password("testuser", "password") is True
+    assert cached_user(cache_backend, "testuser") is not None
+
+def test_update_password_writes_through(session, cache_backend):
+    """Test that a password change replaces the cached hash."""
+    User.create_user("testuser", "password")
+    User.update_password("testuser", "newpassword")
+    assert User.check_password("testuser", "newpassword") is True
+    assert User.check_password("testuser", "password") is False
+
+def test_stale_fill_does_not_overwrite_password_change(session, cache_backend, mocker):
+    """Test that a cache miss read before a password change does not cache the old password after it."""
+    User.create_user("testuser", "password")
+    cache_backend.delete("user:testuser")
+
+    def change_password_then_fill(*args):
+        # The password changes between this reader's SELECT and its cache fill
+        User.update_password("testuser", "newpassword")
+        cache_add_json(*args)
+
+    mocker.patch('weather.models.account_model.cache_add_json', side_effect=change_password_then_fill)
+    assert User.get_cached("testuser") is not None
+    mocker.stopall()
+
+    assert User.check_password("testuser", "password") is False
+    assert User.check_password("testuser", "newpassword") is True
+
+def test_delete_user_invalidates(session, cache_backend):
+    """Test that deleting a user drops it from the cache."""
+    User.create_user("testuser", "password")
+    User.delete_user("testuser")
+    assert cached_user(cache_backend, "testuser") is None
+    with pytest.raises(ValueError, match="User testuser not found"):
+        User.check_password("testuser", "password")
+
+
+##########################################################
+# Favorites invalidation
+##########################################################
+
+@pytest.fixture
+def favorites_model(session, cache_backend):
+    User.create_user("testuser", "password")
+    return FavoritesModel(User.query.filter_by(username="testuser").first().id)
+
+def test_favorites_cached_and_invalidated(favorites_model, cache_backend):
+    """Test that favorites are cached on read and dropped when they change."""
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    assert favorites_model.get_all_favorites() == ['Boston']
+    assert cache_backend.get(favorites_cache_key(favorites_model.user_id)) is not None
+
+    favorites_model.add_favorite("Paris", 50.0, 3.0, 0.0, 80)
+    assert cache_backend.get(favorites_cache_key(favorites_model.user_id)) is None
+    assert favorites_model.get_all_favorites() == ['Boston', 'Paris']
+
+def test_clear_favorites_invalidates(favorites_model, cache_backend):
+    """Test that a bulk clear drops the cached favorites."""
+    favorites_model.add_favorite("Boston", 32.0, 12.0, 3.5, 20)
+    favorites_model.get_all_favorites()
+    favorites_model.clear_favorites()
+    assert favorites_model.favorites == {}
@@ -0,0 +1,183 @@
+import os
+
+import pytest
+
+# app_init builds its default app on first access, from DB_URI
+os.environ.setdefault("DB_URI", "sqlite://")
+
+from app_init import app as flask_app
+from db import db
+from utils.tokens import TokenSigner, set_token_signer
+from weather.models.account_model import User
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def signer(clock):
+    return TokenSigner(b"test-secret", ttl=60, clock=clock)
+
+@pytest.fixture
+def client(signer):
+    """Fixture to provide a test client with a fresh database, one user and a known signer."""
+    set_token_signer(signer)
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        User.create_user("testuser", "password")
+    yield flask_app.test_client()
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+    set_token_signer(None)
+
+def login(client, password: str = "password") -> str:
+    response = client.post('/api/login', json={'username': 'testuser', 'password': password})
+    assert response.status_code == 200
+    return response.get_json()['token']
+
+def bearer(token: str) -> dict:
+    return {'Authorization': f"Bearer {token}"}
+
+
+##################################################
+# Signer Test Cases
+##################################################
+
+
+def test_issue_and_verify(signer, clock):
+    """Test that an issued token verifies to its user until it expires."""
+    token, expires_at = signer.issue(1, "testuser")
+    claims = signer.verify(token)
+    assert (claims['sub'], claims['uid'], claims['exp']) == ("testuser", 1, expires_at)
+    assert expires_at == clock.now + 60
+
+    clock.now = expires_at
+    with pytest.raises(ValueError, match="Token has expired."):
+        signer.verify(token)
+
+def test_verify_rejects_tampering(signer):
+    """Test error when the payload or signature is altered, or the token was signed with another key."""
+    token, _ = signer.issue(1, "testuser")
+    payload, signature = token.split('.')
+    for bad in (payload[:-2] + "AA." + signature, payload + "." + signature[:-2] + "AA", payload, "",
+                TokenSigner(b"other-secret").issue(1, "testuser")[0]):
+        with pytest.raises(ValueError, match="Invalid token."):
+            signer.verify(bad)
+
+def test_revoke_token(signer, clock):
+    """Test that a revoked token is rejected while other tokens of the user still verify."""
+    first, _ = signer.issue(1, "testuser")
+    second, _ = signer.issue(1, "testuser")
+    signer.revoke(signer.verify(first))
+
+    with pytest.raises(ValueError, match="Token has been revoked."):
+        signer.verify(first)
+    assert signer.verify(second)['sub'] == "testuser"
+
+    # Entries are dropped once the token would have expired anyway
+    clock.now += 61
+    signer.revoke(signer.verify(signer.issue(1, "testuser")[0]))
+    assert len(signer.revocations) == 1
+
+def test_revoke_user(signer, clock):
+    """Test that revoking a user rejects their earlier tokens but not later ones."""
+    old, _ = signer.issue(1, "testuser")
+    other, _ = signer.issue(2, "otheruser")
+    clock.now += 1
+    signer.revoke_user("testuser")
+    new, _ = signer.issue(1, "testuser")
+
+    with pytest.raises(ValueError, match="Token has been revoked."):
+        signer.verify(old)
+    assert signer.verify(new)['sub'] == "testuser"
+    assert signer.verify(other)['sub'] == "otheruser"
+
+def test_revocations_shared_through_cache_backend(cache_backend, clock):
+    """Test that a token revoked by one worker is rejected by another sharing the cache backend."""
+    worker_a = TokenSigner(b"test-secret", ttl=60, clock=clock)
+    worker_b = TokenSigner(b"test-secret", ttl=60, clock=clock)
+    token, _ = worker_a.issue(1, "testuser")
+    other, _ = worker_a.issue(2, "otheruser")
+
+    clock.now += 1
+    worker_a.revoke(worker_a.verify(token))
+    worker_a.revoke_user("otheruser")
+
+    for revoked in (token, other):
+        with pytest.raises(ValueError, match="Token has been revoked."):
+            worker_b.verify(revoked)
+
+def test_invalid_signer_settings():
+    """Test error when the signer is created without a secret or with a non-positive ttl."""
+    with pytest.raises(ValueError, match="Invalid secret"):
+        TokenSigner(b"")
+    with pytest.raises(ValueError, match="Invalid ttl"):
+        TokenSigner(b"test-secret", ttl=0)
+
+
+##################################################
+# Route Test Cases
+##################################################
+
+
+def test_login_issues_token(client, signer):
+    """Test that logging in returns a token for the user."""
+    response = client.post('/api/login', json={'username': 'testuser', 'password': 'password'})
+    body = response.get_json()
+    assert signer.verify(body['token'])['sub'] == 'testuser'
+    assert body['expires_at'] == signer.verify(body['token'])['exp']
+
+def test_change_password_with_token(client, signer):
+    """Test that a token authorizes a password change, which replaces the user's tokens."""
+    token = login(client)
+
+    response = client.post('/api/change-password', json={'password': 'new-password'}, headers=bearer(token))
+
+    assert response.status_code == 200
+    with pytest.raises(ValueError, match="Token has been revoked."):
+        signer.verify(token)
+    assert signer.verify(response.get_json()['token'])['sub'] == 'testuser'
+    login(client, 'new-password')
+
+def test_change_password_token_errors(client):
+    """Test error when the token is invalid or belongs to another user than the body names."""
+    response = client.post('/api/change-password', json={'password': 'x'}, headers=bearer('not.a-token'))
+    assert response.status_code == 401
+
+    response = client.post('/api/change-password', json={'username': 'otheruser', 'password': 'x'},
+                           headers=bearer(login(client)))
+    assert response.status_code == 403
+
+def test_change_password_without_token(client):
+    """Test that requests without a token still name the user in the body."""
+    assert client.post('/api/change-password', json={'username': 'testuser', 'password': 'x'}).status_code == 200
+    assert client.post('/api/change-password', json={'username': 'nobody', 'password': 'x'}).status_code == 400
+
+def test_remove_user_with_token(client, signer):
+    """Test that a token authorizes removing its user, after which it no longer verifies."""
+    token = login(client)
+
+    response = client.delete('/api/remove-user', headers=bearer(token))
+
+    assert response.get_json() == {'status': 'success', 'username': 'testuser'}
+    with flask_app.app_context():
+        assert User.query.filter_by(username='testuser').first() is None
+    assert client.delete('/api/remove-user', headers=bearer(token)).status_code == 401
+
+def test_logout(client):
+    """Test that logging out revokes the token."""
+    token = login(client)
+    assert client.post('/api/logout', headers=bearer(token)).status_code == 200
+    assert client.post('/api/logout', headers=bearer(token)).status_code == 401
+    assert client.post('/api/logout').status_code == 401
@@ -0,0 +1,319 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.token_bucket import TokenBucket
+from weather.clients.upstream_scheduler import (Priority, UpstreamBusyError, UpstreamScheduler, max_wait_from_env,
+                                                upstream_priority)
+from weather.clients.weather_client import WeatherClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wait_for_queued(scheduler: UpstreamScheduler, count: int) -> None:
+    deadline = time.monotonic() + 2
+    while sum(stats['queued'] for stats in scheduler.stats()['priorities'].values()) < count:
+        assert time.monotonic() < deadline, "callers never queued"
+        time.sleep(0.001)
+
+def in_thread(target, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+##########################################################
+# Token Bucket
+##########################################################
+
+def test_token_bucket_burst_and_refill():
+    """Test that a full bucket allows a burst and then one call per 1/rate seconds."""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+    clock.now = 0.5
+    assert bucket.try_acquire() == 0.0
+    clock.now = 100
+    assert bucket.tokens() == 3
+
+def test_token_bucket_pause():
+    """Test that a paused bucket is empty and adds no tokens until the pause ends."""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=5, clock=clock)
+    bucket.pause(10)
+    clock.now = 9
+    assert bucket.tokens() == 0
+    assert bucket.try_acquire() == pytest.approx(2.0)
+    clock.now = 12
+    assert bucket.tokens() == 2
+
+def test_token_bucket_invalid():
+    """Test error when the rate or burst cannot admit any calls."""
+    with pytest.raises(ValueError, match="Invalid rate"):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValueError, match="Invalid burst"):
+        TokenBucket(rate=1, burst=0)
+
+
+##########################################################
+# Scheduler
+##########################################################
+
+def test_priority_order():
+    """Test that once the bucket is empty, interactive calls go ahead of background and health calls."""
+    scheduler = UpstreamScheduler(rate=20, burst=1)
+    scheduler.acquire()
+    order = []
+
+    def call(priority):
+        scheduler.acquire(priority)
+        order.append(priority)
+
+    threads = []
+    for count, priority in enumerate([Priority.HEALTH, Priority.BACKGROUND, Priority.INTERACTIVE], start=1):
+        threads.append(in_thread(call, priority))
+        wait_for_queued(scheduler, count)
+    for thread in threads:
+        thread.join()
+
+    assert order == [Priority.INTERACTIVE, Priority.BACKGROUND, Priority.HEALTH]
+    stats = scheduler.stats()['priorities']
+    assert stats['interactive']['granted'] == 2 and stats['health']['granted'] == 1
+    assert stats['health']['max_wait_ms'] > stats['interactive']['max_wait_ms']
+
+def test_priority_order_async():
+    """Test that a coroutine queues in priority order, without a thread: interactive goes ahead of waiting background calls."""
+    scheduler = UpstreamScheduler(rate=20, burst=1)
+    scheduler.acquire()
+    order = []
+
+    async def call(priority):
+        await scheduler.acquire_async(priority)
+        order.append(priority)
+
+    async def run():
+        threads = threading.active_count()
+        background = [asyncio.create_task(call(Priority.BACKGROUND)) for _ in range(5)]
+        while scheduler.stats()['priorities']['background']['queued'] < 5:
+            await asyncio.sleep(0.001)
+        interactive = asyncio.create_task(call(Priority.INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert threading.active_count() == threads
+        await asyncio.gather(interactive, *background)
+
+    asyncio.run(run())
+    assert order == [Priority.INTERACTIVE] + [Priority.BACKGROUND] * 5
+
+def test_cancelled_async_waiter_leaves_queue():
+    """Test that a cancelled coroutine is taken out of the queue and spends no token."""
+    clock = FakeClock()
+    scheduler = UpstreamScheduler(rate=1, burst=1, clock=clock)
+    scheduler.acquire()
+
+    async def run():
+        task = asyncio.create_task(scheduler.acquire_async(Priority.INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()['priorities']['interactive']['queued'] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert scheduler.stats()['priorities']['interactive']['queued'] == 0
+    clock.now = 1
+    assert scheduler.bucket.tokens() == 1
+
+def test_identical_calls_deduplicated():
+    """Test that identical calls waiting at once make one upstream call and share its result."""
+    scheduler = UpstreamScheduler(rate=50, burst=1)
+    scheduler.acquire()
+    calls = []
+    results = []
+
+    def call():
+        results.append(scheduler.call(('GET', 'current.json', 'Boston'), lambda: calls.append(1) or len(calls)))
+
+    threads = [in_thread(call)]
+    wait_for_queued(scheduler, 1)
+    threads += [in_thread(call) for _ in range(4)]
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [1] * 5
+    assert scheduler.stats()['deduplicated'] == 4
+
+def test_full_queue_sheds_lowest_priority():
+    """Test that an interactive call takes the place of a queued health call when the queue is full."""
+    scheduler = UpstreamScheduler(rate=10, burst=1, max_queue=1)
+    scheduler.acquire()
+    errors = []
+
+    def health_probe():
+        try:
+            scheduler.acquire(Priority.HEALTH)
+        except UpstreamBusyError as e:
+            errors.append(e)
+
+    thread = in_thread(health_probe)
+    wait_for_queued(scheduler, 1)
+    scheduler.acquire(Priority.INTERACTIVE)
+    thread.join()
+
+    assert len(errors) == 1
+    assert scheduler.stats()['priorities']['health']['shed'] == 1
+
+    # A background call does not displace a queued interactive one
+    thread = in_thread(scheduler.acquire, Priority.INTERACTIVE)
+    wait_for_queued(scheduler, 1)
+    with pytest.raises(UpstreamBusyError, match="queue is full"), upstream_priority(Priority.BACKGROUND):
+        scheduler.acquire()
+    thread.join()
+
+def test_max_wait_sheds_call():
+    """Test that a call gives up once it has waited its priority's max_wait."""
+    scheduler = UpstreamScheduler(rate=0.1, burst=1, max_wait={Priority.HEALTH: 0.05})
+    scheduler.acquire()
+    start = time.monotonic()
+    with pytest.raises(UpstreamBusyError, match="waited over 0.05s"):
+        scheduler.acquire(Priority.HEALTH)
+    assert time.monotonic() - start < 1
+    assert scheduler.stats()['priorities']['health'] == {
+        'queued': 0, 'granted': 0, 'shed': 1, 'mean_wait_ms': 0.0, 'max_wait_ms': 0.0}
+
+def test_client_throttles_on_429(mocker):
+    """Test that a 429 from the upstream empties the bucket for the Retry-After seconds."""
+    scheduler = UpstreamScheduler(rate=100, burst=10)
+    client = WeatherClient("http://weather.test/v1", "test-key", scheduler=scheduler)
+    mocker.patch.object(client.session, 'get').return_value = mocker.Mock(status_code=429, headers={'Retry-After': '30'})
+
+    assert client.get("current.json", {"q": "Boston"}).status_code == 429
+    assert scheduler.bucket.tokens() == 0
+    assert scheduler.stats()['throttled'] == 1
+    client.close()
+
+def test_max_wait_from_env(monkeypatch):
+    """Test that WEATHER_MAX_WAIT overrides the defaults it names, and error on unknown priorities."""
+    monkeypatch.setenv("WEATHER_MAX_WAIT", "health=0.5; interactive=3")
+    max_wait = max_wait_from_env()
+    assert max_wait[Priority.HEALTH] == 0.5 and max_wait[Priority.INTERACTIVE] == 3
+    assert max_wait[Priority.BACKGROUND] == 60
+    monkeypatch.setenv("WEATHER_MAX_WAIT", "urgent=1")
+    with pytest.raises(ValueError, match="Invalid WEATHER_MAX_WAIT priority: urgent"):
+        max_wait_from_env()
+
+
+##########################################################
+# Circuit Breaker
+##########################################################
+
+def test_breaker_opens_after_consecutive_failures():
+    """Test that the breaker opens after failure_threshold failures in a row and short-circuits calls."""
+    clock = FakeClock()
+    breaker = CircuitBreaker('upstream', failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 20
+    assert breaker.stats()['short_circuited'] == 1 and breaker.stats()['opened'] == 1
+
+def test_breaker_half_open_single_probe():
+    """Test that after reset_timeout one probe goes through, closing the breaker or opening it again."""
+    clock = FakeClock()
+    breaker = CircuitBreaker('upstream', failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 30
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+def test_breaker_invalid():
+    """Test error when the breaker could never open or reset."""
+    with pytest.raises(ValueError, match="Invalid failure_threshold"):
+        CircuitBreaker('upstream', failure_threshold=0)
+    with pytest.raises(ValueError, match="Invalid reset_timeout"):
+        CircuitBreaker('upstream', reset_timeout=-1)
+
+def test_client_short_circuits_when_open(mocker):
+    """Test that server errors open the client's breaker, after which it stops calling the upstream."""
+    breaker = CircuitBreaker('upstream', failure_threshold=2)
+    client = WeatherClient("http://weather.test/v1", "test-key", breaker=breaker)
+    get = mocker.patch.object(client.session, 'get')
+    get.return_value = mocker.Mock(status_code=503, headers={})
+
+    client.get("current.json", {"q": "Boston"})
+    client.get("current.json", {"q": "Boston"})
+    with pytest.raises(CircuitOpenError):
+        client.get("current.json", {"q": "Boston"})
+
+    assert get.call_count == 2
+    client.close()
+
+def test_shared_call_recorded_once(mocker):
+    """Test that callers sharing one failed or throttled call count it once on the breaker and the scheduler."""
+    import requests
+
+    scheduler = UpstreamScheduler(rate=5, burst=1)
+    breaker = CircuitBreaker('upstream', failure_threshold=5)
+    client = WeatherClient("http://weather.test/v1", "test-key", scheduler=scheduler, breaker=breaker)
+    get = mocker.patch.object(client.session, 'get')
+
+    def share_call(threads: int) -> None:
+        scheduler.acquire()
+        results = []
+
+        def call():
+            try:
+                results.append(client.get("current.json", {"q": "Boston"}))
+            except Exception as e:
+                results.append(e)
+
+        started = [in_thread(call)]
+        wait_for_queued(scheduler, 1)
+        started += [in_thread(call) for _ in range(threads - 1)]
+        for thread in started:
+            thread.join()
+        assert len(results) == threads
+
+    get.side_effect = requests.ConnectionError("timed out")
+    share_call(10)
+    assert get.call_count == 1
+    assert breaker.stats()['consecutive_failures'] == 1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    get.side_effect = None
+    get.return_value = mocker.Mock(status_code=429, headers={'Retry-After': '0'})
+    share_call(10)
+    assert scheduler.stats()['throttled'] == 1
+    client.close()
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+# app_init builds its default app on first access, from DB_URI
+os.environ.setdefault("DB_URI", "sqlite://")
+
+from app_init import app as flask_app
+from db import db
+from weather.models.account_model import User
+from weather.user_transfer import export_users, import_users, parse_records
+
+
+RECORDS = [
+    {'username': 'alice', 'password': 'alice-password'},
+    {'username': 'bob', 'password': 'bob-password'},
+    {'username': 'alice', 'password': 'repeated'},
+    {'username': '', 'password': 'no-username'},
+    {'username': 'carol'},
+    {'username': 'dave', 'salt': 'ab' * 16, 'password_hash': 'cd' * 32},
+]
+
+@pytest.fixture
+def client(monkeypatch):
+    """Fixture to provide a test client with a fresh database and admin routes enabled."""
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield flask_app.test_client()
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def ndjson(records) -> bytes:
+    return b''.join(json.dumps(record).encode() + b'\n' for record in records)
+
+
+def test_parse_records():
+    """Test that blank lines are skipped and lines that are not JSON objects are flagged."""
+    lines = ['{"username": "alice"}\n', '\n', 'not json\n', '[1, 2]\n']
+    assert list(parse_records(lines)) == [{'username': 'alice'}, None, None]
+
+def test_import_users(session):
+    """Test that valid users are inserted once and the rest counted as skipped or invalid."""
+    User.create_user('bob', 'existing')
+
+    progress = list(import_users(RECORDS + [None], batch_size=4))
+
+    assert len(progress) == 2
+    assert progress[-1] == {'processed': 7, 'inserted': 2, 'skipped': 2, 'invalid': 3}
+    assert User.check_password('alice', 'alice-password')
+    assert User.check_password('bob', 'existing')
+    assert User.query.filter_by(username='dave').one().password == 'cd' * 32
+
+def test_import_users_with_process_pool(session):
+    """Test that hashing in worker processes imports the same users in order."""
+    records = [{'username': f'user{i}', 'password': f'password{i}'} for i in range(50)]
+
+    progress = list(import_users(records, batch_size=10, workers=2))
+
+    assert [p['inserted'] for p in progress] == [10, 20, 30, 40, 50]
+    assert User.check_password('user37', 'password37')
+
+def test_import_users_invalid_settings(session):
+    """Test error when the batch size or number of workers is invalid."""
+    with pytest.raises(ValueError, match="Invalid batch size"):
+        list(import_users(RECORDS, batch_size=-1))
+    with pytest.raises(ValueError, match="Invalid workers"):
+        list(import_users(RECORDS, workers=-1))
+
+def test_export_round_trip(session):
+    """Test that exported users import elsewhere with their passwords intact."""
+    list(import_users(RECORDS, batch_size=2))
+    exported = list(export_users(batch_size=2))
+    assert [record['username'] for record in exported] == ['alice', 'bob', 'dave']
+
+    db.drop_all()
+    db.create_all()
+    list(import_users(exported))
+    assert User.check_password('bob', 'bob-password')
+
+def test_import_route_streams_progress(client, mocker):
+    """Test that the import route streams the running totals of each batch, hashing in this process."""
+    pool = mocker.patch('weather.user_transfer.ProcessPoolExecutor')
+    response = client.post('/api/admin/import-users?batch_size=3', data=ndjson(RECORDS),
+                           headers={'X-Admin-Token': 'admin-secret'})
+
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert response.content_type == 'application/x-ndjson'
+    assert lines == [{'processed': 3, 'inserted': 2, 'skipped': 1, 'invalid': 0},
+                     {'processed': 6, 'inserted': 3, 'skipped': 1, 'invalid': 2}]
+    pool.assert_not_called()
+
+def test_export_route(client):
+    """Test that the export route streams one record per user."""
+    client.post('/api/admin/import-users', data=ndjson(RECORDS), headers={'X-Admin-Token': 'admin-secret'})
+
+    response = client.get('/api/admin/export-users', headers={'X-Admin-Token': 'admin-secret'})
+
+    assert [json.loads(line)['username'] for line in response.data.splitlines()] == ['alice', 'bob', 'dave']
+
+def test_admin_routes_require_token(client, monkeypatch):
+    """Test error when the admin token is wrong or admin routes are disabled."""
+    assert client.get('/api/admin/export-users', headers={'X-Admin-Token': 'wrong'}).status_code == 401
+    assert client.post('/api/admin/import-users?batch_size=0', headers={'X-Admin-Token': 'admin-secret'}).status_code == 400
+    monkeypatch.delenv("ADMIN_TOKEN")
+    assert client.get('/api/admin/export-users').status_code == 403
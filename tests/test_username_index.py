@@ -0,0 +1,220 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import event
+
+# app_init builds its default app on first access, from DB_URI
+os.environ.setdefault("DB_URI", "sqlite://")
+
+from app_init import app as flask_app
+from db import db
+from utils.bloom import CountingBloomFilter
+from weather.models.account_model import User
+from weather.models.username_index import UsernameIndex, set_username_index
+from weather.user_transfer import import_users
+
+
+@pytest.fixture
+def index(app):
+    """Fixture to provide a fresh process-wide username index."""
+    index = UsernameIndex(refresh_interval=0)
+    set_username_index(index)
+    yield index
+    set_username_index(None)
+
+@pytest.fixture
+def client():
+    """Fixture to provide a test client with a fresh database, one user and a fresh username index."""
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        User.create_user("testuser", "password")
+    index = UsernameIndex(refresh_interval=0)
+    set_username_index(index)
+    yield flask_app.test_client()
+    set_username_index(None)
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def statements():
+    """Fixture to record the SQL statements run against the app's database."""
+    recorded = []
+    with flask_app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+##################################################
+# Bloom Filter Test Cases
+##################################################
+
+
+def test_bloom_filter_membership():
+    """Test that added items are always found and removed items are no longer found."""
+    bloom = CountingBloomFilter(capacity=1000, error_rate=0.01)
+    names = [f"user{i}" for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+
+    assert all(name in bloom for name in names)
+    assert len(bloom) == 1000
+
+    bloom.discard("user0")
+    assert "user0" not in bloom
+    assert len(bloom) == 999
+
+def test_bloom_filter_error_rate():
+    """Test that the false positive rate at capacity is close to the target."""
+    bloom = CountingBloomFilter(capacity=2000, error_rate=0.01)
+    for i in range(2000):
+        bloom.add(f"user{i}")
+
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+
+    assert false_positives / 10000 < 0.03
+    assert bloom.stats()['estimated_error_rate'] == pytest.approx(0.01, rel=0.5)
+
+def test_bloom_filter_invalid_sizing():
+    """Test error when the capacity or error rate is out of range."""
+    with pytest.raises(ValueError, match="Invalid capacity: 0, should be positive."):
+        CountingBloomFilter(capacity=0)
+    with pytest.raises(ValueError, match="Invalid error_rate: 1, should be between 0 and 1."):
+        CountingBloomFilter(error_rate=1)
+
+
+##################################################
+# Username Index Test Cases
+##################################################
+
+
+def test_index_built_from_users_table(session, index):
+    """Test that the filter is built from the existing users, and checks before then still query."""
+    User.create_user("alice", "password")
+    assert not index.built
+    assert index.is_available("alice") is False
+
+    index.rebuild()
+    assert index.built and index.rebuilds == 1
+    assert index.stats()['filter']['items'] == 1
+
+def test_index_follows_commits(session, index):
+    """Test that created users are added and deleted users removed once their transaction commits."""
+    index.rebuild()
+    User.create_user("alice", "password")
+    assert index.might_exist("alice")
+
+    User.delete_user("alice")
+    assert not index.might_exist("alice")
+
+    session.add(User(username="rolled-back", salt="s", password="p"))
+    session.flush()
+    session.rollback()
+    assert not index.might_exist("rolled-back")
+
+def test_index_follows_bulk_import(session, index):
+    """Test that users inserted by the bulk import are added to the index."""
+    index.rebuild()
+    list(import_users([{'username': 'alice', 'password': 'password'}], batch_size=10))
+    assert index.might_exist("alice")
+
+def test_free_username_skips_database(session, index):
+    """Test that once built, a username the filter has never seen is answered without a query."""
+    User.create_user("alice", "password")
+    index.rebuild()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert index.is_available("newuser") is True
+        assert index.is_available("alice") is False
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert sum(statement.lstrip().upper().startswith('SELECT') for statement in statements) == 1
+    assert (index.stats()['checks'], index.stats()['definitely_free']) == (2, 1)
+
+def test_free_answer_is_advisory(session, index):
+    """Test that a username taken by another worker may be reported free, but can not be created twice."""
+    index.rebuild()
+    # A user created by another worker is only seen by the filter after a rebuild
+    session.execute(User.__table__.insert().values(username="alice", salt="s", password="p"))
+    session.commit()
+
+    assert index.is_available("alice") is True
+    with pytest.raises(ValueError, match="already exists"):
+        User.create_user("alice", "password")
+
+    index.rebuild()
+    assert index.is_available("alice") is False
+
+def test_index_rebuilt_in_background(app, session):
+    """Test that the background thread builds the filter, and rebuilds it every refresh interval."""
+    index = UsernameIndex(refresh_interval=0.05)
+    index.start(app)
+    try:
+        for _ in range(100):
+            if index.rebuilds >= 2:
+                break
+            time.sleep(0.01)
+    finally:
+        index.stop(timeout=5)
+    assert index.built and index.rebuilds >= 2
+    assert not index.is_running()
+
+
+##################################################
+# Route Test Cases
+##################################################
+
+
+def test_username_available_route(client):
+    """Test that the route reports taken and free usernames."""
+    assert client.get('/api/username-available?username=testuser').get_json() == {
+        'username': 'testuser', 'available': False}
+    assert client.get('/api/username-available?username=newuser').get_json() == {
+        'username': 'newuser', 'available': True}
+    assert client.get('/api/username-available').status_code == 400
+
+def test_account_routes_run_one_query(client, statements):
+    """Test that create, change password and remove each run a single SELECT at most."""
+    def selects():
+        count = sum(statement.lstrip().upper().startswith('SELECT') for statement in statements)
+        statements.clear()
+        return count
+
+    assert client.post('/api/create-user', json={'username': 'newuser', 'password': 'x'}).status_code == 200
+    assert selects() == 0
+    assert client.post('/api/create-user', json={'username': 'newuser', 'password': 'x'}).status_code == 400
+    assert selects() == 0
+    assert client.post('/api/change-password', json={'username': 'newuser', 'password': 'y'}).status_code == 200
+    assert selects() == 1
+    assert client.delete('/api/remove-user', json={'username': 'newuser'}).status_code == 200
+    assert selects() <= 2  # the user, then its favorites for the delete cascade
+
+def test_create_user_route_errors(client):
+    """Test that only a taken username is a 400, and any other failure to insert is a 500."""
+    taken = client.post('/api/create-user', json={'username': 'testuser', 'password': 'x'})
+    assert taken.status_code == 400
+    assert taken.get_json() == {'error': 'Invalid username, username already taken'}
+
+    missing = client.post('/api/create-user', json={'password': 'x'})
+    assert missing.status_code == 500
+    assert missing.get_json() == {'error': 'An error occurred while creating the user'}
+
+def test_account_routes_unknown_user(client):
+    """Test error when changing the password of or removing a user that does not exist."""
+    for response in (client.post('/api/change-password', json={'username': 'nobody', 'password': 'x'}),
+                     client.delete('/api/remove-user', json={'username': 'nobody'})):
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Invalid username, user does not exist'}
@@ -0,0 +1,102 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+
+from weather.clients import weather_client
+from weather.clients.weather_client import WeatherClient, get_weather_client, reset_weather_client
+
+
+@pytest.fixture
+def client():
+    """Fixture to provide a client pointed at a placeholder upstream."""
+    client = WeatherClient("http://weather.test/v1/", "test-key", pool_size=4,
+                           connect_timeout=1.0, read_timeout=2.0, max_retries=3, backoff_factor=0.1)
+    yield client
+    client.close()
+
+@pytest.fixture
+def shared_client_env(monkeypatch):
+    """Fixture to configure the shared client from the environment and reset it afterwards."""
+    monkeypatch.setenv("WEATHER_API_URL", "http://weather.test/v1")
+    monkeypatch.setenv("WEATHER_POOL_SIZE", "7")
+    monkeypatch.setenv("WEATHER_READ_TIMEOUT", "4")
+    reset_weather_client()
+    yield
+    reset_weather_client()
+
+
+def test_get_builds_url_and_uses_default_timeout(client, mocker):
+    """Test that calls go to the endpoint url with the default timeouts."""
+    get = mocker.patch.object(client.session, 'get')
+    client.get("current.json", {"q": "Boston"})
+    get.assert_called_once_with("http://weather.test/v1/current.json", params={"q": "Boston"}, timeout=(1.0, 2.0))
+
+def test_get_timeout_override(client, mocker):
+    """Test that a per-call timeout replaces the default."""
+    get = mocker.patch.object(client.session, 'get')
+    client.get("/current.json", timeout=5)
+    assert get.call_args.kwargs['timeout'] == 5
+
+def test_session_sends_api_key(client):
+    """Test that the api key is attached to every request."""
+    assert client.session.params == {'key': 'test-key'}
+
+def test_adapter_pool_and_retries(client):
+    """Test that the mounted adapter is pooled and retries with backoff."""
+    adapter = client.session.get_adapter("http://weather.test")
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 3
+    assert adapter.max_retries.backoff_factor == 0.1
+    assert 503 in adapter.max_retries.status_forcelist
+    assert 429 not in adapter.max_retries.status_forcelist
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_retry_after_does_not_hold_the_call(status):
+    """Test that a throttled or unavailable upstream asking to retry in an hour does not hold the caller."""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            calls.append(self.path)
+            self.send_response(status)
+            self.send_header('Retry-After', '3600')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = WeatherClient(f"http://127.0.0.1:{server.server_address[1]}/v1", "test-key",
+                           max_retries=2, backoff_factor=0.01)
+    try:
+        start = time.monotonic()
+        response = client.get("current.json", {"q": "Boston"})
+        elapsed = time.monotonic() - start
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == status
+    assert elapsed < 2
+    # 503s are retried with a short backoff, 429s are left to the scheduler
+    assert len(calls) == (1 if status == 429 else 3)
+
+def test_get_weather_client_is_shared(shared_client_env):
+    """Test that the shared client is created once from the environment."""
+    client = get_weather_client()
+    assert client is get_weather_client()
+    assert client.base_url == "http://weather.test/v1"
+    assert client.timeout[1] == 4.0
+    assert client.session.get_adapter("http://weather.test")._pool_maxsize == 7
+
+def test_reset_weather_client(shared_client_env):
+    """Test that resetting drops the shared client."""
+    client = get_weather_client()
+    reset_weather_client()
+    assert weather_client._client is None
+    assert get_weather_client() is not client
@@ -0,0 +1,110 @@
+import hashlib
+import math
+import threading
+
+
+class CountingBloomFilter:
+    """
+    A thread-safe set membership filter that can answer "definitely absent" without storing items.
+
+    Every item sets k counters; an item is possibly present only if all of its counters are
+    non-zero. False positives happen at roughly error_rate while the filter holds at most
+    capacity items, and false negatives never happen. Counters instead of bits let items be
+    removed again: a counter that reaches 255 sticks there, which can only cost false positives.
+
+    Attributes:
+        capacity (int): The number of items the filter is sized for.
+        error_rate (float): The target false positive rate at capacity.
+        size (int): The number of counters.
+        hashes (int): The number of counters per item.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.01):
+        """
+        Initializes the filter, sized for capacity items at the given false positive rate.
+
+        Args:
+            capacity (int): the number of items expected.
+            error_rate (float): the acceptable false positive rate.
+
+        Raises:
+            ValueError: if capacity is not positive or error_rate is not between 0 and 1.
+        """
+        if capacity <= 0:
+            raise ValueError(f"Invalid capacity: {capacity}, should be positive.")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Invalid error_rate: {error_rate}, should be between 0 and 1.")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._counters = bytearray(self.size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """The number of items added and not removed since the filter was created."""
+        return self._count
+
+    def __contains__(self, item: str) -> bool:
+        counters = self._counters
+        return all(counters[index] for index in self._indexes(item))
+
+    def _indexes(self, item: str) -> list[int]:
+        """Derive the item's k counter positions from one 128-bit digest by double hashing."""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        """
+        Add an item to the filter.
+
+        Args:
+            item (str): the item to add.
+        """
+        indexes = self._indexes(item)
+        with self._lock:
+            counters = self._counters
+            for index in indexes:
+                if counters[index] < 255:
+                    counters[index] += 1
+            self._count += 1
+
+    def discard(self, item: str) -> None:
+        """
+        Remove an item that was added before. Removing an item that was never added corrupts the
+        filter, so callers must only discard items they know are present.
+
+        Args:
+            item (str): the item to remove.
+        """
+        indexes = self._indexes(item)
+        with self._lock:
+            counters = self._counters
+            if not all(counters[index] for index in indexes):
+                return
+            for index in indexes:
+                if counters[index] < 255:
+                    counters[index] -= 1
+            self._count -= 1
+
+    def stats(self) -> dict:
+        """
+        Get the filter's sizing and fill.
+
+        Returns:
+            dict: the item count, capacity, counters, hashes per item and the estimated
+            false positive rate at the current fill.
+        """
+        with self._lock:
+            count = self._count
+        return {
+            'items': count,
+            'capacity': self.capacity,
+            'counters': self.size,
+            'hashes': self.hashes,
+            'memory_bytes': self.size,
+            'estimated_error_rate': (1 - math.exp(-self.hashes * count / self.size)) ** self.hashes,
+        }
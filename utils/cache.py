@@ -0,0 +1,279 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+
+class _InFlight:
+    """A pending load that concurrent callers for the same key wait on."""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class TTLCache:
+    """
+    A bounded, thread-safe cache with per-entry expiry and LRU eviction.
+
+    Misses for the same key are coalesced: while one caller runs the loader,
+    every other caller asking for that key waits for its result instead of
+    starting a second load. With a stale_ttl, expired entries are kept that much
+    longer for get_with_age, so a caller can serve them while reloading.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept before evicting the least recently used.
+        ttl (float): The number of seconds an entry stays fresh.
+        stale_ttl (float): The number of seconds an expired entry is still kept for get_with_age.
+        hits (int): The number of lookups answered from the cache.
+        stale_hits (int): The number of get_with_age lookups answered with an expired entry.
+        misses (int): The number of lookups that had to run the loader.
+        evictions (int): The number of entries dropped to stay within maxsize.
+        coalesced (int): The number of misses that waited on another caller's load.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic,
+                 stale_ttl: float = 0.0):
+        """
+        Initializes the cache.
+
+        Args:
+            maxsize (int): The maximum number of entries to keep.
+            ttl (float): The number of seconds an entry stays fresh.
+            clock (Callable[[], float]): The time source, replaceable in tests.
+            stale_ttl (float): The number of seconds an expired entry is still kept for get_with_age.
+
+        Raises:
+            ValueError: if maxsize is not positive or ttl or stale_ttl is negative.
+        """
+        if maxsize <= 0:
+            raise ValueError(f"Invalid maxsize: {maxsize}, should be positive.")
+        if ttl < 0:
+            raise ValueError(f"Invalid ttl: {ttl}, should not be negative.")
+        if stale_ttl < 0:
+            raise ValueError(f"Invalid stale_ttl: {stale_ttl}, should not be negative.")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (time stored, value)
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[Hashable, _InFlight] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _lookup_with_age(self, key: Hashable) -> tuple[Any, float] | None:
+        """Return (value, age) for an entry that is fresh or within stale_ttl. Caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        age = self._clock() - stored_at
+        if age >= self.ttl + self.stale_ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, age
+
+    def _lookup(self, key: Hashable) -> tuple[bool, Any]:
+        """Return (found, value) for a fresh entry. Caller must hold the lock."""
+        entry = self._lookup_with_age(key)
+        if entry is None or entry[1] >= self.ttl:
+            return False, None
+        return True, entry[0]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        """Insert or refresh an entry, evicting the oldest ones. Caller must hold the lock."""
+        self._entries[key] = (self._clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a fresh value from the cache without loading it.
+
+        Args:
+            key (Hashable): the key to look up.
+            default (Any): the value returned when the key is missing or expired.
+
+        Returns:
+            Any: the cached value, or default.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def get_with_age(self, key: Hashable) -> tuple[Any, float] | None:
+        """
+        Get a value and how long ago it was stored, even if it has expired, without loading it.
+
+        A miss is not counted here, since the caller is expected to load the key next with get_or_load.
+
+        Args:
+            key (Hashable): the key to look up.
+
+        Returns:
+            tuple[Any, float] | None: the cached value and its age in seconds, stale if the age is at
+            least ttl, or None if the key is missing or expired more than stale_ttl ago.
+        """
+        with self._lock:
+            entry = self._lookup_with_age(key)
+            if entry is not None:
+                if entry[1] < self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+            return entry
+
+    def peek_with_age(self, key: Hashable) -> tuple[Any, float] | None:
+        """
+        Get a value and how long ago it was stored like get_with_age, without counting a hit or
+        marking the entry as recently used.
+
+        Args:
+            key (Hashable): the key to look up.
+
+        Returns:
+            tuple[Any, float] | None: the cached value and its age in seconds, or None if the key is
+            missing or expired more than stale_ttl ago.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            age = self._clock() - stored_at
+            if age >= self.ttl + self.stale_ttl:
+                return None
+            return value, age
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value in the cache.
+
+        Args:
+            key (Hashable): the key to store the value under.
+            value (Any): the value to store.
+        """
+        with self._lock:
+            self._store(key, value)
+
+    def values(self) -> list:
+        """
+        Get every fresh value in the cache without touching recency or counters.
+
+        Returns:
+            list: the cached values, least recently used first.
+        """
+        with self._lock:
+            now = self._clock()
+            return [value for stored_at, value in self._entries.values() if now - stored_at < self.ttl]
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop a key from the cache if it is present.
+
+        Args:
+            key (Hashable): the key to drop.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry from the cache. Counters are left untouched."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], force: bool = False) -> Any:
+        """
+        Get a value from the cache, running the loader on a miss.
+
+        Only one loader runs per key at a time; concurrent misses wait for it and share its
+        result. If the loader raises, every waiting caller sees the same exception and
+        nothing is cached.
+
+        Args:
+            key (Hashable): the key to look up.
+            loader (Callable[[], Any]): called with no arguments to produce the value on a miss.
+            force (bool): skip the fresh-entry check and reload, still coalescing with other loads.
+
+        Returns:
+            Any: the cached or freshly loaded value.
+        """
+        with self._lock:
+            if not force:
+                found, value = self._lookup(key)
+                if found:
+                    self.hits += 1
+                    return value
+            self.misses += 1
+
+            pending = self._in_flight.get(key)
+            leader = pending is None
+            if leader:
+                pending = _InFlight()
+                self._in_flight[key] = pending
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = loader()
+        except BaseException as e:
+            pending.error = e
+            raise
+        else:
+            pending.value = value
+            with self._lock:
+                self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            pending.event.set()
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: the current size, configured limits and hit/stale hit/miss/eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,137 @@
+import threading
+import time
+from typing import Callable
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency while its circuit breaker is open.
+
+    Attributes:
+        retry_after (float): The seconds until the breaker lets a probe call through.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker for calls to a remote dependency.
+
+    The breaker starts closed and lets every call through. After failure_threshold
+    consecutive failures it opens, and calls fail at once with CircuitOpenError instead of
+    waiting on a dependency that is down. Once reset_timeout has passed it is half-open:
+    a single probe call is let through, and the breaker closes if the probe succeeds or
+    opens again if it fails.
+
+    Callers wrap each call in before_call and one of record_success, record_failure or
+    release.
+
+    Attributes:
+        name (str): The dependency, used in error messages.
+        failure_threshold (int): The consecutive failures that open the breaker.
+        reset_timeout (float): The seconds an open breaker waits before letting a probe through.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes a closed breaker.
+
+        Args:
+            name (str): the dependency, used in error messages.
+            failure_threshold (int): the consecutive failures that open the breaker.
+            reset_timeout (float): the seconds an open breaker waits before letting a probe through.
+            clock (Callable[[], float]): the time source, replaceable in tests.
+
+        Raises:
+            ValueError: if failure_threshold is less than 1 or reset_timeout is negative.
+        """
+        if failure_threshold < 1:
+            raise ValueError(f"Invalid failure_threshold: {failure_threshold}, should be at least 1.")
+        if reset_timeout < 0:
+            raise ValueError(f"Invalid reset_timeout: {reset_timeout}, should not be negative.")
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._opened = 0
+        self._short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        """The breaker's state: closed, open or half_open."""
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """
+        Check that a call may go ahead, letting it through as the probe if the breaker is due one.
+
+        Raises:
+            CircuitOpenError: if the breaker is open, or half-open with a probe already in flight.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            retry_after = self._opened_at + self.reset_timeout - self._clock()
+            if self._state == self.OPEN and retry_after <= 0:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._short_circuited += 1
+            raise CircuitOpenError(self.name, max(0.0, retry_after))
+
+    def record_success(self) -> None:
+        """Record a call that succeeded, closing the breaker."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Record a call that failed, opening the breaker if it was probing or has failed too often."""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def release(self) -> None:
+        """Record a call that never reached the dependency, so it counts as neither success nor failure."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> dict:
+        """
+        Get the breaker's state and counters.
+
+        Returns:
+            dict: the 'state', the 'consecutive_failures', the times the breaker 'opened', the calls
+            'short_circuited' while it was open, and the seconds until the next probe when open.
+        """
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'opened': self._opened,
+                'short_circuited': self._short_circuited,
+                'retry_after': round(max(0.0, self._opened_at + self.reset_timeout - self._clock()), 3)
+                               if self._state != self.CLOSED else 0.0,
+            }
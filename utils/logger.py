@@ -1,26 +1,287 @@
+"""
+Process-wide logging pipeline.
+
+Every configured logger hands its records to one queue handler, and a background listener
+thread formats and writes them to stderr. The request thread only creates the record and
+enqueues it; formatting and I/O happen on the listener. Configuring loggers, as every module
+does on import, only attaches the handler: the listener starts with the first record.
+
+Configured from the environment:
+    APP_ENV: production, development or test, picking the default level (INFO, DEBUG, WARNING).
+    LOG_LEVEL: overrides the level picked by APP_ENV.
+    LOG_FORMAT: text (default) or json, one object per line.
+    LOG_QUEUE_SIZE: records buffered before new ones are dropped, by default 10000.
+    LOG_SAMPLE_RATES: "template=rate;template=rate" to keep only a fraction of high-volume
+        INFO and DEBUG lines, matched on the unformatted message. Replaces DEFAULT_SAMPLE_RATES.
+"""
+import atexit
+from datetime import datetime, timezone
+import itertools
+import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import os
+import queue
 import sys
+import threading
+from typing import Callable
+
+
+ENV_LEVELS = {'production': 'INFO', 'development': 'DEBUG', 'test': 'WARNING'}
+
+# Lines logged for every favorite read, kept at one in ten unless LOG_SAMPLE_RATES says otherwise
+DEFAULT_SAMPLE_RATES = {
+    "retrieving weather from %s.": 0.1,
+    "retrieving historical weather for %s.": 0.1,
+    "retrieving 5 day forecast for %s.": 0.1,
+}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def log_level() -> int:
+    """The level loggers are set to, from LOG_LEVEL or else the APP_ENV default."""
+    name = os.getenv("LOG_LEVEL") or ENV_LEVELS.get(os.getenv("APP_ENV", "development").lower(), 'DEBUG')
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Invalid LOG_LEVEL: {name}, should be DEBUG, INFO, WARNING, ERROR or CRITICAL.")
+    return level
+
+
+def sample_rates_from_env() -> dict[str, float]:
+    """Parse LOG_SAMPLE_RATES, falling back to DEFAULT_SAMPLE_RATES when it is unset."""
+    value = os.getenv("LOG_SAMPLE_RATES")
+    if value is None:
+        return dict(DEFAULT_SAMPLE_RATES)
+    rates = {}
+    for entry in value.split(';'):
+        if entry.strip():
+            template, _, rate = entry.rpartition('=')
+            rates[template.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'sample_rate', None) is not None:
+            entry['sample_rate'] = record.sample_rate
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate INFO or DEBUG records of each sampled message template.
+
+    Sampling counts records rather than drawing random numbers, so a template at rate 0.1 keeps
+    exactly every tenth line. Kept records carry their rate as record.sample_rate. Warnings and
+    errors are never sampled.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._every = {template: max(1, round(1 / rate)) if rate > 0 else None for template, rate in rates.items()}
+        self._counters = {template: itertools.count() for template in rates}
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or record.msg not in self._every:
+            return True
+        every = self._every[record.msg]
+        if every is not None and next(self._counters[record.msg]) % every == 0:
+            record.sample_rate = self.rates[record.msg]
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    A queue handler that never formats or blocks on the caller's thread.
+
+    Records are enqueued as they are, since the listener runs in this process, and a full
+    queue drops the record instead of waiting for the listener to catch up. The first record
+    calls on_first_record, which starts the listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, on_first_record: Callable[[], None] | None = None):
+        super().__init__(log_queue)
+        self.on_first_record = on_first_record
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.on_first_record is not None:
+            on_first_record, self.on_first_record = self.on_first_record, None
+            on_first_record()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    """A queue listener whose stop waits for room in a full queue instead of failing."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    A queue handler shared by every configured logger, drained by one listener thread.
+
+    Attributes:
+        handler (NonBlockingQueueHandler): The handler loggers are given.
+        sink (logging.Handler): The handler the listener writes records to.
+        sampler (SamplingFilter): The filter thinning out high-volume lines.
+    """
+
+    def __init__(self, sink: logging.Handler, queue_size: int = 10000, sample_rates: dict[str, float] | None = None):
+        """
+        Initializes the pipeline. The listener is started by start(), or by the first record.
+
+        Args:
+            sink (logging.Handler): the handler that formats and writes records.
+            queue_size (int): records buffered before new ones are dropped.
+            sample_rates (dict[str, float] | None): message templates mapped to the fraction kept.
+        """
+        self.sink = sink
+        self.handler = NonBlockingQueueHandler(queue.Queue(queue_size), on_first_record=self.start)
+        self.sampler = SamplingFilter(sample_rates or {})
+        self.handler.addFilter(self.sampler)
+        self._listener: _Listener | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the listener thread if it is not running."""
+        with self._lock:
+            if self._listener is None:
+                self._listener = _Listener(self.handler.queue, self.sink, respect_handler_level=True)
+                self._listener.start()
+
+    def is_running(self) -> bool:
+        """Check whether the listener thread has been started and not stopped."""
+        return self._listener is not None
+
+    def stop(self) -> None:
+        """Write every queued record and stop the listener thread."""
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener = None
+
+    def restart_after_fork(self) -> None:
+        """
+        Give a forked child its own queue, and a listener started by its first record, since the
+        parent's thread did not survive the fork.
+        """
+        self._lock = threading.Lock()
+        self._listener = None
+        self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+        self.handler.on_first_record = self.start
+
+    def stats(self) -> dict:
+        """
+        Get the pipeline counters.
+
+        Returns:
+            dict: the records waiting, dropped because the queue was full, and sampled out.
+        """
+        return {
+            'queued': self.handler.queue.qsize(),
+            'dropped': self.handler.dropped,
+            'sampled_out': self.sampler.sampled_out,
+        }
+
+
+def _pipeline_from_env() -> LogPipeline:
+    """Build the pipeline writing to stderr in the LOG_FORMAT format."""
+    sink = logging.StreamHandler(sys.stderr)
+    log_format = os.getenv("LOG_FORMAT", "text").lower()
+    if log_format == 'json':
+        sink.setFormatter(JsonFormatter())
+    elif log_format == 'text':
+        sink.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        raise ValueError(f"Invalid LOG_FORMAT: {log_format}, should be text or json.")
+    return LogPipeline(sink, int(os.getenv("LOG_QUEUE_SIZE", "10000")), sample_rates_from_env())
+
+
+_pipeline: LogPipeline | None = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_pipeline() -> LogPipeline:
+    """
+    Get the process-wide log pipeline, creating it on first use. Its listener thread starts
+    with the first record.
+
+    Returns:
+        LogPipeline: the shared pipeline.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = _pipeline_from_env()
+    return _pipeline
+
+
+def set_log_pipeline(pipeline: LogPipeline | None) -> None:
+    """
+    Replace the process-wide log pipeline, e.g. with one writing to a buffer in tests.
+
+    Loggers configured before the swap keep the old pipeline's handler until configured again.
+
+    Args:
+        pipeline (LogPipeline | None): the pipeline to use, or None to build one from the environment on next use.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        _pipeline = pipeline
+
+
+def configure_logger(logger: logging.Logger) -> None:
+    """
+    Route a logger through the process-wide pipeline at the configured level.
 
-from flask import current_app, has_request_context
+    Safe to call any number of times: the logger is given the pipeline's handler once, and
+    handlers of earlier pipelines are replaced.
 
+    Args:
+        logger (logging.Logger): the logger to configure.
+    """
+    handler = get_log_pipeline().handler
+    logger.setLevel(log_level())
+    for existing in list(logger.handlers):
+        if isinstance(existing, NonBlockingQueueHandler) and existing is not handler:
+            logger.removeHandler(existing)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
 
-def configure_logger(logger):
-    logger.setLevel(logging.DEBUG)  # Set the desired logging level here
 
-    # Create a console handler that logs to stderr
-    handler = logging.StreamHandler(sys.stderr)
-    handler.setLevel(logging.DEBUG)
+@atexit.register
+def _flush_on_exit() -> None:
+    if _pipeline is not None:
+        _pipeline.stop()
 
-    # Create a formatter with a timestamp
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-    # Add the formatter to the handler
-    handler.setFormatter(formatter)
+def _restart_in_child() -> None:
+    if _pipeline is not None:
+        _pipeline.restart_after_fork()
 
-    # Add the handler to the logger
-    logger.addHandler(handler)
 
-    if has_request_context():
-        app_logger = current_app.logger
-        for handler in app_logger.handlers:
-            logger.addHandler(handler)
\ No newline at end of file
+os.register_at_fork(after_in_child=_restart_in_child)
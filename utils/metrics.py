@@ -0,0 +1,390 @@
+from bisect import bisect_left
+import os
+import threading
+import time
+from typing import Iterable
+
+from flask import Flask, Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Seconds; request and upstream latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds; database queries are expected to be much faster
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    """Format a label set in the Prometheus text format."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    A named metric with a fixed set of label names and one child per label value combination.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description shown in the exposition.
+        labelnames (tuple[str, ...]): The label names every child is keyed by.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """
+        Get the child for one combination of label values, creating it on first use.
+
+        Args:
+            *values: the label values, in the order of labelnames.
+
+        Returns:
+            the child to record on.
+
+        Raises:
+            ValueError: if the number of values does not match the label names.
+        """
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"Invalid labels for {self.name}: expected {len(self.labelnames)} values, got {len(key)}.")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        """
+        Format the metric in the Prometheus text format.
+
+        Returns:
+            str: the HELP and TYPE lines followed by one line per sample.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+    def _items(self) -> list[tuple[tuple[str, ...], object]]:
+        """Get every child with its label values, in label order."""
+        with self._lock:
+            return sorted(self._children.items(), key=lambda item: item[0])
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A value that only goes up, such as a count of requests."""
+
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled counter."""
+        self._default.inc(amount)
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._items()]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as the number of requests in flight."""
+
+    type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrement the unlabelled gauge."""
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        """Set the unlabelled gauge."""
+        self._default.set(value)
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, upper_bounds: tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """
+    Observations counted into fixed buckets, such as request latencies.
+
+    Recording is a binary search over the buckets and two additions, so it is cheap enough
+    to leave on for every request.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        """Record an observation on the unlabelled histogram."""
+        self._default.observe(value)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for values, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The set of metrics exposed together at the metrics endpoint.
+
+    Registering a metric name twice returns the metric registered first, so modules can
+    declare the metrics they record at import time.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif type(metric) is not metric_class:
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}.")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        """Get or register a counter."""
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        """Get or register a gauge."""
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or register a histogram."""
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def expose(self) -> str:
+        """
+        Format every metric in the Prometheus text format.
+
+        Returns:
+            str: the exposition, ending with a newline.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(metric.expose() for metric in metrics) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'http_requests_total', "HTTP requests handled, by route, method and status.", ('route', 'method', 'status'))
+http_request_seconds = registry.histogram(
+    'http_request_duration_seconds', "HTTP request latency in seconds, by route and method.", ('route', 'method'))
+http_in_flight = registry.gauge(
+    'http_requests_in_flight', "HTTP requests currently being handled.")
+upstream_request_seconds = registry.histogram(
+    'upstream_request_duration_seconds', "weatherapi.com call latency in seconds, by endpoint, method and status.",
+    ('endpoint', 'method', 'status'))
+upstream_queued = registry.gauge(
+    'upstream_queued_calls', "weatherapi.com calls waiting for the rate limit, by priority.", ('priority',))
+upstream_wait_seconds = registry.histogram(
+    'upstream_wait_duration_seconds', "Time weatherapi.com calls waited for the rate limit, by priority and "
+    "whether they were granted or shed.", ('priority', 'outcome'))
+db_query_seconds = registry.histogram(
+    'db_query_duration_seconds', "Database query latency in seconds, by statement type.", ('operation',), DB_BUCKETS)
+dependency_up = registry.gauge(
+    'dependency_up', "1 if the last health check of a dependency passed, otherwise 0.", ('dependency',))
+
+
+def metrics_enabled() -> bool:
+    """Check METRICS_ENABLED, which defaults to on."""
+    return os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+
+def observe_request(route: str, method: str, status: int, seconds: float) -> None:
+    """
+    Record one handled HTTP request.
+
+    Args:
+        route (str): the route pattern, not the raw path, to keep the number of series bounded.
+        method (str): the HTTP method.
+        status (int): the response status code.
+        seconds (float): how long the request took.
+    """
+    http_requests.labels(route, method, status).inc()
+    http_request_seconds.labels(route, method).observe(seconds)
+
+
+def observe_upstream(endpoint: str, method: str, status: int | str, seconds: float) -> None:
+    """
+    Record one weatherapi.com call.
+
+    Args:
+        endpoint (str): the endpoint called, e.g. "current.json".
+        method (str): the HTTP method.
+        status (int | str): the response status code, or "error" if no response was received.
+        seconds (float): how long the call took.
+    """
+    upstream_request_seconds.labels(endpoint, method, status).observe(seconds)
+
+
+def observe_upstream_wait(priority: str, outcome: str, seconds: float) -> None:
+    """
+    Record how long one weatherapi.com call waited for the rate limit.
+
+    Args:
+        priority (str): the priority of the call, e.g. "interactive".
+        outcome (str): "granted" if the call went ahead, or "shed" if it gave up.
+        seconds (float): how long the call waited.
+    """
+    upstream_wait_seconds.labels(priority, outcome).observe(seconds)
+
+
+def observe_dependency(dependency: str, healthy: bool) -> None:
+    """
+    Record the outcome of one dependency's health check.
+
+    Args:
+        dependency (str): the dependency checked, e.g. "database".
+        healthy (bool): whether the check passed.
+    """
+    dependency_up.labels(dependency).set(1 if healthy else 0)
+
+
+def init_app(app: Flask) -> None:
+    """
+    Record the latency, status and concurrency of every request the app handles.
+
+    Args:
+        app (Flask): the app to instrument.
+    """
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        http_in_flight.inc()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+        return response
+
+    @app.teardown_request
+    def stop_timer(error=None):
+        http_in_flight.dec()
+
+
+_sqlalchemy_instrumented = False
+_sqlalchemy_lock = threading.Lock()
+
+
+def instrument_sqlalchemy() -> None:
+    """Time every query run by any SQLAlchemy engine. Safe to call more than once."""
+    global _sqlalchemy_instrumented
+    with _sqlalchemy_lock:
+        if _sqlalchemy_instrumented:
+            return
+        _sqlalchemy_instrumented = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if starts:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+            db_query_seconds.labels(operation).observe(time.perf_counter() - starts.pop())
+
+    @event.listens_for(Engine, 'handle_error')
+    def discard_failed_query(context):
+        # A failed query never reaches after_cursor_execute
+        if context.connection is not None:
+            starts = context.connection.info.get('metrics_query_start')
+            if starts:
+                starts.pop()
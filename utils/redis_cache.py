@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class NullBackend:
+    """A backend that stores nothing, used when caching is disabled."""
+
+    name = 'none'
+
+    def get(self, key: str) -> str | None:
+        return None
+
+    def set(self, key: str, value: str, ex: int | None = None, nx: bool = False) -> None:
+        pass
+
+    def delete(self, *keys: str) -> None:
+        pass
+
+    def ping(self) -> bool:
+        return True
+
+
+class InMemoryBackend:
+    """
+    A process-local stand-in for Redis with the same get/set/delete subset.
+
+    Only suitable for tests and single-process deployments: other workers never see its
+    writes or invalidations.
+    """
+
+    name = 'memory'
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: dict[str, tuple[float | None, str]] = {}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ex: int | None = None, nx: bool = False) -> None:
+        with self._lock:
+            if nx:
+                entry = self._data.get(key)
+                if entry is not None and (entry[0] is None or entry[0] > self._clock()):
+                    return
+            self._data[key] = (self._clock() + ex if ex else None, value)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def ping(self) -> bool:
+        return True
+
+
+class RedisBackend:
+    """
+    A backend around a redis-py compatible client, such as redis.Redis or fakeredis.FakeRedis.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def get(self, key: str) -> str | None:
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ex: int | None = None, nx: bool = False) -> None:
+        self.client.set(key, value, ex=ex, nx=nx)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+    def ping(self) -> bool:
+        return bool(self.client.ping())
+
+
+_backend: Any = None
+_backend_lock = threading.Lock()
+
+
+def _backend_from_env() -> Any:
+    """Build the backend named by CACHE_BACKEND, defaulting to redis when REDIS_HOST is set."""
+    name = os.getenv("CACHE_BACKEND", "redis" if os.getenv("REDIS_HOST") else "none").lower()
+    if name == 'redis':
+        import redis
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            db=int(os.getenv("REDIS_DB", "0")),
+            socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5")),
+            socket_connect_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5")),
+        )
+        return RedisBackend(client)
+    if name == 'memory':
+        return InMemoryBackend()
+    if name == 'none':
+        return NullBackend()
+    raise ValueError(f"Invalid CACHE_BACKEND: {name}, should be redis, memory or none.")
+
+
+def get_cache_backend() -> Any:
+    """
+    Get the process-wide cache backend, creating it from the environment on first use.
+
+    Returns:
+        The configured backend.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _backend_from_env()
+                logger.info("Using %s cache backend", _backend.name)
+    return _backend
+
+
+def set_cache_backend(backend: Any) -> None:
+    """
+    Replace the process-wide cache backend, e.g. with an InMemoryBackend in tests.
+
+    Args:
+        backend: the backend to use, or None to rebuild it from the environment on next use.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def cache_get_json(key: str) -> Any:
+    """
+    Read a JSON value from the cache. Backend errors are logged and treated as a miss.
+
+    Args:
+        key (str): the cache key.
+
+    Returns:
+        Any: the decoded value, or None on a miss.
+    """
+    try:
+        value = get_cache_backend().get(key)
+    except Exception as e:
+        logger.warning("Cache read for %s failed: %s", key, str(e))
+        return None
+    return None if value is None else json.loads(value)
+
+
+def cache_set_json(key: str, value: Any, ttl: int | None) -> None:
+    """
+    Write a JSON value to the cache. Backend errors are logged and ignored.
+
+    Args:
+        key (str): the cache key.
+        value (Any): the JSON-serializable value.
+        ttl (int | None): seconds until the key expires.
+    """
+    try:
+        get_cache_backend().set(key, json.dumps(value), ex=ttl)
+    except Exception as e:
+        logger.warning("Cache write for %s failed: %s", key, str(e))
+
+
+def cache_add_json(key: str, value: Any, ttl: int | None) -> None:
+    """
+    Write a JSON value to the cache only if the key is not cached, with SET NX. Backend errors
+    are logged and ignored.
+
+    Cache-aside fills use this instead of cache_set_json: a row read just before a concurrent
+    commit must not overwrite the newer value that commit's write-through already cached.
+
+    Args:
+        key (str): the cache key.
+        value (Any): the JSON-serializable value.
+        ttl (int | None): seconds until the key expires.
+    """
+    try:
+        get_cache_backend().set(key, json.dumps(value), ex=ttl, nx=True)
+    except Exception as e:
+        logger.warning("Cache write for %s failed: %s", key, str(e))
+
+
+def cache_delete(*keys: str) -> None:
+    """
+    Drop keys from the cache. Backend errors are logged and ignored.
+
+    Args:
+        keys (str): the cache keys.
+    """
+    try:
+        get_cache_backend().delete(*keys)
+    except Exception as e:
+        logger.warning("Cache delete for %s failed: %s", keys, str(e))
+
+
+####################################################
+#
+# Write-through on commit
+#
+####################################################
+
+# model class -> (key function, serializer or None to only invalidate, ttl)
+_write_through: dict[type, tuple[Callable[[Any], str], Callable[[Any], Any] | None, Callable[[], int]]] = {}
+
+
+def register_write_through(model: type, key: Callable[[Any], str],
+                           serialize: Callable[[Any], Any] | None = None,
+                           ttl: Callable[[], int] = lambda: 300) -> None:
+    """
+    Propagate committed changes of a model to the cache.
+
+    When a session commits, every new or changed instance is written to its key (or the key
+    is dropped if serialize is None), and every deleted instance's key is dropped. Nothing
+    is written when the transaction rolls back.
+
+    Args:
+        model (type): the SQLAlchemy model class.
+        key (Callable): maps an instance to its cache key.
+        serialize (Callable | None): maps an instance to the JSON value to cache.
+        ttl (Callable[[], int]): returns the key's time to live in seconds.
+    """
+    _write_through[model] = (key, serialize, ttl)
+
+
+def invalidate_on_commit(session: Session, *keys: str) -> None:
+    """
+    Drop keys from the cache when the session commits, for changes made outside the ORM
+    unit of work such as bulk query deletes.
+
+    Args:
+        session (Session): the session the change is made in.
+        keys (str): the cache keys to drop.
+    """
+    pending = session.info.setdefault('write_through', {})
+    for cache_key in keys:
+        pending[cache_key] = None
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_write_through(session: Session, flush_context: Any) -> None:
+    """Record the cache writes implied by this flush until the transaction commits."""
+    if not _write_through:
+        return
+    pending = session.info.setdefault('write_through', {})
+    for instance in list(session.new) + list(session.dirty):
+        config = _write_through.get(type(instance))
+        if config is not None:
+            key, serialize, ttl = config
+            pending[key(instance)] = (serialize(instance), ttl()) if serialize else None
+    for instance in session.deleted:
+        config = _write_through.get(type(instance))
+        if config is not None:
+            pending[config[0](instance)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_write_through(session: Session) -> None:
+    """Push the recorded writes and invalidations to the cache."""
+    pending = session.info.pop('write_through', None)
+    if not pending:
+        return
+    deletes = [key for key, value in pending.items() if value is None]
+    if deletes:
+        cache_delete(*deletes)
+    for key, value in pending.items():
+        if value is not None:
+            cache_set_json(key, value[0], value[1])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_write_through(session: Session) -> None:
+    """Forget the recorded writes of a rolled back transaction."""
+    session.info.pop('write_through', None)
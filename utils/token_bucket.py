@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+
+    Tokens accrue at rate per second up to burst, and every call spends one, so calls can
+    briefly run at burst and then settle at rate. The bucket can also be paused, for when
+    the remote side says it is being called too often.
+
+    Attributes:
+        rate (float): The tokens added per second.
+        burst (int): The most tokens the bucket holds.
+    """
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes a full bucket.
+
+        Args:
+            rate (float): the tokens added per second.
+            burst (int): the most tokens the bucket holds.
+            clock (Callable[[], float]): the time source, replaceable in tests.
+
+        Raises:
+            ValueError: if rate is not positive or burst is less than 1.
+        """
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}, should be positive.")
+        if burst < 1:
+            raise ValueError(f"Invalid burst: {burst}, should be at least 1.")
+
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens accrued since the last update. Must be called with the lock held."""
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def try_acquire(self) -> float:
+        """
+        Spend a token if one is available.
+
+        Returns:
+            float: 0.0 if a token was spent, otherwise the seconds until one will be available.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now + max(0.0, 1 - self._tokens) / self.rate
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """
+        Empty the bucket and stop adding tokens for a while.
+
+        Args:
+            seconds (float): how long to add no tokens for.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + seconds)
+
+    def tokens(self) -> float:
+        """
+        Get the tokens currently available.
+
+        Returns:
+            float: the available tokens, possibly fractional.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            return 0.0 if now < self._paused_until else self._tokens
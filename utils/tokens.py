@@ -0,0 +1,253 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from typing import Callable
+
+from utils.logger import configure_logger
+from utils.redis_cache import cache_get_json, cache_set_json, get_cache_backend
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class RevocationList:
+    """
+    Tokens revoked before they expire, kept in process and mirrored to the shared cache backend.
+
+    A token can be revoked on its own (logout), or every token a user was issued before a point
+    in time can be revoked at once (password change, account deletion). Entries are dropped once
+    the tokens they cover have expired anyway.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens: dict[str, int] = {}  # token id -> expiry
+        self._not_before: dict[str, tuple[float, float]] = {}  # username -> (issued-before cutoff, expiry)
+
+    def revoke(self, token_id: str, expires_at: int) -> None:
+        """
+        Revoke one token.
+
+        Args:
+            token_id (str): the token's id.
+            expires_at (int): the unix time the token expires at.
+        """
+        with self._lock:
+            self._tokens[token_id] = expires_at
+            self._prune()
+        cache_set_json(f"token-revoked:{token_id}", expires_at, max(int(expires_at - self._clock()), 1))
+
+    def revoke_user(self, username: str, ttl: int) -> None:
+        """
+        Revoke every token issued to a user until now.
+
+        Args:
+            username (str): the user whose tokens are revoked.
+            ttl (int): the longest lifetime of a token, after which the cutoff no longer matters.
+        """
+        now = round(self._clock(), 3)
+        with self._lock:
+            self._not_before[username] = (now, now + ttl)
+            self._prune()
+        cache_set_json(f"token-not-before:{username}", now, ttl)
+
+    def is_revoked(self, token_id: str, username: str, issued_at: float) -> bool:
+        """
+        Check whether a token has been revoked, in process first and then in the shared cache.
+
+        Args:
+            token_id (str): the token's id.
+            username (str): the user the token was issued to.
+            issued_at (float): the unix time the token was issued at, to the millisecond.
+
+        Returns:
+            bool: True if the token or every token of its user issued before it was revoked.
+        """
+        with self._lock:
+            if token_id in self._tokens:
+                return True
+            not_before = self._not_before.get(username)
+            if not_before is not None and issued_at <= not_before[0]:
+                return True
+
+        # Revocations made by other workers, only when a shared backend is configured
+        if get_cache_backend().name == 'none':
+            return False
+        if cache_get_json(f"token-revoked:{token_id}") is not None:
+            return True
+        not_before = cache_get_json(f"token-not-before:{username}")
+        return not_before is not None and issued_at <= not_before
+
+    def cutoff(self, username: str) -> float | None:
+        """Get the time up to which a user's tokens were revoked in this process, if any."""
+        with self._lock:
+            not_before = self._not_before.get(username)
+        return not_before[0] if not_before is not None else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tokens) + len(self._not_before)
+
+    def _prune(self) -> None:
+        """Drop entries whose tokens have all expired. Caller must hold the lock."""
+        now = self._clock()
+        for token_id in [token_id for token_id, expires_at in self._tokens.items() if expires_at <= now]:
+            del self._tokens[token_id]
+        for username in [username for username, (_, expires_at) in self._not_before.items() if expires_at <= now]:
+            del self._not_before[username]
+
+
+class TokenSigner:
+    """
+    Issues and verifies signed, expiring session tokens.
+
+    A token is a base64url JSON payload and its HMAC-SHA256 signature, so verifying one is a
+    hash over a few hundred bytes with no database lookup or password hash.
+
+    Attributes:
+        ttl (int): Seconds a token stays valid.
+        revocations (RevocationList): The tokens revoked before they expire.
+    """
+
+    def __init__(self, secret: bytes, ttl: int = 3600, clock: Callable[[], float] = time.time):
+        """
+        Initializes the signer.
+
+        Args:
+            secret (bytes): the HMAC key; every worker must share it.
+            ttl (int): seconds a token stays valid.
+            clock (Callable[[], float]): the time source, replaceable in tests.
+
+        Raises:
+            ValueError: if the secret is empty or the ttl is not positive.
+        """
+        if not secret:
+            raise ValueError("Invalid secret: should not be empty.")
+        if ttl <= 0:
+            raise ValueError(f"Invalid ttl: {ttl}, should be positive.")
+        self._secret = secret
+        self.ttl = ttl
+        self._clock = clock
+        self.revocations = RevocationList(clock)
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user_id: int, username: str) -> tuple[str, int]:
+        """
+        Issue a token for a user who has just authenticated.
+
+        Args:
+            user_id (int): the user's id.
+            username (str): the user's username.
+
+        Returns:
+            tuple[str, int]: the token and the unix time it expires at.
+        """
+        now = round(self._clock(), 3)
+        # A token issued right after revoke_user, e.g. on a password change, must not be covered by it
+        cutoff = self.revocations.cutoff(username)
+        if cutoff is not None and now <= cutoff:
+            now = round(cutoff + 0.001, 3)
+        claims = {'sub': username, 'uid': user_id, 'iat': now, 'exp': int(now) + self.ttl, 'jti': secrets.token_hex(8)}
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+        return f"{payload}.{self._sign(payload)}", claims['exp']
+
+    def verify(self, token: str) -> dict:
+        """
+        Verify a token and get its claims.
+
+        Args:
+            token (str): the token from the Authorization header.
+
+        Returns:
+            dict: the claims: 'sub' (username), 'uid' (user id), 'iat', 'exp' and 'jti' (token id).
+
+        Raises:
+            ValueError: if the token is malformed, its signature does not match, or it has expired
+                or been revoked.
+        """
+        payload, _, signature = token.partition('.')
+        if not payload or not signature or not hmac.compare_digest(signature, self._sign(payload)):
+            raise ValueError("Invalid token.")
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise ValueError("Invalid token.")
+        if claims['exp'] <= self._clock():
+            raise ValueError("Token has expired.")
+        if self.revocations.is_revoked(claims['jti'], claims['sub'], claims['iat']):
+            raise ValueError("Token has been revoked.")
+        return claims
+
+    def revoke(self, claims: dict) -> None:
+        """
+        Revoke one verified token, e.g. on logout.
+
+        Args:
+            claims (dict): the token's claims, as returned by verify.
+        """
+        self.revocations.revoke(claims['jti'], claims['exp'])
+
+    def revoke_user(self, username: str) -> None:
+        """
+        Revoke every token issued to a user so far, e.g. after a password change.
+
+        Args:
+            username (str): the user whose tokens are revoked.
+        """
+        self.revocations.revoke_user(username, self.ttl)
+
+
+_signer: TokenSigner | None = None
+_signer_lock = threading.Lock()
+
+
+def get_token_signer() -> TokenSigner:
+    """
+    Get the process-wide token signer, creating it on first use.
+
+    The signer is configured from SECRET_KEY and TOKEN_TTL. Without a SECRET_KEY a random key is
+    generated, so tokens are only valid on the worker that issued them until it restarts.
+
+    Returns:
+        TokenSigner: the shared signer.
+    """
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                secret = os.getenv("SECRET_KEY")
+                if not secret:
+                    logger.warning("SECRET_KEY is not set, session tokens will not survive a restart.")
+                    secret = secrets.token_hex(32)
+                _signer = TokenSigner(secret.encode(), ttl=int(os.getenv("TOKEN_TTL", "3600")))
+    return _signer
+
+
+def set_token_signer(signer: TokenSigner | None) -> None:
+    """
+    Replace the process-wide token signer, e.g. with one on a fake clock in tests.
+
+    Args:
+        signer (TokenSigner | None): the signer to use, or None to create a new one on next use.
+    """
+    global _signer
+    with _signer_lock:
+        _signer = signer
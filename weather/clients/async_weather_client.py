@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any
+import weakref
+
+from dotenv import load_dotenv
+import httpx
+
+from utils.logger import configure_logger
+from utils.circuit_breaker import CircuitBreaker
+from utils.metrics import observe_upstream
+from weather.clients.upstream_scheduler import UpstreamScheduler, get_upstream_breaker, get_upstream_scheduler
+from weather.clients.weather_client import record_outcome
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class AsyncWeatherClient:
+    """
+    An asyncio client for weatherapi.com sharing one connection pool across every in-flight call.
+
+    A call waiting on the upstream only holds a coroutine, not a thread, so a single worker can
+    have as many calls in flight as the pool allows. Connection failures are retried; unlike
+    the synchronous WeatherClient, 429/5xx responses are returned to the caller as they are.
+    With a scheduler, every call first waits for its turn under the rate limit shared with
+    the synchronous client, and with a circuit breaker calls fail at once while the upstream is down.
+
+    Attributes:
+        base_url (str): The weatherapi.com base url, without a trailing slash.
+        client (httpx.AsyncClient): The pooled client shared by every call.
+        scheduler (UpstreamScheduler | None): The rate limit calls wait for, or None to call straight away.
+        breaker (CircuitBreaker | None): The breaker calls go through, or None to always call.
+    """
+
+    def __init__(self, base_url: str, api_key: str | None, max_connections: int = 100,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0, max_retries: int = 2,
+                 transport: httpx.AsyncBaseTransport | None = None, scheduler: UpstreamScheduler | None = None,
+                 breaker: CircuitBreaker | None = None):
+        """
+        Initializes the client and its connection pool.
+
+        Args:
+            base_url (str): The weatherapi.com base url.
+            api_key (str | None): The weatherapi.com key sent with every call.
+            max_connections (int): The most connections open to the upstream at once, which also
+                bounds the number of calls in flight.
+            connect_timeout (float): Seconds to wait for a connection to be established.
+            read_timeout (float): Seconds to wait between bytes of the response.
+            max_retries (int): The number of retries after a failed connection attempt.
+            transport (httpx.AsyncBaseTransport | None): The transport to send calls through, replaceable in tests.
+            scheduler (UpstreamScheduler | None): The rate limit calls wait for, or None to call straight away.
+            breaker (CircuitBreaker | None): The breaker calls go through, or None to always call.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.scheduler = scheduler
+        self.breaker = breaker
+        self.client = httpx.AsyncClient(
+            params={'key': api_key or ''},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport or httpx.AsyncHTTPTransport(retries=max_retries),
+        )
+
+    async def get(self, endpoint: str, params: dict[str, Any] | None = None,
+                  timeout: float | None = None) -> httpx.Response:
+        """
+        Send a GET request to a weatherapi.com endpoint.
+
+        Args:
+            endpoint (str): the endpoint name, e.g. "current.json".
+            params (dict[str, Any] | None): the query parameters besides the api key.
+            timeout (float | None): overrides the default timeout.
+
+        Returns:
+            httpx.Response: the upstream response.
+
+        Raises:
+            httpx.HTTPError: if the upstream cannot be reached within the retry budget.
+            UpstreamBusyError: if the call is shed by the scheduler.
+            CircuitOpenError: if the breaker is open.
+        """
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        return await self._timed('GET', endpoint, params=params, **kwargs)
+
+    async def post(self, endpoint: str, params: dict[str, Any] | None = None, json: Any = None,
+                   timeout: float | None = None) -> httpx.Response:
+        """
+        Send a POST request to a weatherapi.com endpoint, as used by bulk queries.
+
+        Args:
+            endpoint (str): the endpoint name, e.g. "current.json".
+            params (dict[str, Any] | None): the query parameters besides the api key.
+            json (Any): the request body, sent as JSON.
+            timeout (float | None): overrides the default timeout.
+
+        Returns:
+            httpx.Response: the upstream response.
+
+        Raises:
+            httpx.HTTPError: if the upstream cannot be reached within the retry budget.
+            UpstreamBusyError: if the call is shed by the scheduler.
+            CircuitOpenError: if the breaker is open.
+        """
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        return await self._timed('POST', endpoint, params=params, json=json, **kwargs)
+
+    async def _timed(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        """
+        Send a request once the breaker and the scheduler let it through, record its latency, including
+        retries, in the upstream metrics, and record the outcome on the breaker.
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        if self.breaker is not None:
+            self.breaker.before_call()
+        if self.scheduler is not None:
+            try:
+                await self.scheduler.acquire_async()
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.release()
+                raise
+        start = time.perf_counter()
+        status: int | str = 'error'
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled by the caller, which says nothing about the upstream
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+        else:
+            status = response.status_code
+            record_outcome(self.breaker, self.scheduler, status, response.headers)
+            return response
+        finally:
+            observe_upstream(endpoint.lstrip('/'), method, status, time.perf_counter() - start)
+
+    async def aclose(self) -> None:
+        """Close every pooled connection."""
+        await self.client.aclose()
+
+
+# httpx connections belong to the event loop that opened them, so there is one client per loop
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncWeatherClient]' = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_async_weather_client() -> AsyncWeatherClient:
+    """
+    Get the weatherapi.com client for the running event loop, creating it on first use.
+
+    The client is configured from the environment: API_KEY, WEATHER_API_URL, WEATHER_ASYNC_MAX_CONNECTIONS,
+    WEATHER_CONNECT_TIMEOUT, WEATHER_READ_TIMEOUT and WEATHER_MAX_RETRIES. Calls go through the
+    shared upstream scheduler and circuit breaker.
+
+    Returns:
+        AsyncWeatherClient: the shared client for this loop.
+
+    Raises:
+        RuntimeError: if called outside a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = AsyncWeatherClient(
+                base_url=os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1"),
+                api_key=os.getenv("API_KEY"),
+                max_connections=int(os.getenv("WEATHER_ASYNC_MAX_CONNECTIONS", "100")),
+                connect_timeout=float(os.getenv("WEATHER_CONNECT_TIMEOUT", "3.05")),
+                read_timeout=float(os.getenv("WEATHER_READ_TIMEOUT", "10")),
+                max_retries=int(os.getenv("WEATHER_MAX_RETRIES", "2")),
+                scheduler=get_upstream_scheduler(),
+                breaker=get_upstream_breaker(),
+            )
+            _clients[loop] = client
+            logger.info("Created async weatherapi client for %s", client.base_url)
+    return client
+
+
+async def close_async_weather_client() -> None:
+    """Close the running loop's client so the next call to get_async_weather_client re-reads the environment."""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
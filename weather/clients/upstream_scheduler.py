@@ -0,0 +1,480 @@
+import asyncio
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterator
+
+from utils.circuit_breaker import CircuitBreaker
+from utils.logger import configure_logger
+from utils.metrics import observe_upstream_wait, upstream_queued
+from utils.token_bucket import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class Priority(IntEnum):
+    """The order upstream calls are let through in when the rate limit is reached, lowest first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    HEALTH = 2
+
+
+DEFAULT_MAX_WAIT = {Priority.INTERACTIVE: 10.0, Priority.BACKGROUND: 60.0, Priority.HEALTH: 1.0}
+
+
+class UpstreamBusyError(Exception):
+    """Raised when an upstream call is shed instead of waiting any longer for the rate limit."""
+
+
+# The priority of upstream calls made by the current request or background job
+_priority: ContextVar[Priority] = ContextVar('upstream_priority', default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def upstream_priority(priority: Priority) -> Iterator[None]:
+    """
+    Make the upstream calls inside the block at a priority.
+
+    Work submitted to a thread pool from inside the block keeps the priority only if it is
+    run in a copy of the current context.
+
+    Args:
+        priority (Priority): the priority of the calls.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    """Get the priority of upstream calls made here, INTERACTIVE unless set by upstream_priority."""
+    return _priority.get()
+
+
+def max_wait_from_env() -> dict[Priority, float]:
+    """Parse WEATHER_MAX_WAIT, e.g. "interactive=10;background=60;health=1", over DEFAULT_MAX_WAIT."""
+    max_wait = dict(DEFAULT_MAX_WAIT)
+    for entry in os.getenv("WEATHER_MAX_WAIT", "").split(';'):
+        if entry.strip():
+            name, _, seconds = entry.partition('=')
+            try:
+                max_wait[Priority[name.strip().upper()]] = float(seconds)
+            except KeyError:
+                raise ValueError(f"Invalid WEATHER_MAX_WAIT priority: {name.strip()}, should be one of "
+                                 f"{', '.join(priority.name.lower() for priority in Priority)}.")
+    return max_wait
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'enqueued', 'done', 'shed', 'wake')
+
+    def __init__(self, priority: Priority, seq: int, enqueued: float):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = enqueued
+        self.done = False
+        self.shed = False
+        # Wakes a coroutine waiting in acquire_async; threads wait on the scheduler's condition instead
+        self.wake: Callable[[], None] | None = None
+
+
+class UpstreamScheduler:
+    """
+    A rate limiter for weatherapi.com calls that lets callers through in priority order.
+
+    Calls spend tokens from a token bucket sized to the plan's quota. When the bucket is
+    empty, callers queue and are let through highest priority first, then first come first
+    served, as tokens accrue. Identical calls made while one is already queued or in flight
+    wait for its response instead of spending another token. Rather than every caller
+    timing out together past the quota, each call gives up once it has waited its priority's
+    max_wait, and a full queue sheds its lowest priority caller, so health probes and
+    background refreshes slow down first.
+
+    Attributes:
+        bucket (TokenBucket): The rate limit.
+        max_queue (int): The most callers waiting at once.
+        max_wait (dict[Priority, float]): The most seconds a caller waits at each priority.
+    """
+
+    def __init__(self, rate: float, burst: int, max_queue: int = 1000,
+                 max_wait: dict[Priority, float] | None = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the scheduler with a full bucket.
+
+        Args:
+            rate (float): the calls allowed per second, on average.
+            burst (int): the calls allowed at once after a quiet period.
+            max_queue (int): the most callers waiting at once.
+            max_wait (dict[Priority, float] | None): the most seconds a caller waits at each priority,
+                defaults to DEFAULT_MAX_WAIT.
+            clock (Callable[[], float]): the time source, replaceable in tests.
+
+        Raises:
+            ValueError: if rate is not positive, burst is less than 1 or max_queue is less than 1.
+        """
+        if max_queue < 1:
+            raise ValueError(f"Invalid max_queue: {max_queue}, should be at least 1.")
+
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.max_queue = max_queue
+        self.max_wait = {**DEFAULT_MAX_WAIT, **(max_wait or {})}
+        self._clock = clock
+        self._cond = threading.Condition()
+        # (priority, seq, waiter); an entry whose priority no longer matches its waiter's is stale
+        self._heap: list[tuple[int, int, _Waiter]] = []
+        self._waiting: set[_Waiter] = set()
+        self._seq = itertools.count()
+        # Calls queued or in flight by dedup key, with the waiter of the caller making the call
+        self._calls: dict[Hashable, tuple[Future, _Waiter | None]] = {}
+        self._granted = dict.fromkeys(Priority, 0)
+        self._shed = dict.fromkeys(Priority, 0)
+        self._wait_total = dict.fromkeys(Priority, 0.0)
+        self._wait_max = dict.fromkeys(Priority, 0.0)
+        self._deduplicated = 0
+        self._throttled = 0
+
+    def _head(self) -> _Waiter | None:
+        """Get the next waiter to let through, dropping stale entries. Must be called with the lock held."""
+        while self._heap:
+            priority, _, waiter = self._heap[0]
+            if not waiter.done and priority == waiter.priority:
+                return waiter
+            heapq.heappop(self._heap)
+        return None
+
+    def _notify(self) -> None:
+        """Wake the waiting threads, and the coroutine at the head of the queue. Must be called with the lock held."""
+        self._cond.notify_all()
+        head = self._head()
+        if head is not None and head.wake is not None:
+            head.wake()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Take a waiter out of the queue. Must be called with the lock held."""
+        waiter.done = True
+        self._waiting.discard(waiter)
+        upstream_queued.labels(waiter.priority.name.lower()).dec()
+        if waiter.wake is not None:
+            # A shed coroutine has to find out
+            waiter.wake()
+        self._notify()
+
+    def _record_shed(self, waiter: _Waiter, now: float) -> None:
+        """Count a caller that gave up. Must be called with the lock held."""
+        self._shed[waiter.priority] += 1
+        observe_upstream_wait(waiter.priority.name.lower(), 'shed', now - waiter.enqueued)
+
+    def _enqueue(self, priority: Priority) -> _Waiter:
+        """
+        Queue a caller, shedding the lowest priority one if the queue is full. Must be called with the lock held.
+
+        Raises:
+            UpstreamBusyError: if the queue is full of callers at the same or a higher priority.
+        """
+        now = self._clock()
+        if len(self._waiting) >= self.max_queue:
+            lowest = max(self._waiting, key=lambda waiter: (waiter.priority, waiter.seq))
+            if lowest.priority <= priority:
+                self._shed[priority] += 1
+                observe_upstream_wait(priority.name.lower(), 'shed', 0.0)
+                raise UpstreamBusyError(f"Upstream queue is full with {len(self._waiting)} calls waiting.")
+            lowest.shed = True
+            self._record_shed(lowest, now)
+            self._remove(lowest)
+        waiter = _Waiter(priority, next(self._seq), now)
+        heapq.heappush(self._heap, (priority, waiter.seq, waiter))
+        self._waiting.add(waiter)
+        upstream_queued.labels(priority.name.lower()).inc()
+        return waiter
+
+    def _promote(self, waiter: _Waiter, priority: Priority) -> None:
+        """Move a queued caller up to a higher priority. Must be called with the lock held."""
+        if waiter.done or priority >= waiter.priority:
+            return
+        upstream_queued.labels(waiter.priority.name.lower()).dec()
+        upstream_queued.labels(priority.name.lower()).inc()
+        waiter.priority = priority
+        heapq.heappush(self._heap, (priority, waiter.seq, waiter))
+        self._notify()
+
+    def _try_turn(self, waiter: _Waiter) -> float | None:
+        """
+        Let a queued caller through if it is at the head of the queue and a token is ready.
+        Must be called with the lock held.
+
+        Returns:
+            float | None: None once the caller is let through, otherwise the most seconds to wait
+            before trying again.
+
+        Raises:
+            UpstreamBusyError: if the caller is shed or waits longer than its priority's max_wait.
+        """
+        if waiter.shed:
+            raise UpstreamBusyError("Upstream call shed for a higher priority one.")
+        now = self._clock()
+        delay = None
+        if self._head() is waiter:
+            delay = self.bucket.try_acquire()
+            if delay == 0:
+                self._remove(waiter)
+                waited = now - waiter.enqueued
+                self._granted[waiter.priority] += 1
+                self._wait_total[waiter.priority] += waited
+                self._wait_max[waiter.priority] = max(self._wait_max[waiter.priority], waited)
+                observe_upstream_wait(waiter.priority.name.lower(), 'granted', waited)
+                return None
+        remaining = waiter.enqueued + self.max_wait[waiter.priority] - now
+        if remaining <= 0:
+            self._record_shed(waiter, now)
+            raise UpstreamBusyError(f"Upstream call waited over {self.max_wait[waiter.priority]}s "
+                                    f"for the rate limit.")
+        return remaining if delay is None else min(delay, remaining)
+
+    def _wait_turn(self, waiter: _Waiter) -> None:
+        """
+        Wait until a queued caller is let through. Must be called with the lock held.
+
+        Raises:
+            UpstreamBusyError: if the caller is shed or waits longer than its priority's max_wait.
+        """
+        try:
+            while (timeout := self._try_turn(waiter)) is not None:
+                self._cond.wait(timeout)
+        finally:
+            if not waiter.done:
+                self._remove(waiter)
+
+    def acquire(self, priority: Priority | None = None) -> None:
+        """
+        Wait for a turn to call the upstream.
+
+        Args:
+            priority (Priority | None): the priority of the call, defaults to the current priority.
+
+        Raises:
+            UpstreamBusyError: if the call is shed rather than let through.
+        """
+        with self._cond:
+            self._wait_turn(self._enqueue(current_priority() if priority is None else priority))
+
+    async def acquire_async(self, priority: Priority | None = None) -> None:
+        """
+        Wait for a turn to call the upstream without blocking the event loop.
+
+        The coroutine queues alongside threads calling acquire, in the same priority order, and
+        waits on an event its loop sets whenever the queue changes or, at the latest, when its
+        next token is due. No thread is held while it waits, and a cancelled coroutine leaves
+        the queue without spending a token.
+
+        Args:
+            priority (Priority | None): the priority of the call, defaults to the current priority.
+
+        Raises:
+            UpstreamBusyError: if the call is shed rather than let through.
+        """
+        priority = current_priority() if priority is None else priority
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        with self._cond:
+            # Nobody is queued and a token is ready
+            if self._head() is None and self.bucket.try_acquire() == 0:
+                self._granted[priority] += 1
+                observe_upstream_wait(priority.name.lower(), 'granted', 0.0)
+                return
+            waiter = self._enqueue(priority)
+            waiter.wake = lambda: loop.call_soon_threadsafe(ready.set)
+        try:
+            while True:
+                with self._cond:
+                    ready.clear()
+                    timeout = self._try_turn(waiter)
+                if timeout is None:
+                    return
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                if not waiter.done:
+                    self._remove(waiter)
+
+    def call(self, key: Hashable, func: Callable[[], Any], priority: Priority | None = None) -> Any:
+        """
+        Make an upstream call once it is let through, or share an identical call already waiting.
+
+        Args:
+            key (Hashable): identifies the call; calls with equal keys are made once.
+            func (Callable[[], Any]): makes the call.
+            priority (Priority | None): the priority of the call, defaults to the current priority.
+
+        Returns:
+            Any: the result of func, possibly from another caller's identical call.
+
+        Raises:
+            UpstreamBusyError: if the call is shed rather than let through.
+        """
+        priority = current_priority() if priority is None else priority
+        with self._cond:
+            shared = self._calls.get(key)
+            if shared is not None:
+                self._deduplicated += 1
+                future, waiter = shared
+                if waiter is not None:
+                    self._promote(waiter, priority)
+            else:
+                future = Future()
+                waiter = self._enqueue(priority)
+                self._calls[key] = (future, waiter)
+        if shared is not None:
+            return future.result()
+
+        try:
+            with self._cond:
+                try:
+                    self._wait_turn(waiter)
+                finally:
+                    self._calls[key] = (future, None)
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._cond:
+                self._calls.pop(key, None)
+
+    def throttle(self, seconds: float) -> None:
+        """
+        Stop letting calls through for a while, after the upstream reports the quota was exceeded.
+
+        Args:
+            seconds (float): how long to hold calls back for.
+        """
+        logger.warning("weatherapi throttled calls, holding calls back for %ss.", seconds)
+        with self._cond:
+            self._throttled += 1
+            self.bucket.pause(seconds)
+            self._notify()
+
+    def stats(self) -> dict:
+        """
+        Get the queue depth, wait times and counters of the scheduler.
+
+        Returns:
+            dict: the rate, burst and available tokens, and per priority the callers 'queued', 'granted'
+            and 'shed' with their mean and max wait in milliseconds, plus the 'deduplicated' calls and
+            the times the upstream 'throttled' us.
+        """
+        with self._cond:
+            queued = dict.fromkeys(Priority, 0)
+            for waiter in self._waiting:
+                queued[waiter.priority] += 1
+            return {
+                'rate': self.bucket.rate,
+                'burst': self.bucket.burst,
+                'tokens': round(self.bucket.tokens(), 2),
+                'priorities': {
+                    priority.name.lower(): {
+                        'queued': queued[priority],
+                        'granted': self._granted[priority],
+                        'shed': self._shed[priority],
+                        'mean_wait_ms': round(self._wait_total[priority] / self._granted[priority] * 1000, 3)
+                                        if self._granted[priority] else 0.0,
+                        'max_wait_ms': round(self._wait_max[priority] * 1000, 3),
+                    }
+                    for priority in Priority
+                },
+                'deduplicated': self._deduplicated,
+                'throttled': self._throttled,
+            }
+
+
+_scheduler: UpstreamScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_upstream_scheduler() -> UpstreamScheduler:
+    """
+    Get the process-wide upstream scheduler, creating it on first use.
+
+    The scheduler is configured from WEATHER_RATE_LIMIT (calls per second, set to the plan's
+    quota), WEATHER_RATE_BURST, WEATHER_QUEUE_SIZE and WEATHER_MAX_WAIT.
+
+    Returns:
+        UpstreamScheduler: the shared scheduler.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = UpstreamScheduler(
+                    rate=float(os.getenv("WEATHER_RATE_LIMIT", "10")),
+                    burst=int(os.getenv("WEATHER_RATE_BURST", "20")),
+                    max_queue=int(os.getenv("WEATHER_QUEUE_SIZE", "1000")),
+                    max_wait=max_wait_from_env(),
+                )
+    return _scheduler
+
+
+def set_upstream_scheduler(scheduler: UpstreamScheduler | None) -> None:
+    """
+    Replace the process-wide upstream scheduler, e.g. with a fresh one in tests.
+
+    Args:
+        scheduler (UpstreamScheduler | None): the scheduler to use, or None to create a new one on next use.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+_breaker: CircuitBreaker | None = None
+_breaker_lock = threading.Lock()
+
+
+def get_upstream_breaker() -> CircuitBreaker:
+    """
+    Get the process-wide circuit breaker for weatherapi.com, creating it on first use.
+
+    The breaker is configured from WEATHER_BREAKER_THRESHOLD (consecutive failures) and
+    WEATHER_BREAKER_RESET (seconds before a probe call).
+
+    Returns:
+        CircuitBreaker: the shared breaker.
+    """
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    'weatherapi.com',
+                    failure_threshold=int(os.getenv("WEATHER_BREAKER_THRESHOLD", "5")),
+                    reset_timeout=float(os.getenv("WEATHER_BREAKER_RESET", "30")),
+                )
+    return _breaker
+
+
+def set_upstream_breaker(breaker: CircuitBreaker | None) -> None:
+    """
+    Replace the process-wide circuit breaker, e.g. with a fresh one in tests.
+
+    Args:
+        breaker (CircuitBreaker | None): the breaker to use, or None to create a new one on next use.
+    """
+    global _breaker
+    with _breaker_lock:
+        _breaker = breaker
@@ -0,0 +1,276 @@
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+from dotenv import load_dotenv
+
+from utils.logger import configure_logger
+from utils.circuit_breaker import CircuitBreaker
+from utils.metrics import observe_upstream
+from weather.clients.upstream_scheduler import (UpstreamBusyError, UpstreamScheduler, get_upstream_breaker,
+                                                get_upstream_scheduler)
+
+if TYPE_CHECKING:
+    # Imported by the first client instead, so workers that never call the upstream skip it
+    import requests
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+# The longest a retry of a failed call waits, in seconds
+MAX_BACKOFF = 2.0
+
+
+class WeatherClient:
+    """
+    A connection-pooled client for weatherapi.com.
+
+    Every call reuses keep-alive connections from one requests.Session, is bounded by a
+    connect and read timeout, and retries connection errors and 429/5xx responses with
+    exponential backoff. POST is retried too, since weatherapi.com only uses it for
+    read-only bulk queries. With a scheduler, every call first waits for its turn under the
+    rate limit, and identical calls waiting at the same time share one response. With a
+    circuit breaker, calls fail at once while the upstream is down, and connection errors,
+    timeouts and 5xx responses count as failures.
+
+    Attributes:
+        base_url (str): The weatherapi.com base url, without a trailing slash.
+        timeout (tuple[float, float]): The default (connect, read) timeout in seconds.
+        session (requests.Session): The pooled session shared by every call.
+        scheduler (UpstreamScheduler | None): The rate limit calls wait for, or None to call straight away.
+        breaker (CircuitBreaker | None): The breaker calls go through, or None to always call.
+    """
+
+    def __init__(self, base_url: str, api_key: str | None, pool_size: int = 10,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 max_retries: int = 2, backoff_factor: float = 0.3,
+                 scheduler: UpstreamScheduler | None = None, breaker: CircuitBreaker | None = None):
+        """
+        Initializes the client and its connection pool.
+
+        Args:
+            base_url (str): The weatherapi.com base url.
+            api_key (str | None): The weatherapi.com key sent with every call.
+            pool_size (int): The number of keep-alive connections kept open to the upstream.
+            connect_timeout (float): Seconds to wait for a connection to be established.
+            read_timeout (float): Seconds to wait between bytes of the response.
+            max_retries (int): The number of retries after the first attempt.
+            backoff_factor (float): The base delay in seconds for exponential backoff between retries.
+            scheduler (UpstreamScheduler | None): The rate limit calls wait for, or None to call straight away.
+            breaker (CircuitBreaker | None): The breaker calls go through, or None to always call.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.scheduler = scheduler
+        self.breaker = breaker
+
+        # A 429 is left to the scheduler and breaker, which pause calls for its Retry-After, and
+        # no retry sleeps for a Retry-After the upstream sends, so a throttled upstream never
+        # holds the calling thread or spends quota on hidden retries
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_max=MAX_BACKOFF,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({'GET', 'POST'}),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.params = {'key': api_key}
+
+    def get(self, endpoint: str, params: dict[str, Any] | None = None,
+            timeout: float | tuple[float, float] | None = None) -> 'requests.Response':
+        """
+        Send a GET request to a weatherapi.com endpoint.
+
+        Args:
+            endpoint (str): the endpoint name, e.g. "current.json".
+            params (dict[str, Any] | None): the query parameters besides the api key.
+            timeout (float | tuple[float, float] | None): overrides the default (connect, read) timeout.
+
+        Returns:
+            requests.Response: the upstream response.
+
+        Raises:
+            requests.RequestException: if the upstream cannot be reached within the retry budget.
+            UpstreamBusyError: if the call is shed by the scheduler.
+            CircuitOpenError: if the breaker is open.
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        return self._scheduled(('GET', endpoint, repr(params)), self.session.get, url, params=params,
+                               timeout=timeout or self.timeout)
+
+    def post(self, endpoint: str, params: dict[str, Any] | None = None, json: Any = None,
+             timeout: float | tuple[float, float] | None = None) -> 'requests.Response':
+        """
+        Send a POST request to a weatherapi.com endpoint, as used by bulk queries.
+
+        Args:
+            endpoint (str): the endpoint name, e.g. "current.json".
+            params (dict[str, Any] | None): the query parameters besides the api key.
+            json (Any): the request body, sent as JSON.
+            timeout (float | tuple[float, float] | None): overrides the default (connect, read) timeout.
+
+        Returns:
+            requests.Response: the upstream response.
+
+        Raises:
+            requests.RequestException: if the upstream cannot be reached within the retry budget.
+            UpstreamBusyError: if the call is shed by the scheduler.
+            CircuitOpenError: if the breaker is open.
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        return self._scheduled(('POST', endpoint, repr(params), repr(json)), self.session.post, url, params=params,
+                               json=json, timeout=timeout or self.timeout)
+
+    def _scheduled(self, key: tuple, send, url: str, **kwargs) -> 'requests.Response':
+        """
+        Send a request once the breaker and the scheduler let it through, and hold calls back if we
+        are throttled. The outcome is recorded once per upstream call, by the caller that made it:
+        callers that shared another's identical call only release the breaker.
+        """
+        method, endpoint = key[:2]
+        if self.breaker is not None:
+            self.breaker.before_call()
+        made_call = False
+
+        def call() -> 'requests.Response':
+            nonlocal made_call
+            made_call = True
+            return self._recorded(method, endpoint, send, url, **kwargs)
+
+        try:
+            return call() if self.scheduler is None else self.scheduler.call(key, call)
+        finally:
+            if not made_call and self.breaker is not None:
+                self.breaker.release()
+
+    def _recorded(self, method: str, endpoint: str, send, url: str, **kwargs) -> 'requests.Response':
+        """Send a request and record its outcome on the breaker and the scheduler."""
+        try:
+            response = self._timed(method, endpoint, send, url, **kwargs)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+        record_outcome(self.breaker, self.scheduler, response.status_code, response.headers)
+        return response
+
+    def _timed(self, method: str, endpoint: str, send, url: str, **kwargs) -> 'requests.Response':
+        """Send a request and record its latency, including retries, in the upstream metrics."""
+        start = time.perf_counter()
+        status: int | str = 'error'
+        try:
+            response = send(url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_upstream(endpoint.lstrip('/'), method, status, time.perf_counter() - start)
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        self.session.close()
+
+
+def retry_after(value: str | None, default: float = 1.0) -> float:
+    """
+    Parse a Retry-After header given in seconds.
+
+    Args:
+        value (str | None): the header value.
+        default (float): the seconds to use when the header is missing or is an HTTP date.
+
+    Returns:
+        float: the seconds to wait before calling again.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def record_outcome(breaker: CircuitBreaker | None, scheduler: UpstreamScheduler | None, status: int,
+                   headers: Any) -> None:
+    """
+    Record an upstream response on the breaker and the scheduler.
+
+    5xx responses count as failures and a 429 holds calls back for its Retry-After. A 429
+    says nothing about whether the upstream is up, so it counts as neither success nor failure.
+
+    Args:
+        breaker (CircuitBreaker | None): the breaker the call went through.
+        scheduler (UpstreamScheduler | None): the scheduler the call went through.
+        status (int): the response status code.
+        headers (Any): the response headers.
+    """
+    if status == 429 and scheduler is not None:
+        scheduler.throttle(retry_after(headers.get('Retry-After')))
+    if breaker is None:
+        return
+    if status >= 500:
+        breaker.record_failure()
+    elif status == 429:
+        breaker.release()
+    else:
+        breaker.record_success()
+
+
+_client: WeatherClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_weather_client() -> WeatherClient:
+    """
+    Get the process-wide weatherapi.com client, creating it on first use.
+
+    The client is configured from the environment: API_KEY, WEATHER_API_URL, WEATHER_POOL_SIZE,
+    WEATHER_CONNECT_TIMEOUT, WEATHER_READ_TIMEOUT, WEATHER_MAX_RETRIES and WEATHER_BACKOFF_FACTOR.
+    Calls go through the shared upstream scheduler and circuit breaker.
+
+    Returns:
+        WeatherClient: the shared client.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WeatherClient(
+                    base_url=os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1"),
+                    api_key=os.getenv("API_KEY"),
+                    pool_size=int(os.getenv("WEATHER_POOL_SIZE", "10")),
+                    connect_timeout=float(os.getenv("WEATHER_CONNECT_TIMEOUT", "3.05")),
+                    read_timeout=float(os.getenv("WEATHER_READ_TIMEOUT", "10")),
+                    max_retries=int(os.getenv("WEATHER_MAX_RETRIES", "2")),
+                    backoff_factor=float(os.getenv("WEATHER_BACKOFF_FACTOR", "0.3")),
+                    scheduler=get_upstream_scheduler(),
+                    breaker=get_upstream_breaker(),
+                )
+                logger.info("Created weatherapi client for %s", _client.base_url)
+    return _client
+
+
+def reset_weather_client() -> None:
+    """Close the shared client so the next call to get_weather_client re-reads the environment."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
@@ -0,0 +1,242 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from flask import Flask
+from sqlalchemy.sql import text
+
+from db import db
+from utils import metrics
+from utils.logger import configure_logger
+from utils.redis_cache import get_cache_backend
+from weather.clients.upstream_scheduler import Priority, upstream_priority
+from weather.clients.weather_client import get_weather_client
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class HealthProber:
+    """
+    Checks the service's dependencies in the background and keeps the result for the health routes.
+
+    Each cycle checks the database with `SELECT 1`, the weather api with a request for London
+    at health priority, and the shared cache backend with a ping. The health routes only read
+    the last result, so probing them often costs neither upstream quota nor latency. Without
+    the background thread, a stale result is refreshed by the next caller, at most once per
+    interval.
+
+    The database is required: readiness fails without it. The weather api and the cache are
+    not, since cached weather can still be served while they are down, so their failures
+    only mark the service as degraded.
+
+    Attributes:
+        app (Flask): The app whose database is checked.
+        interval (float): The number of seconds between cycles.
+        timeout (float): The number of seconds the weather api check waits for a response.
+    """
+
+    def __init__(self, app: Flask, interval: float = 15.0, timeout: float = 5.0):
+        """
+        Initializes the prober with nothing checked yet.
+
+        Args:
+            app (Flask): the app whose database is checked.
+            interval (float): the number of seconds between cycles.
+            timeout (float): the number of seconds the weather api check waits for a response.
+
+        Raises:
+            ValueError: if the interval or timeout is not positive.
+        """
+        if interval <= 0:
+            raise ValueError(f"Invalid interval: {interval}, should be positive.")
+        if timeout <= 0:
+            raise ValueError(f"Invalid timeout: {timeout}, should be positive.")
+
+        self.app = app
+        self.interval = interval
+        self.timeout = timeout
+        # (name, required, check), where check raises if the dependency is unhealthy
+        self.checks: list[tuple[str, bool, Callable[[], None]]] = [
+            ('database', True, self.check_database),
+            ('weatherapi', False, self.check_weather_api),
+            ('cache', False, self.check_cache),
+        ]
+        self._results: dict[str, dict] = {}
+        self._checked_at: str | None = None
+        self._checked_mono: float | None = None
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def check_database(self) -> None:
+        """Run `SELECT 1` on the primary database."""
+        with self.app.app_context():
+            db.session.execute(text("SELECT 1"))
+
+    def check_weather_api(self) -> None:
+        """Request London's current weather from the weather api, behind interactive calls."""
+        with upstream_priority(Priority.HEALTH):
+            response = get_weather_client().get("current.json", {"q": "London"}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"weather api returned {response.status_code}")
+
+    def check_cache(self) -> None:
+        """Ping the shared cache backend."""
+        if not get_cache_backend().ping():
+            raise RuntimeError("cache backend did not answer the ping")
+
+    def check_once(self) -> dict:
+        """
+        Check every dependency and keep the result. A failing check does not stop the others.
+
+        Returns:
+            dict: the new health state, as returned by snapshot.
+        """
+        with self._check_lock:
+            return self._check()
+
+    def _check(self) -> dict:
+        """Check every dependency. Must be called with the check lock held."""
+        results = {}
+        for name, required, check in self.checks:
+            start = time.perf_counter()
+            result = {'required': required}
+            try:
+                check()
+                result['status'] = 'healthy'
+            except Exception as e:
+                logger.warning("Health check of %s failed: %s", name, str(e))
+                result['status'] = 'failed'
+                result['error'] = str(e)
+            result['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            result['checked_at'] = now_iso()
+            metrics.observe_dependency(name, result['status'] == 'healthy')
+            results[name] = result
+
+        self._results = results
+        self._checked_at = now_iso()
+        self._checked_mono = time.monotonic()
+        return self._state()
+
+    def _state(self) -> dict:
+        """Build the health state from the last results."""
+        results = self._results
+        if not results:
+            status = 'starting'
+        elif any(result['required'] and result['status'] != 'healthy' for result in results.values()):
+            status = 'failed'
+        elif any(result['status'] != 'healthy' for result in results.values()):
+            status = 'degraded'
+        else:
+            status = 'healthy'
+        return {'status': status, 'checked_at': self._checked_at, 'checks': results}
+
+    def is_running(self) -> bool:
+        """Check whether the background thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_stale(self) -> bool:
+        """Check whether the last result is missing or older than the interval."""
+        checked = self._checked_mono
+        return checked is None or time.monotonic() - checked >= self.interval
+
+    def snapshot(self) -> dict:
+        """
+        Get the last health state, checking again first if it is stale and no background thread will.
+
+        Returns:
+            dict: the overall 'status' (starting, healthy, degraded or failed), when the last cycle
+            finished as 'checked_at', and each dependency's 'status', 'required', 'latency_ms',
+            'checked_at' and any 'error' under 'checks'.
+        """
+        if self.is_stale() and not self.is_running():
+            with self._check_lock:
+                # Another caller may have checked while this one waited
+                if self.is_stale():
+                    return self._check()
+        return self._state()
+
+    def liveness(self) -> tuple[int, dict]:
+        """
+        Report whether the process is alive, whatever the state of its dependencies. Never checks
+        them itself.
+
+        Returns:
+            tuple[int, dict]: 200 with the health state and a status of 'alive', or 503 with a
+            status of 'stalled' if the background thread has not finished a cycle in three intervals.
+        """
+        state = self._state()
+        checked = self._checked_mono
+        if self.is_running() and checked is not None \
+                and time.monotonic() - checked > 3 * self.interval + self.timeout:
+            return 503, {**state, 'status': 'stalled'}
+        return 200, {**state, 'status': 'alive'}
+
+    def readiness(self) -> tuple[int, dict]:
+        """
+        Report whether the service can handle requests.
+
+        Returns:
+            tuple[int, dict]: the health state, with 200 if it is healthy or degraded, or 503 if
+            a required dependency failed or nothing has been checked yet.
+        """
+        state = self.snapshot()
+        return (200 if state['status'] in ('healthy', 'degraded') else 503), state
+
+    def run(self) -> None:
+        """Run check cycles until stop is called."""
+        logger.info("Health prober started with a %ss interval.", self.interval)
+        while not self._stop.is_set():
+            try:
+                self.check_once()
+            except Exception as e:
+                logger.error("Health check cycle failed: %s", str(e))
+            self._stop.wait(self.interval)
+        logger.info("Health prober stopped.")
+
+    def start(self) -> None:
+        """Run the prober on a daemon thread inside this process."""
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Stop the prober after the current cycle.
+
+        Args:
+            timeout (float | None): seconds to wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def now_iso() -> str:
+    """Get the current UTC time as an ISO 8601 string."""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def health_prober_from_env(app: Flask) -> HealthProber:
+    """
+    Build a health prober configured by HEALTH_PROBE_INTERVAL and HEALTH_PROBE_TIMEOUT.
+
+    Args:
+        app (Flask): the app whose database is checked.
+
+    Returns:
+        HealthProber: the configured prober.
+    """
+    return HealthProber(
+        app,
+        interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "15")),
+        timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "5")),
+    )
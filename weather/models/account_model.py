@@ -2,10 +2,13 @@ import hashlib
 import logging
 import os
 
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
-from db import db
+from db import db, is_unique_violation, read_bind
 from utils.logger import configure_logger
+from utils.redis_cache import cache_add_json, cache_get_json, register_write_through
+from weather.models.favorite_model import Favorite
 
 
 logger = logging.getLogger(__name__)
@@ -19,6 +22,43 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     salt = db.Column(db.String(32), nullable=False)  # 16-byte salt in hex
     password = db.Column(db.String(64), nullable=False)  # SHA-256 hash in hex
+    favorites = db.relationship(Favorite, backref='user', cascade='all, delete-orphan')
+
+    def to_cache(self) -> dict:
+        """
+        Get the fields needed to authenticate this user without the database.
+
+        Returns:
+            dict: the user's id, username, salt and hashed password.
+        """
+        return {'id': self.id, 'username': self.username, 'salt': self.salt, 'password': self.password}
+
+    @classmethod
+    def get_cached(cls, username: str) -> dict | None:
+        """
+        Look up a user by username, served from the cache when possible and otherwise read from
+        the read-only bind if one is configured. Only rows read from the primary are cached, and
+        only if the key is still missing: a lagging replica, or a read that raced a password
+        change, could otherwise overwrite the write-through with the old password.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            dict | None: the user's cached fields, or None if the user does not exist.
+        """
+        cache_key = f"user:{username}"
+        cached = cache_get_json(cache_key)
+        if cached is not None:
+            return cached
+        bind = read_bind()
+        user = db.session.execute(select(cls).filter_by(username=username), bind_arguments=bind).scalar()
+        if not user:
+            return None
+        cached = user.to_cache()
+        if not bind:
+            cache_add_json(cache_key, cached, user_cache_ttl())
+        return cached
 
     @classmethod
     def _generate_hashed_password(cls, password: str) -> tuple[str, str]:
@@ -46,6 +86,7 @@ class User(db.Model):
 
         Raises:
             ValueError: If a user with the username already exists.
+            IntegrityError: If the row breaks any other constraint, such as a missing username.
         """
         salt, hashed_password = cls._generate_hashed_password(password)
         new_user = cls(username=username, salt=salt, password=hashed_password)
@@ -53,8 +94,11 @@ class User(db.Model):
             db.session.add(new_user)
             db.session.commit()
             logger.info("User successfully added to the database: %s", username)
-        except IntegrityError:
+        except IntegrityError as e:
             db.session.rollback()
+            if not is_unique_violation(e):
+                logger.error("Database error: %s", str(e))
+                raise
             logger.error("Duplicate username: %s", username)
             raise ValueError(f"User with username '{username}' already exists")
         except Exception as e:
@@ -77,12 +121,12 @@ class User(db.Model):
         Raises:
             ValueError: If the user does not exist.
         """
-        user = cls.query.filter_by(username=username).first()
+        user = cls.get_cached(username)
         if not user:
             logger.info("User %s not found", username)
             raise ValueError(f"User {username} not found")
-        hashed_password = hashlib.sha256((password + user.salt).encode()).hexdigest()
-        return hashed_password == user.password
+        hashed_password = hashlib.sha256((password + user['salt']).encode()).hexdigest()
+        return hashed_password == user['password']
 
     @classmethod
     def delete_user(cls, username: str) -> None:
@@ -104,7 +148,7 @@ class User(db.Model):
         logger.info("User %s deleted successfully", username)
 
     @classmethod
-    def update_password(cls, username: str, new_password: str) -> None:
+    def update_password(cls, username: str, new_password: str) -> int:
         """
         Update the password for a user.
 
@@ -112,6 +156,9 @@ class User(db.Model):
             username (str): The username of the user.
             new_password (str): The new password to set.
 
+        Returns:
+            int: The id of the user.
+
         Raises:
             ValueError: If the user does not exist.
         """
@@ -121,7 +168,17 @@ class User(db.Model):
             raise ValueError(f"User {username} not found")
 
         salt, hashed_password = cls._generate_hashed_password(new_password)
+        user_id = user.id  # read before the commit expires the instance
         user.salt = salt
         user.password = hashed_password
         db.session.commit()
         logger.info("Password updated successfully for user: %s", username)
+        return user_id
+
+
+def user_cache_ttl() -> int:
+    """Seconds a cached user stays in the cache, read from CACHE_USER_TTL."""
+    return int(os.getenv("CACHE_USER_TTL", "3600"))
+
+
+register_write_through(User, key=lambda user: f"user:{user.username}", serialize=User.to_cache, ttl=user_cache_ttl)
@@ -0,0 +1,472 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import logging
+from typing import Any
+from dotenv import load_dotenv
+import os
+import threading
+import weakref
+
+from utils.cache import TTLCache
+from utils.logger import configure_logger
+from weather.clients.async_weather_client import get_async_weather_client
+from weather.clients.upstream_scheduler import Priority, upstream_priority
+from weather.clients.weather_client import get_weather_client
+from weather.models.geo_index import get_geo_index
+from weather.models.history_store import record_observation
+from weather.models.location_index import get_location_index, normalize_location, parse_coordinates, resolve_location
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+# Shared across every user so that users favoriting the same place share one upstream call.
+# Expired entries are kept for WEATHER_STALE_TTL more seconds, to serve while they are revalidated.
+weather_cache = TTLCache(
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("WEATHER_STALE_TTL", "3600")),
+)
+
+# Stale locations being revalidated in the background, so each is fetched once at a time
+_revalidating: set[str] = set()
+_revalidating_lock = threading.Lock()
+
+# Placeholder key prefix for bulk locations that did not resolve to a canonical location
+_UNRESOLVED = "unresolved:"
+
+# Upstream calls in flight on each event loop, so concurrent async misses share one call
+_async_in_flight: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]]' = \
+    weakref.WeakKeyDictionary()
+
+# Bounded pool used to refresh many locations at once
+_refresh_executor: ThreadPoolExecutor | None = None
+_refresh_executor_lock = threading.Lock()
+
+
+def get_refresh_executor() -> ThreadPoolExecutor:
+    """
+    Get the worker pool used for bulk refreshes, creating it on first use.
+
+    The pool size is read from WEATHER_REFRESH_WORKERS.
+
+    Returns:
+        ThreadPoolExecutor: the shared refresh pool.
+    """
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _refresh_executor_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("WEATHER_REFRESH_WORKERS", "16")),
+                    thread_name_prefix="weather-refresh",
+                )
+    return _refresh_executor
+
+
+def parse_current_weather(current: dict) -> tuple[float, float, float, int]:
+    """
+    Pull the values we save out of a weatherapi "current" object.
+
+    Args:
+        current (dict): the "current" object of a current.json response.
+
+    Returns:
+        tuple: the temperature, wind, precipitation and humidity.
+    """
+    return current['temp_f'], current['wind_mph'], current['precip_in'], current['humidity']
+
+
+def get_current_weather(location: str, refresh: bool = False) -> tuple[float, float, float, int]:
+    """
+    Get the current weather for a location.
+
+    The location is resolved to its canonical key first, so every spelling of a place
+    shares one cache entry. Results are served from the shared weather cache when fresh,
+    or while stale and being revalidated (see get_current_weather_with_age). Concurrent
+    misses for the same location wait on a single upstream call.
+
+    Args:
+        location (str): the location to retrieve the weather for.
+        refresh (bool): skip a cached entry and fetch from the api.
+
+    Returns:
+        tuple: the location's temperature, wind, precipitation and humidity.
+
+    Raises:
+        ValueError: if the location does not match any known place.
+        CircuitOpenError: if nothing is cached and the upstream is down.
+    """
+    return get_current_weather_with_age(location, refresh)[0]
+
+
+def get_current_weather_with_age(location: str, refresh: bool = False) -> tuple[tuple, float]:
+    """
+    Get the current weather for a location and how long ago it was fetched.
+
+    Fresh cache entries are served as they are. An entry past WEATHER_CACHE_TTL but within
+    WEATHER_STALE_TTL is served at once and revalidated in the background, so a slow or
+    failing upstream does not hold the caller up. Anything older is fetched, and concurrent
+    misses for the same location wait on a single upstream call. Coordinates not seen before
+    are answered from the nearest cached observation when one is close and fresh enough
+    (see get_nearby_weather).
+
+    Args:
+        location (str): the location to retrieve the weather for.
+        refresh (bool): skip a cached entry and fetch from the api.
+
+    Returns:
+        tuple: the (temperature, wind, precipitation, humidity) weather and its age in seconds.
+
+    Raises:
+        ValueError: if the location does not match any known place.
+        CircuitOpenError: if nothing is cached and the upstream is down.
+    """
+    if not refresh:
+        nearby = get_nearby_weather(location)
+        if nearby is not None:
+            return nearby
+    key = resolve_location(location).key
+    if not refresh:
+        cached = get_cached_weather_with_age(key)
+        if cached is not None:
+            return cached
+    # Not a second lookup: the entry is missing or being replaced, but concurrent loads still coalesce
+    return weather_cache.get_or_load(key, lambda: _fetch_current_weather(key), force=True), 0.0
+
+
+def get_cached_weather_with_age(key: str) -> tuple[tuple, float] | None:
+    """
+    Get a location's cached weather and its age without calling the upstream, revalidating it
+    in the background if it is stale.
+
+    Args:
+        key (str): the canonical key of the location.
+
+    Returns:
+        tuple[tuple, float] | None: the weather and its age in seconds, or None if nothing usable is cached.
+    """
+    cached = weather_cache.get_with_age(key)
+    if cached is not None and cached[1] >= weather_cache.ttl:
+        revalidate(key)
+    return cached
+
+
+def get_nearby_weather(location: str) -> tuple[tuple, float] | None:
+    """
+    Answer a coordinate query from the nearest cached observation, without calling the upstream.
+
+    Only coordinates the location index cannot already resolve are looked up, among observations
+    within GEO_RADIUS_KM and no older than GEO_MAX_AGE. Candidates are peeked at, so the search
+    does not count as weather cache hits. On a hit the coordinates resolve to the nearby location
+    for GEO_MAX_AGE, so saving them as a favorite does not search for them either, while they
+    are not pinned to that station once its observation would no longer be used.
+
+    Args:
+        location (str): the location query.
+
+    Returns:
+        tuple[tuple, float] | None: the nearby location's weather and its age in seconds, or None
+        if the query is not coordinates, is already known, or has no usable observation nearby.
+    """
+    coordinates = parse_coordinates(location)
+    if coordinates is None:
+        return None
+    index = get_location_index()
+    if index.lookup(location) is not None:
+        return None
+
+    geo_index = get_geo_index()
+
+    def fresh(key: str) -> tuple[tuple, float] | None:
+        cached = weather_cache.peek_with_age(key)
+        return cached if cached is not None and cached[1] <= geo_index.max_age else None
+
+    found = geo_index.nearest(*coordinates, fresh)
+    if found is None:
+        return None
+    key, weather, distance = found
+    logger.info("Answering %s from the weather at %s, %.2f km away.", location, key, distance)
+    index.add_nearby(location, index.resolve(key))
+    return weather
+
+
+def index_observation(key: str, station: dict | None) -> None:
+    """
+    Add a location with a newly cached observation to the geo index.
+
+    Args:
+        key (str): the canonical key of the location.
+        station (dict | None): the weatherapi location object, holding the station's 'lat' and 'lon'.
+    """
+    if station and station.get('lat') is not None and station.get('lon') is not None:
+        get_geo_index().add(key, float(station['lat']), float(station['lon']))
+
+
+def revalidate(key: str) -> None:
+    """
+    Fetch a stale location again on the refresh pool, behind interactive upstream calls.
+
+    Does nothing if the location is already being revalidated.
+
+    Args:
+        key (str): the canonical key of the location.
+    """
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+    try:
+        get_refresh_executor().submit(_revalidate, key)
+    except BaseException:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+        raise
+
+
+def _revalidate(key: str) -> None:
+    """Fetch and cache a location's weather at background priority, logging failures."""
+    try:
+        with upstream_priority(Priority.BACKGROUND):
+            weather_cache.get_or_load(key, lambda: _fetch_current_weather(key), force=True)
+    except Exception as e:
+        logger.warning("Failed to revalidate weather for %s: %s", key, str(e))
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
+
+def _fetch_current_weather(location: str) -> tuple[float, float, float, int]:
+    """
+    Call the current weather api for a location, bypassing the cache.
+
+    Args:
+        location (str): the canonical key of the location to retrieve the weather for.
+
+    Returns:
+        tuple: the location's temperature, wind, precipitation and humidity.
+    """
+    # call the current weather api
+    logger.info("Fetching current weather for %s from weatherapi.", location)
+    response = get_weather_client().get("current.json", {"q": location})
+    response.raise_for_status()
+
+    # parse through the response to get the values we will save.
+    payload = response.json()
+    current = payload['current']
+    weather = parse_current_weather(current)
+    record_observation(location, weather, current.get('last_updated_epoch'))
+    index_observation(location, payload.get('location'))
+    return weather
+
+
+async def get_current_weather_async(location: str, refresh: bool = False) -> tuple[float, float, float, int]:
+    """
+    Get the current weather for a location without blocking the event loop on the upstream.
+
+    Shares the weather cache with get_current_weather. Concurrent misses for the same location
+    on one event loop wait on a single upstream call. Locations missing from the location index
+    are resolved on a worker thread.
+
+    Args:
+        location (str): the location to retrieve the weather for.
+        refresh (bool): skip a cached entry and fetch from the api.
+
+    Returns:
+        tuple: the location's temperature, wind, precipitation and humidity.
+
+    Raises:
+        ValueError: if the location does not match any known place.
+        CircuitOpenError: if nothing is cached and the upstream is down.
+    """
+    return (await get_current_weather_with_age_async(location, refresh))[0]
+
+
+async def get_current_weather_with_age_async(location: str, refresh: bool = False) -> tuple[tuple, float]:
+    """
+    Get the current weather for a location and its age without blocking the event loop on the upstream.
+
+    Stale entries are served and revalidated, and coordinates answered from nearby observations,
+    as by get_current_weather_with_age.
+
+    Args:
+        location (str): the location to retrieve the weather for.
+        refresh (bool): skip a cached entry and fetch from the api.
+
+    Returns:
+        tuple: the (temperature, wind, precipitation, humidity) weather and its age in seconds.
+
+    Raises:
+        ValueError: if the location does not match any known place.
+        CircuitOpenError: if nothing is cached and the upstream is down.
+    """
+    if not refresh:
+        nearby = get_nearby_weather(location)
+        if nearby is not None:
+            return nearby
+    canonical = get_location_index().lookup(location)
+    if canonical is None:
+        canonical = await asyncio.to_thread(resolve_location, location)
+    key = canonical.key
+
+    if not refresh:
+        cached = get_cached_weather_with_age(key)
+        if cached is not None:
+            return cached
+
+    in_flight = _async_in_flight.setdefault(asyncio.get_running_loop(), {})
+    task = in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_current_weather_async(key))
+        in_flight[key] = task
+        task.add_done_callback(lambda _: in_flight.pop(key, None))
+    # A cancelled caller must not cancel the call other callers are waiting on
+    return await asyncio.shield(task), 0.0
+
+
+async def _fetch_current_weather_async(location: str) -> tuple[float, float, float, int]:
+    """
+    Call the current weather api for a location through the async client and cache the result.
+
+    Args:
+        location (str): the canonical key of the location to retrieve the weather for.
+
+    Returns:
+        tuple: the location's temperature, wind, precipitation and humidity.
+    """
+    logger.info("Fetching current weather for %s from weatherapi.", location)
+    response = await get_async_weather_client().get("current.json", {"q": location})
+    response.raise_for_status()
+
+    payload = response.json()
+    current = payload['current']
+    weather = parse_current_weather(current)
+    weather_cache.set(location, weather)
+    # The history store writes to SQLite, which would block the event loop
+    await asyncio.to_thread(record_observation, location, weather, current.get('last_updated_epoch'))
+    index_observation(location, payload.get('location'))
+    return weather
+
+
+def get_current_weather_bulk(locations: list[str], refresh: bool = False) -> dict[str, Any]:
+    """
+    Get the current weather for many locations with as few api calls as possible.
+
+    Locations are first resolved to their canonical keys, concurrently on the refresh pool.
+    Fresh locations are served from the weather cache unless refresh is set. The rest are
+    sent to the bulk current weather api in batches of WEATHER_BULK_SIZE, and each result is
+    cached. If a bulk call is rejected (bulk queries need a paid plan), that batch falls
+    back to one call per location.
+
+    Args:
+        locations (list[str]): the locations to retrieve the weather for.
+        refresh (bool): skip fresh cache entries and fetch every location from the api.
+
+    Returns:
+        dict[str, Any]: each requested location mapped to its (temp, wind, precipitation, humidity)
+        tuple, or to an Exception if it could not be resolved or retrieved.
+    """
+    keys, weather = _resolve_keys(locations)
+    if not refresh:
+        for key in set(keys.values()):
+            cached = weather_cache.get(key)
+            if cached is not None:
+                weather[key] = cached
+
+    missing = sorted(set(keys.values()) - set(weather))
+    missing = [key for key in missing if not key.startswith(_UNRESOLVED)]
+    batch_size = int(os.getenv("WEATHER_BULK_SIZE", "50"))
+    for start in range(0, len(missing), batch_size):
+        weather.update(_fetch_current_weather_bulk(missing[start:start + batch_size], refresh))
+
+    return {location: weather[key] for location, key in keys.items()}
+
+
+def _resolve_keys(locations: list[str]) -> tuple[dict[str, str], dict[str, Any]]:
+    """
+    Resolve locations to canonical keys on the refresh pool.
+
+    Args:
+        locations (list[str]): the locations as requested.
+
+    Returns:
+        tuple: each location mapped to its key, and the errors for locations that did not
+        resolve, keyed by a placeholder key.
+    """
+    executor = get_refresh_executor()
+    # Each task runs in a copy of the caller's context, so its upstream calls keep the caller's priority
+    futures = {location: executor.submit(contextvars.copy_context().run, resolve_location, location)
+               for location in dict.fromkeys(locations)}
+    keys: dict[str, str] = {}
+    errors: dict[str, Any] = {}
+    for location, future in futures.items():
+        try:
+            keys[location] = future.result().key
+        except Exception as e:
+            keys[location] = _UNRESOLVED + location
+            errors[keys[location]] = e
+    return keys, errors
+
+
+def _fetch_current_weather_bulk(keys: list[str], refresh: bool = False) -> dict[str, Any]:
+    """
+    Call the bulk current weather api for one batch of canonical locations.
+
+    Args:
+        keys (list[str]): the canonical keys in this batch.
+        refresh (bool): passed on to the per-location fallback.
+
+    Returns:
+        dict[str, Any]: each location mapped to its weather tuple or to an Exception.
+    """
+    logger.info("Fetching current weather for %d locations from weatherapi in bulk.", len(keys))
+    body = {'locations': [{'q': key, 'custom_id': str(index)} for index, key in enumerate(keys)]}
+    try:
+        response = get_weather_client().post("current.json", {"q": "bulk"}, json=body)
+        response.raise_for_status()
+        results = response.json()['bulk']
+    except Exception as e:
+        logger.warning("Bulk weather call failed (%s), fetching %d locations one by one.", str(e), len(keys))
+        return _fetch_current_weather_each(keys, refresh)
+
+    weather: dict[str, Any] = {}
+    for result in results:
+        query = result['query']
+        key = keys[int(query['custom_id'])]
+        if 'current' in query:
+            weather[key] = parse_current_weather(query['current'])
+            weather_cache.set(key, weather[key])
+            record_observation(key, weather[key], query['current'].get('last_updated_epoch'))
+            index_observation(key, query.get('location'))
+        else:
+            message = query.get('error', {}).get('message', 'No weather returned')
+            weather[key] = ValueError(f"{key}: {message}")
+
+    for key in keys:
+        weather.setdefault(key, ValueError(f"{key}: No weather returned"))
+    return weather
+
+
+def _fetch_current_weather_each(keys: list[str], refresh: bool = False) -> dict[str, Any]:
+    """
+    Fetch one batch of locations through get_current_weather on the refresh pool.
+
+    Args:
+        keys (list[str]): the canonical keys in this batch.
+        refresh (bool): skip fresh cache entries.
+
+    Returns:
+        dict[str, Any]: each location mapped to its weather tuple or to an Exception.
+    """
+    executor = get_refresh_executor()
+    futures = {key: executor.submit(contextvars.copy_context().run, get_current_weather, key, refresh) for key in keys}
+    weather: dict[str, Any] = {}
+    for key, future in futures.items():
+        try:
+            weather[key] = future.result()
+        except Exception as e:
+            weather[key] = e
+    return weather
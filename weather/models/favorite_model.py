@@ -0,0 +1,232 @@
+from array import array
+from datetime import datetime, timezone
+import sys
+from typing import Any, Iterable
+
+from db import db
+from utils.redis_cache import register_write_through
+from weather.models.location_model import Location
+
+
+class Favorite(db.Model):
+    __tablename__ = 'favorites'
+    __table_args__ = (
+        # Every read is scoped to one user, and most to one of their locations
+        db.Index('ix_favorites_user_id_location_id', 'user_id', 'location_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)  # canonical weatherapi.com id
+    temp = db.Column(db.Float, nullable=False)  # Farenheit
+    wind = db.Column(db.Float, nullable=False)  # mph
+    precipitation = db.Column(db.Float, nullable=False)  # inches
+    humidity = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+    location = db.relationship(Location, lazy='joined')
+
+    def updated_epoch(self) -> float:
+        """
+        Get when the weather was last saved.
+
+        Returns:
+            float: the unix time of the last update.
+        """
+        updated_at = self.updated_at
+        if updated_at.tzinfo is None:
+            # SQLite hands back naive datetimes, stored in UTC
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return updated_at.timestamp()
+
+    def to_dict(self) -> dict:
+        """
+        Get the saved weather for this favorite.
+
+        Returns:
+            dict: the temp, wind, precipitation and humidity for the location.
+        """
+        return {'temp': self.temp, 'wind': self.wind, 'precipitation': self.precipitation, 'humidity': self.humidity}
+
+
+def favorites_cache_key(user_id: int) -> str:
+    """
+    Get the cache key holding one user's favorites.
+
+    Args:
+        user_id (int): the id of the user.
+
+    Returns:
+        str: the cache key.
+    """
+    # v3 holds FavoriteRecords columns with update times; older layouts are never read back
+    return f"favorites:v3:{user_id}"
+
+
+WEATHER_FIELDS = ('temp', 'wind', 'precipitation', 'humidity')
+
+
+class FavoriteRecords:
+    """
+    One user's favorites in columnar form, as cached and served.
+
+    Each weather field is a typed array with one slot per favorite, in the order the favorites
+    were added, instead of a dict per favorite. Location keys and labels are interned, since
+    the same places are favorited by many users. Dicts are only built for responses.
+
+    Attributes:
+        keys (list[str]): The canonical location key of each favorite.
+        labels (list[str]): The label of each favorite.
+        temp (array): The temperature of each favorite in Farenheit.
+        wind (array): The wind speed of each favorite in mph.
+        precipitation (array): The precipitation of each favorite in inches.
+        humidity (array): The humidity of each favorite.
+        updated (array): The unix time each favorite's weather was saved.
+    """
+
+    __slots__ = ('keys', 'labels', 'temp', 'wind', 'precipitation', 'humidity', 'updated')
+
+    def __init__(self, keys: Iterable[str] = (), labels: Iterable[str] = (), temp: Iterable[float] = (),
+                 wind: Iterable[float] = (), precipitation: Iterable[float] = (), humidity: Iterable[int] = (),
+                 updated: Iterable[float] = ()):
+        """
+        Initializes the records from one column per field.
+
+        Args:
+            keys (Iterable[str]): the canonical location key of each favorite.
+            labels (Iterable[str]): the label of each favorite.
+            temp (Iterable[float]): the temperature of each favorite.
+            wind (Iterable[float]): the wind speed of each favorite.
+            precipitation (Iterable[float]): the precipitation of each favorite.
+            humidity (Iterable[int]): the humidity of each favorite, between 0 and 100.
+            updated (Iterable[float]): the unix time each favorite's weather was saved.
+        """
+        self.keys = [sys.intern(key) for key in keys]
+        self.labels = [sys.intern(label) for label in labels]
+        self.temp = array('d', temp)
+        self.wind = array('d', wind)
+        self.precipitation = array('d', precipitation)
+        self.humidity = array('B', humidity)
+        self.updated = array('d', updated)
+
+    @classmethod
+    def from_favorites(cls, favorites: Iterable[Favorite]) -> 'FavoriteRecords':
+        """
+        Build the records from favorites rows.
+
+        Args:
+            favorites (Iterable[Favorite]): the user's favorites, in the order to serve them.
+
+        Returns:
+            FavoriteRecords: the records.
+        """
+        records = cls()
+        for favorite in favorites:
+            records.append(favorite.location.to_canonical().key, favorite.location.label, favorite.temp,
+                           favorite.wind, favorite.precipitation, favorite.humidity, favorite.updated_epoch())
+        return records
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list]) -> 'FavoriteRecords':
+        """
+        Build the records from their cached form.
+
+        Args:
+            columns (dict[str, list]): the output of to_columns.
+
+        Returns:
+            FavoriteRecords: the records.
+        """
+        return cls(columns['keys'], columns['labels'], *(columns[field] for field in WEATHER_FIELDS),
+                   columns['updated'])
+
+    def to_columns(self) -> dict[str, list]:
+        """
+        Get the records in a JSON serializable form, one list per field.
+
+        Returns:
+            dict[str, list]: the keys, labels, each weather field and the update times.
+        """
+        return {'keys': self.keys, 'labels': self.labels,
+                **{field: getattr(self, field).tolist() for field in WEATHER_FIELDS}, 'updated': self.updated.tolist()}
+
+    def append(self, key: str, label: str, temp: float, wind: float, precipitation: float, humidity: int,
+               updated: float = 0.0) -> None:
+        """Add one favorite at the end."""
+        self.keys.append(sys.intern(key))
+        self.labels.append(sys.intern(label))
+        self.temp.append(temp)
+        self.wind.append(wind)
+        self.precipitation.append(precipitation)
+        self.humidity.append(humidity)
+        self.updated.append(updated)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def position(self, key: str) -> int | None:
+        """Get the position of the favorite with a canonical location key, or None if there is none."""
+        return self.keys.index(key) if key in self.keys else None
+
+    def position_of_label(self, label: str) -> int | None:
+        """Get the position of the favorite with a label, or None if there is none."""
+        return self.labels.index(label) if label in self.labels else None
+
+    def weather(self, position: int) -> dict[str, Any]:
+        """
+        Materialize the weather of one favorite for a response.
+
+        Args:
+            position (int): the position of the favorite.
+
+        Returns:
+            dict[str, Any]: the temp, wind, precipitation and humidity for the location.
+        """
+        return {field: getattr(self, field)[position] for field in WEATHER_FIELDS}
+
+    def age(self, position: int, now: float) -> float:
+        """
+        Get how long ago one favorite's weather was saved.
+
+        Args:
+            position (int): the position of the favorite.
+            now (float): the current unix time.
+
+        Returns:
+            float: the age in seconds.
+        """
+        return max(0.0, now - self.updated[position])
+
+    def to_dict(self) -> dict[str, dict]:
+        """
+        Materialize every favorite for a response.
+
+        Returns:
+            dict[str, dict]: each favorite's label mapped to its weather.
+        """
+        return {label: {'temp': temp, 'wind': wind, 'precipitation': precipitation, 'humidity': humidity}
+                for label, temp, wind, precipitation, humidity
+                in zip(self.labels, self.temp, self.wind, self.precipitation, self.humidity)}
+
+    def temps(self) -> dict[str, float]:
+        """
+        Get the temperature of every favorite.
+
+        Returns:
+            dict[str, float]: each favorite's label mapped to its temperature.
+        """
+        return dict(zip(self.labels, self.temp))
+
+    def nbytes(self) -> int:
+        """
+        Get the memory held by these records, not counting the interned strings shared with other users.
+
+        Returns:
+            int: the size in bytes of the object, its lists and its arrays.
+        """
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, field)) for field in self.__slots__)
+
+
+# A user's cached favorites are dropped whenever any of their favorites changes
+register_write_through(Favorite, key=lambda favorite: favorites_cache_key(favorite.user_id))
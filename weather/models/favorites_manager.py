@@ -1,38 +1,189 @@
-from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import contextvars
 import logging
-import sqlite3
-from typing import Any
-import requests
+from typing import Any, Iterator
+from dotenv import load_dotenv
 import os
+import time
 
+from sqlalchemy import select
+
+from db import db, read_bind
 from utils.logger import configure_logger
+from utils.redis_cache import cache_add_json, cache_get_json, invalidate_on_commit
+from weather.models.current_weather import (get_cached_weather_with_age, get_current_weather, get_current_weather_bulk,
+                                            get_current_weather_with_age, get_refresh_executor, weather_cache)
+from weather.models.favorite_model import Favorite, FavoriteRecords, favorites_cache_key
+from weather.models.forecast_store import forecast_store
+from weather.models.history_store import get_history_store
+from weather.models.location_index import resolve_location
+from weather.models.location_model import Location
 
 # Load environment variables from .env file
 load_dotenv()
-api_key = os.getenv("API_KEY")
-weather_api = "http://api.weatherapi.com/v1"
 
 logger = logging.getLogger(__name__)
 configure_logger(logger)
 
+
+def get_favorited_locations() -> list[str]:
+    """
+    Get every location favorited by at least one user.
+
+    Returns:
+        list[str]: the canonical keys of the distinct favorite locations across all users.
+    """
+    location_ids = db.session.query(Favorite.location_id).distinct().order_by(Favorite.location_id)
+    return [f"id:{location_id}" for (location_id,) in location_ids]
+
+
+def save_location_weather(weather: dict[str, Any]) -> int:
+    """
+    Save freshly fetched weather on every user's favorite for each location.
+
+    Updates are issued per location rather than per favorite, and the cached favorites of
+    every affected user are dropped on commit.
+
+    Args:
+        weather (dict[str, Any]): each canonical location key mapped to its (temp, wind, precipitation,
+            humidity) tuple. Locations mapped to an Exception are skipped.
+
+    Returns:
+        int: the number of favorites updated.
+    """
+    updated = 0
+    for location, values in weather.items():
+        if isinstance(values, Exception):
+            continue
+        temp, wind, precipitation, humidity = values
+        favorites = Favorite.query.filter_by(location_id=resolve_location(location).id)
+        user_ids = [user_id for (user_id,) in favorites.with_entities(Favorite.user_id)]
+        updated += favorites.update(
+            {'temp': temp, 'wind': wind, 'precipitation': precipitation, 'humidity': humidity},
+            synchronize_session=False,
+        )
+        invalidate_on_commit(db.session, *(favorites_cache_key(user_id) for user_id in user_ids))
+    db.session.commit()
+    return updated
+
+
+def weather_line(label: str, weather: tuple, age: float) -> dict:
+    """
+    Build one location's entry for a weather stream.
+
+    Args:
+        label (str): the location's label.
+        weather (tuple): the (temp, wind, precipitation, humidity) weather.
+        age (float): the weather's age in seconds.
+
+    Returns:
+        dict: the 'location', its 'weather', 'age' and whether it is 'stale'.
+    """
+    temp, wind, precipitation, humidity = weather
+    return {'location': label,
+            'weather': {'temp': temp, 'wind': wind, 'precipitation': precipitation, 'humidity': humidity},
+            'age': round(age, 1), 'stale': age >= weather_cache.ttl}
+
+
 class FavoritesModel:
     """
-    A class to manage the user's favorites.
+    A class to manage one user's favorites, stored in the favorites table.
 
     Attributes:
-        favorites (dict[str, Any]): The dictionary containing the weather for each of the user's favorite locations.
+        user_id (int): The id of the user whose favorites are managed.
     """
 
-    def __init__(self):
-        """Initializes the FavoritesModel with an empty list of favorites."""
-        self.favorites: dict[str, Any] = {}  # dictionary of favorite locations
+    def __init__(self, user_id: int):
+        """
+        Initializes the FavoritesModel for a user.
+
+        Args:
+            user_id (int): the id of the user whose favorites are managed.
+        """
+        self.user_id = user_id
+
+    def _query(self):
+        """Get a query over this user's favorites."""
+        return Favorite.query.filter_by(user_id=self.user_id)
+
+    def _records(self) -> FavoriteRecords:
+        """
+        Get the user's favorites in columnar form.
+
+        Served from the cache when possible, otherwise loaded in a single query, from the
+        read-only bind if one is configured. Favorites read from the primary are cached until one
+        of the user's favorites changes; those read from a possibly lagging replica are not, so
+        they cannot overwrite a change the write-through just invalidated.
+
+        Returns:
+            FavoriteRecords: the user's favorites in the order they were added.
+        """
+        cache_key = favorites_cache_key(self.user_id)
+        columns = cache_get_json(cache_key)
+        if columns is not None:
+            return FavoriteRecords.from_columns(columns)
+        bind = read_bind()
+        records = FavoriteRecords.from_favorites(db.session.scalars(
+            select(Favorite).filter_by(user_id=self.user_id).order_by(Favorite.id), bind_arguments=bind))
+        if not bind:
+            cache_add_json(cache_key, records.to_columns(), int(os.getenv("CACHE_FAVORITES_TTL", "300")))
+        return records
+
+    @property
+    def favorites(self) -> dict[str, Any]:
+        """
+        Get the weather for each of the user's favorite locations.
+
+        Returns:
+            dict[str, Any]: each favorite location's label mapped to its saved weather.
+        """
+        return self._records().to_dict()
 
-    def get_weather_api(self, location):
+    def _find(self, location: str) -> tuple[FavoriteRecords, int] | None:
+        """
+        Find one of the user's favorites by any spelling of its location.
+
+        Labels of saved favorites match without a lookup; anything else is resolved to its
+        canonical location first.
+
+        Args:
+            location (str): the location as entered by the user.
+
+        Returns:
+            tuple[FavoriteRecords, int] | None: the user's favorites and the position of the one found,
+            or None if it is not a favorite.
+        """
+        records = self._records()
+        position = records.position_of_label(location)
+        if position is None:
+            try:
+                position = records.position(resolve_location(location).key)
+            except ValueError:
+                return None
+        return None if position is None else (records, position)
+
+    def is_favorite(self, location: str) -> bool:
+        """
+        Check whether a location is one of the user's favorites.
+
+        Args:
+            location (str): the location as entered by the user.
+
+        Returns:
+            bool: True if the location resolves to one of the user's favorites.
+        """
+        return self._find(location) is not None
+
+    def get_weather_api(self, location, refresh: bool = False):
         """
         Get the current weather for a location.
 
+        Results are served from the shared weather cache when fresh. Concurrent misses for
+        the same location wait on a single upstream call.
+
         Args:
             location (str): the location to retrieve the weather for.
+            refresh (bool): skip a fresh cache entry and fetch from the api.
         
         Return:
             temp (float): the location's temperature in Farenheit.
@@ -40,22 +191,44 @@ class FavoritesModel:
             precipitation (float): the location's preciptation in inches.
             humidity (int): the location's humidity.
         """
-        # call the current weather api
-        url = f'{weather_api}/current.json?key={api_key}&q={location}'
-        response = requests.get(url)
+        return get_current_weather(location, refresh)
+
+    def get_weather_api_with_age(self, location: str) -> tuple[tuple, float]:
+        """
+        Get the current weather for a location and how long ago it was fetched.
+
+        Weather past the cache ttl but within WEATHER_STALE_TTL is returned at once and
+        refreshed in the background.
+
+        Args:
+            location (str): the location to retrieve the weather for.
+
+        Returns:
+            tuple: the (temp, wind, precipitation, humidity) weather and its age in seconds.
+        """
+        return get_current_weather_with_age(location)
 
-        # parse through the response to get the values we will save.
-        weather = response.json()['current']
-        temp = weather['temp_f']
-        wind = weather['wind_mph']
-        precipitation = weather['precip_in']
-        humidity = weather['humidity']
-        return temp, wind, precipitation, humidity
+    def get_weather_bulk(self, locations: list[str], refresh: bool = False) -> dict[str, Any]:
+        """
+        Get the current weather for many locations with as few api calls as possible.
+
+        Args:
+            locations (list[str]): the locations to retrieve the weather for.
+            refresh (bool): skip fresh cache entries and fetch every location from the api.
+
+        Returns:
+            dict[str, Any]: each requested location mapped to its (temp, wind, precipitation, humidity)
+            tuple, or to an Exception if it could not be retrieved.
+        """
+        return get_current_weather_bulk(locations, refresh)
 
     def add_favorite(self, location: str, temp: float, wind: float, precipitation: float, humidity: int) -> None:
         """
         Add a new favorite by the location to the user's favorites.
 
+        The location is resolved to its canonical location, so adding another spelling of a
+        saved favorite updates it instead of adding a duplicate.
+
         Args:
             location (str): the location to be added to the favorites.
             temp (float): the location's temperature in Farenheit.
@@ -64,7 +237,8 @@ class FavoritesModel:
             humidity (int): the location's humidity.
 
         Raises:
-            ValueError: if the temp, wind, or precipitation are not floats.
+            ValueError: if the temp, wind, or precipitation are not floats, or the location does not
+                match any known place.
         """
         
         
@@ -76,16 +250,32 @@ class FavoritesModel:
         if not isinstance(precipitation, float):
             raise ValueError(f"Invalid precipitation: {precipitation}, should be a float.")
         
-        logger.info("Adding weather for %s to favorites.", location)
-        self.favorites[location] = {'temp': temp, 'wind': wind, 'precipitation': precipitation, 'humidity': humidity}
+        canonical = resolve_location(location)
+        logger.info("Adding weather for %s to favorites.", canonical.label)
+        Location.save_canonical(canonical)
+        self._save_weather(canonical.id, temp, wind, precipitation, humidity)
+        db.session.commit()
         return
 
+    def _save_weather(self, location_id: int, temp: float, wind: float, precipitation: float, humidity: int) -> None:
+        """Insert or update the weather for one favorite without committing."""
+        favorite = self._query().filter_by(location_id=location_id).first()
+        if favorite is None:
+            favorite = Favorite(user_id=self.user_id, location_id=location_id)
+            db.session.add(favorite)
+        favorite.temp = temp
+        favorite.wind = wind
+        favorite.precipitation = precipitation
+        favorite.humidity = humidity
+
     def clear_favorites(self) -> None:
         """
         Clear the dictionary of the user's favorited weather locations.
         """
         logger.info("Clearing the favorites dictionary.")
-        self.favorites.clear()
+        self._query().delete()
+        invalidate_on_commit(db.session, favorites_cache_key(self.user_id))
+        db.session.commit()
 
 
     def get_favorite_weather(self, favorite_loc: str) -> dict:
@@ -102,10 +292,27 @@ class FavoritesModel:
             ValueError: if the location has not been saved in the Favorites dictionary.
         """
         
+        return self.get_favorite_weather_with_age(favorite_loc)[0]
+
+    def get_favorite_weather_with_age(self, favorite_loc: str) -> tuple[dict, float]:
+        """
+        Get the saved weather for a favorite location and how long ago it was saved.
+
+        Args:
+            favorite_loc (str): the location of the weather to be retrieved.
+
+        Returns:
+            tuple[dict, float]: the weather for the favorite location and its age in seconds.
+
+        Raises:
+            ValueError: if the location has not been saved in the Favorites dictionary.
+        """
         logger.info("retrieving weather from %s.", favorite_loc)
 
-        if favorite_loc in self.favorites:
-            return self.favorites[favorite_loc]
+        found = self._find(favorite_loc)
+        if found is not None:
+            records, position = found
+            return records.weather(position), records.age(position, time.time())
         else:
             raise ValueError(f"{favorite_loc} not found in Favorites.")
 
@@ -119,14 +326,125 @@ class FavoritesModel:
         Raises:
             ValueError: If the favorites dictionary is empty.
         """
-        if len(self.favorites) == 0:
+        records = self._records()
+        if len(records) == 0:
             raise ValueError("No locations saved in favorites.")
-        
-        temps = {}
-        for location in self.favorites:
-            temps[location] = self.favorites[location]["temp"]
-        
-        return temps
+
+        return records.temps()
+
+    def iter_all_favorites_current_weather(self, window: int | None = None) -> Iterator[dict]:
+        """
+        Get the current weather for every favorite location, each as soon as it is available.
+
+        Cached locations come first, then the rest in the order their upstream calls finish, so
+        the first result never waits on the slowest location. At most window locations are
+        fetched at once on the shared refresh pool, and nothing is kept once yielded, so memory
+        stays flat however many favorites there are. Nothing is saved to the favorites.
+
+        Args:
+            window (int | None): the most locations fetched at once, defaults to WEATHER_STREAM_WINDOW.
+
+        Returns:
+            Iterator[dict]: one dict per location with its 'location' label and either its 'weather',
+            'age' in seconds and whether it is 'stale', or the 'error' that stopped it being fetched.
+
+        Raises:
+            ValueError: If the favorites dictionary is empty, or the window is not positive.
+        """
+        records = self._records()
+        if len(records) == 0:
+            raise ValueError("No locations saved in favorites.")
+        if window is None:
+            window = int(os.getenv("WEATHER_STREAM_WINDOW", "16"))
+        if window <= 0:
+            raise ValueError(f"Invalid window: {window}, should be positive.")
+        return self._iter_weather(records, window)
+
+    def _iter_weather(self, records: FavoriteRecords, window: int) -> Iterator[dict]:
+        """Yield the weather of each location in records, cached ones first, with at most window fetches at once."""
+        pending = []
+        for position, key in enumerate(records.keys):
+            cached = get_cached_weather_with_age(key)
+            if cached is None:
+                pending.append(position)
+            else:
+                yield weather_line(records.labels[position], *cached)
+
+        executor = get_refresh_executor()
+        in_flight: dict[Future, int] = {}
+        pending.reverse()
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < window:
+                    position = pending.pop()
+                    # Each fetch runs in a copy of the caller's context, so it keeps the caller's priority
+                    future = executor.submit(contextvars.copy_context().run, get_current_weather_with_age,
+                                             records.keys[position])
+                    in_flight[future] = position
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    label = records.labels[in_flight.pop(future)]
+                    try:
+                        yield weather_line(label, *future.result())
+                    except Exception as e:
+                        logger.error("Failed to get weather for %s: %s", label, str(e))
+                        yield {'location': label, 'error': str(e)}
+        finally:
+            # The consumer stopped early, e.g. the client disconnected
+            for future in in_flight:
+                future.cancel()
+
+    def refresh_all_favorites(self, deadline: float | None = None) -> dict:
+        """
+        Fetch the current weather for every favorite location concurrently.
+
+        Locations are fetched on the shared refresh pool, in copies of the caller's context so
+        the upstream priority carries over. Whatever has finished when the deadline passes is
+        saved and returned; the rest are reported as timed out, keep their previous weather and
+        are cancelled if they have not started, so they do not hold the pool.
+
+        Args:
+            deadline (float | None): seconds to wait for the whole batch, defaults to WEATHER_REFRESH_DEADLINE.
+
+        Returns:
+            dict: the refreshed 'weather' per location label, the 'timed_out' locations and the 'failed'
+            locations with their errors.
+
+        Raises:
+            ValueError: If the favorites dictionary is empty.
+        """
+        records = self._records()
+        if len(records) == 0:
+            raise ValueError("No locations saved in favorites.")
+        if deadline is None:
+            deadline = float(os.getenv("WEATHER_REFRESH_DEADLINE", "5"))
+
+        logger.info("Refreshing weather for %d favorites.", len(records))
+        executor = get_refresh_executor()
+        futures = {executor.submit(contextvars.copy_context().run, self.get_weather_api, key, True): position
+                   for position, key in enumerate(records.keys)}
+        done, not_done = wait(futures, timeout=deadline)
+        for future in not_done:
+            future.cancel()
+
+        weather, failed = {}, {}
+        for future in done:
+            position = futures[future]
+            label = records.labels[position]
+            try:
+                temp, wind, precipitation, humidity = future.result()
+            except Exception as e:
+                logger.error("Failed to refresh weather for %s: %s", label, str(e))
+                failed[label] = str(e)
+                continue
+            self._save_weather(resolve_location(records.keys[position]).id, temp, wind, precipitation, humidity)
+            weather[label] = {'temp': temp, 'wind': wind, 'precipitation': precipitation, 'humidity': humidity}
+        db.session.commit()
+
+        timed_out = [records.labels[futures[future]] for future in not_done]
+        if timed_out:
+            logger.warning("Refresh deadline of %ss passed before %d locations finished.", deadline, len(timed_out))
+        return {'weather': weather, 'timed_out': timed_out, 'failed': failed}
 
     def get_all_favorites(self) -> list[str]:
         """
@@ -138,38 +456,43 @@ class FavoritesModel:
         Raises:
             ValueError: if the favorites dictionary is empty.
         """
-        if len(self.favorites) == 0:
+        records = self._records()
+        if len(records) == 0:
             raise ValueError("Favorites dictionary is empty.")
-        
-        fav_locations = []
 
-        for location in self.favorites:
-            fav_locations.append(location)
-        
-        return fav_locations
+        return list(records.labels)
 
-    def get_favorite_historical(self, location: str, temp: float, wind: float, precipitation: float, humidity: int) -> dict: 
+    def get_favorite_historical(self, location: str, start: int | None = None, end: int | None = None,
+                                resolution: str = 'raw') -> dict: 
         """
         Get the historical temperature, wind, precipitation, and humidity for a favorite location.
 
+        History is recorded from every upstream weather fetch, so no upstream call is made here.
+
         Args:
             location (str): the location of the historical weather to be retrieved.
-            temp (float): the location's temperature in Farenheit.
-            wind (float): the location's wind speed in miles per hour.
-            precipitation (float): the location's precipitation in inches.
-            humidity (int): the location's humidity.
+            start (int | None): the unix time to start from, defaults to 24 hours before end.
+            end (int | None): the unix time to stop at, defaults to now.
+            resolution (str): 'raw' for every observation, or 'hour'/'day' for min/max/mean per bucket.
 
         Returns:
             dict: a dictionary containing the historical weather for the favorite location.
 
         Raises:
-            ValueError: if the location has not be saved in favorites.
+            ValueError: if the location has not be saved in favorites, or the range or resolution is invalid.
         """
-        if location in self.favorites:
-            logger.info(f"retrieving historical weather for {location}.")
-
-            weather = {'temp': temp, 'wind': wind, 'precipitation': precipitation, 'humidity': humidity}
-            return weather
+        found = self._find(location)
+        if found is not None:
+            logger.info("retrieving historical weather for %s.", location)
+
+            end = int(time.time()) if end is None else int(end)
+            start = end - 86400 if start is None else int(start)
+            if start >= end:
+                raise ValueError(f"Invalid range: start {start} should be before end {end}.")
+            records, position = found
+            observations = get_history_store().query(records.keys[position], start, end, resolution)
+            return {'location': location, 'start': start, 'end': end, 'resolution': resolution,
+                    'observations': observations}
         else:
             raise ValueError(f"{location} not found in Favorites.")
     
@@ -177,11 +500,21 @@ class FavoritesModel:
         """
         Get the 5 day forecast for a favorite location.
 
+        Forecasts are cached in compact form until the next forecast model run.
+
         Args:
             location (str): the location of the forecast to be retrieved.
 
         Returns:
-            dict: a dictionary of the temperature for each day.
+            dict: a dictionary of the temperature, wind, precipitation, humidity and condition for each day.
+
+        Raises:
+            ValueError: if the location has not been saved in favorites.
         """
-        
-        pass
\ No newline at end of file
+        found = self._find(location)
+        if found is None:
+            raise ValueError(f"{location} not found in Favorites.")
+
+        logger.info("retrieving 5 day forecast for %s.", location)
+        records, position = found
+        return forecast_store.get(records.keys[position]).to_dict()
@@ -0,0 +1,227 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable
+
+from utils.cache import TTLCache
+from utils.logger import configure_logger
+from weather.clients.weather_client import get_weather_client
+from weather.models.location_index import resolve_location
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+FORECAST_DAYS = 5
+
+# Condition texts repeat across every location and day, so each is kept once and
+# forecasts store the small integer code
+_condition_texts: dict[int, str] = {}
+_condition_lock = threading.Lock()
+
+
+def next_model_run(now: float, run_hours: int = 6, lag: float = 3600.0) -> float:
+    """
+    Get when the next forecast model run becomes available.
+
+    Global forecast models run every few hours starting at 00 UTC and their output reaches
+    the upstream some time after the run starts, so a cached forecast stays current until
+    the next run plus that lag.
+
+    Args:
+        now (float): the current unix time.
+        run_hours (int): the hours between model runs.
+        lag (float): the seconds between a run starting and its forecast being served upstream.
+
+    Returns:
+        float: the unix time after which a forecast fetched at now is outdated.
+    """
+    current = datetime.fromtimestamp(now - lag, tz=timezone.utc)
+    run_start = current.replace(hour=current.hour - current.hour % run_hours, minute=0, second=0, microsecond=0)
+    return (run_start + timedelta(hours=run_hours)).timestamp() + lag
+
+
+class CompactForecast:
+    """
+    A multi-day forecast for one location, holding only the fields we serve.
+
+    Each field is a typed array with one slot per day (or per hour for hourly_temp),
+    instead of the upstream's nested dict per day and per hour.
+
+    Attributes:
+        location (str): The normalized location.
+        fetched_at (float): The unix time the forecast was fetched.
+        expires_at (float): The unix time of the next model run.
+        raw_bytes (int): The size of the upstream response body the forecast was built from.
+    """
+
+    __slots__ = ('location', 'fetched_at', 'expires_at', 'raw_bytes', 'date_epoch', 'max_temp', 'min_temp',
+                 'avg_temp', 'max_wind', 'total_precip', 'avg_humidity', 'condition', 'hourly_temp')
+
+    def __init__(self, location: str, forecastdays: list[dict], fetched_at: float, expires_at: float, raw_bytes: int = 0):
+        """
+        Initializes the forecast from the upstream "forecastday" list.
+
+        Args:
+            location (str): the normalized location.
+            forecastdays (list[dict]): the forecast.forecastday list of a forecast.json response.
+            fetched_at (float): the unix time the forecast was fetched.
+            expires_at (float): the unix time of the next model run.
+            raw_bytes (int): the size of the upstream response body.
+        """
+        self.location = location
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+        self.raw_bytes = raw_bytes
+        self.date_epoch = array('q', (day['date_epoch'] for day in forecastdays))
+        self.max_temp = array('f', (day['day']['maxtemp_f'] for day in forecastdays))
+        self.min_temp = array('f', (day['day']['mintemp_f'] for day in forecastdays))
+        self.avg_temp = array('f', (day['day']['avgtemp_f'] for day in forecastdays))
+        self.max_wind = array('f', (day['day']['maxwind_mph'] for day in forecastdays))
+        self.total_precip = array('f', (day['day']['totalprecip_in'] for day in forecastdays))
+        self.avg_humidity = array('B', (int(round(day['day']['avghumidity'])) for day in forecastdays))
+        self.condition = array('H')
+        for day in forecastdays:
+            condition = day['day']['condition']
+            with _condition_lock:
+                _condition_texts.setdefault(condition['code'], condition['text'])
+            self.condition.append(condition['code'])
+        self.hourly_temp = array('f', (hour['temp_f'] for day in forecastdays for hour in day['hour']))
+
+    def __len__(self) -> int:
+        return len(self.date_epoch)
+
+    def nbytes(self) -> int:
+        """
+        Get the memory held by this forecast.
+
+        Returns:
+            int: the size in bytes of the object and its arrays.
+        """
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, field)) for field in (
+            'date_epoch', 'max_temp', 'min_temp', 'avg_temp', 'max_wind', 'total_precip',
+            'avg_humidity', 'condition', 'hourly_temp'))
+
+    def to_dict(self) -> dict:
+        """
+        Materialize the forecast for a response.
+
+        Returns:
+            dict: the location, fetch and expiry times, and one entry per day.
+        """
+        hours_per_day = len(self.hourly_temp) // len(self) if len(self) else 0
+        days = []
+        for index in range(len(self)):
+            hourly = self.hourly_temp[index * hours_per_day:(index + 1) * hours_per_day]
+            days.append({
+                'date': datetime.fromtimestamp(self.date_epoch[index], tz=timezone.utc).strftime('%Y-%m-%d'),
+                'max_temp': round(self.max_temp[index], 1),
+                'min_temp': round(self.min_temp[index], 1),
+                'avg_temp': round(self.avg_temp[index], 1),
+                'max_wind': round(self.max_wind[index], 1),
+                'total_precipitation': round(self.total_precip[index], 2),
+                'avg_humidity': self.avg_humidity[index],
+                'condition': _condition_texts.get(self.condition[index], ''),
+                'hourly_temp': [round(temp, 1) for temp in hourly],
+            })
+        return {'location': self.location, 'fetched_at': self.fetched_at, 'expires_at': self.expires_at, 'days': days}
+
+
+class ForecastStore:
+    """
+    A cache of compact forecasts that refreshes on forecast model-run boundaries.
+
+    Entries are kept until the next model run rather than for a fixed time, since the
+    upstream forecast does not change between runs. Concurrent misses for one location
+    share a single upstream call.
+
+    Attributes:
+        days (int): The number of forecast days fetched per location.
+        run_hours (int): The hours between forecast model runs.
+        lag (float): The seconds between a run starting and its forecast being served upstream.
+    """
+
+    def __init__(self, maxsize: int = 512, days: int = FORECAST_DAYS, run_hours: int = 6, lag: float = 3600.0,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initializes the store.
+
+        Args:
+            maxsize (int): the maximum number of locations kept.
+            days (int): the number of forecast days fetched per location.
+            run_hours (int): the hours between forecast model runs.
+            lag (float): the seconds between a run starting and its forecast being served upstream.
+            clock (Callable[[], float]): the unix time source, replaceable in tests.
+        """
+        self.days = days
+        self.run_hours = run_hours
+        self.lag = lag
+        self._clock = clock
+        # Expiry is decided per entry by the model-run boundary, so the LRU ttl is only a backstop
+        self._cache = TTLCache(maxsize=maxsize, ttl=run_hours * 3600 + lag)
+
+    def get(self, location: str) -> CompactForecast:
+        """
+        Get the forecast for a location, fetching it if missing or past its model run.
+
+        Args:
+            location (str): the location to retrieve the forecast for.
+
+        Returns:
+            CompactForecast: the forecast.
+
+        Raises:
+            ValueError: if the location does not match any known place.
+        """
+        key = resolve_location(location).key
+        forecast = self._cache.get_or_load(key, lambda: self._fetch(key))
+        if forecast.expires_at <= self._clock():
+            forecast = self._cache.get_or_load(key, lambda: self._fetch(key), force=True)
+        return forecast
+
+    def _fetch(self, location: str) -> CompactForecast:
+        """Call the forecast api for a location and compact the response."""
+        logger.info("Fetching %d day forecast for %s from weatherapi.", self.days, location)
+        response = get_weather_client().get(
+            "forecast.json", {"q": location, "days": self.days, "aqi": "no", "alerts": "no"})
+        response.raise_for_status()
+        now = self._clock()
+        return CompactForecast(
+            location,
+            response.json()['forecast']['forecastday'],
+            fetched_at=now,
+            expires_at=next_model_run(now, self.run_hours, self.lag),
+            raw_bytes=len(response.content),
+        )
+
+    def clear(self) -> None:
+        """Drop every cached forecast."""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters and the memory held per location.
+
+        Returns:
+            dict: the cache counters, total and per-location bytes, and the upstream bytes they replace.
+        """
+        forecasts = self._cache.values()
+        total = sum(forecast.nbytes() for forecast in forecasts)
+        raw = sum(forecast.raw_bytes for forecast in forecasts)
+        return {
+            **self._cache.stats(),
+            'bytes': total,
+            'bytes_per_location': total // len(forecasts) if forecasts else 0,
+            'raw_bytes_per_location': raw // len(forecasts) if forecasts else 0,
+        }
+
+
+forecast_store = ForecastStore(
+    maxsize=int(os.getenv("FORECAST_CACHE_SIZE", "512")),
+    run_hours=int(os.getenv("FORECAST_RUN_HOURS", "6")),
+    lag=float(os.getenv("FORECAST_RUN_LAG", "3600")),
+)
@@ -0,0 +1,246 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Get the great-circle distance between two points.
+
+    Args:
+        lat1 (float): the first point's latitude.
+        lon1 (float): the first point's longitude.
+        lat2 (float): the second point's latitude.
+        lon2 (float): the second point's longitude.
+
+    Returns:
+        float: the distance in kilometres.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 \
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """
+    A thread-safe index of the coordinates of locations with a cached observation, for finding
+    the one nearest a point.
+
+    Points are bucketed on a grid of cells one radius tall, like geohash prefixes of a fixed
+    length, so a query only measures the points in its own cell and the cells around it.
+    Cells narrow towards the poles, so more of them are scanned east and west there. The
+    index holds keys and coordinates only: the caller looks the observation up, and a point
+    whose observation is gone or too old is skipped for the next nearest.
+
+    Attributes:
+        radius_km (float): The furthest a point may be from a query to answer it.
+        max_age (float): The oldest observation, in seconds, the caller should accept.
+        maxsize (int): The most points kept before dropping the least recently added.
+        queries (int): The number of nearest lookups made.
+        hits (int): The lookups answered by a point within the radius.
+    """
+
+    def __init__(self, radius_km: float = 2.0, max_age: float = 300.0, maxsize: int = 10000):
+        """
+        Initializes an empty index.
+
+        Args:
+            radius_km (float): the furthest a point may be from a query to answer it.
+            max_age (float): the oldest observation, in seconds, the caller should accept.
+            maxsize (int): the most points kept.
+
+        Raises:
+            ValueError: if the radius or maxsize is not positive, or max_age is negative.
+        """
+        if radius_km <= 0:
+            raise ValueError(f"Invalid radius_km: {radius_km}, should be positive.")
+        if max_age < 0:
+            raise ValueError(f"Invalid max_age: {max_age}, should not be negative.")
+        if maxsize <= 0:
+            raise ValueError(f"Invalid maxsize: {maxsize}, should be positive.")
+
+        self.radius_km = radius_km
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self._cell_degrees = radius_km / KM_PER_DEGREE
+        self._lon_cells = math.ceil(360 / self._cell_degrees)
+        self._lock = threading.Lock()
+        # key -> (lat, lon, cell), in the order the keys were added
+        self._points: OrderedDict[str, tuple[float, float, tuple[int, int]]] = OrderedDict()
+        self._cells: dict[tuple[int, int], set[str]] = {}
+
+        self.queries = 0
+        self.hits = 0
+        self._hit_distance_km = 0.0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        """Get the grid cell holding a point."""
+        return (math.floor((lat + 90) / self._cell_degrees),
+                math.floor((lon + 180) / self._cell_degrees) % self._lon_cells)
+
+    def _discard(self, key: str) -> None:
+        """Remove a point if present. Caller must hold the lock."""
+        point = self._points.pop(key, None)
+        if point is not None:
+            cell = self._cells[point[2]]
+            cell.discard(key)
+            if not cell:
+                del self._cells[point[2]]
+
+    def add(self, key: str, lat: float, lon: float) -> None:
+        """
+        Add or move a location's point, dropping the least recently added ones past maxsize.
+
+        Args:
+            key (str): the canonical key of the location.
+            lat (float): the location's latitude.
+            lon (float): the location's longitude.
+        """
+        cell = self._cell(lat, lon)
+        with self._lock:
+            self._discard(key)
+            self._points[key] = (lat, lon, cell)
+            self._cells.setdefault(cell, set()).add(key)
+            while len(self._points) > self.maxsize:
+                self._discard(next(iter(self._points)))
+
+    def remove(self, key: str) -> None:
+        """
+        Remove a location's point, if present.
+
+        Args:
+            key (str): the canonical key of the location.
+        """
+        with self._lock:
+            self._discard(key)
+
+    def within(self, lat: float, lon: float) -> list[tuple[float, str]]:
+        """
+        Find every point within the radius of a point.
+
+        Args:
+            lat (float): the query latitude.
+            lon (float): the query longitude.
+
+        Returns:
+            list[tuple[float, str]]: the distance in kilometres and key of each point, nearest first.
+        """
+        row, column = self._cell(lat, lon)
+        # A cell spans less than a radius east to west away from the equator
+        cos_lat = max(math.cos(math.radians(min(90.0, abs(lat) + self._cell_degrees))), 1e-9)
+        span = math.ceil(1 / cos_lat)
+        columns = range(self._lon_cells) if 2 * span + 1 >= self._lon_cells \
+            else [(column + offset) % self._lon_cells for offset in range(-span, span + 1)]
+        found = []
+        with self._lock:
+            for cell_row in (row - 1, row, row + 1):
+                for cell_column in columns:
+                    for key in self._cells.get((cell_row, cell_column), ()):
+                        point_lat, point_lon, _ = self._points[key]
+                        distance = haversine_km(lat, lon, point_lat, point_lon)
+                        if distance <= self.radius_km:
+                            found.append((distance, key))
+        found.sort()
+        return found
+
+    def nearest(self, lat: float, lon: float, lookup: Callable[[str], Any]) -> tuple[str, Any, float] | None:
+        """
+        Find the nearest point within the radius whose observation can still be used.
+
+        Args:
+            lat (float): the query latitude.
+            lon (float): the query longitude.
+            lookup (Callable[[str], Any]): gets a key's observation, or None if it is gone or too old.
+
+        Returns:
+            tuple[str, Any, float] | None: the key, its observation and its distance in kilometres,
+            or None if no point within the radius has a usable observation.
+        """
+        for distance, key in self.within(lat, lon):
+            observation = lookup(key)
+            if observation is not None:
+                with self._lock:
+                    self.queries += 1
+                    self.hits += 1
+                    self._hit_distance_km += distance
+                return key, observation, distance
+        with self._lock:
+            self.queries += 1
+        return None
+
+    def clear(self) -> None:
+        """Remove every point."""
+        with self._lock:
+            self._points.clear()
+            self._cells.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the index's configuration and counters.
+
+        Returns:
+            dict: the points held, cells in use, radius, freshness bound, lookups made, how many
+            were answered from a nearby observation, and the mean distance of those answers.
+        """
+        with self._lock:
+            return {
+                'size': len(self._points),
+                'cells': len(self._cells),
+                'maxsize': self.maxsize,
+                'radius_km': self.radius_km,
+                'max_age': self.max_age,
+                'queries': self.queries,
+                'hits': self.hits,
+                'misses': self.queries - self.hits,
+                'hit_rate': round(self.hits / self.queries, 4) if self.queries else 0.0,
+                'mean_hit_distance_km': round(self._hit_distance_km / self.hits, 3) if self.hits else 0.0,
+            }
+
+
+_geo_index: GeoIndex | None = None
+_geo_index_lock = threading.Lock()
+
+
+def get_geo_index() -> GeoIndex:
+    """
+    Get the process-wide geo index, creating it on first use.
+
+    The index is configured from GEO_RADIUS_KM, GEO_MAX_AGE (defaulting to WEATHER_CACHE_TTL,
+    so only fresh observations are used) and GEO_INDEX_SIZE.
+
+    Returns:
+        GeoIndex: the shared index.
+    """
+    global _geo_index
+    if _geo_index is None:
+        with _geo_index_lock:
+            if _geo_index is None:
+                _geo_index = GeoIndex(
+                    radius_km=float(os.getenv("GEO_RADIUS_KM", "2")),
+                    max_age=float(os.getenv("GEO_MAX_AGE", os.getenv("WEATHER_CACHE_TTL", "300"))),
+                    maxsize=int(os.getenv("GEO_INDEX_SIZE", "10000")),
+                )
+    return _geo_index
+
+
+def set_geo_index(index: GeoIndex | None) -> None:
+    """
+    Replace the process-wide geo index, e.g. with an empty one in tests.
+
+    Args:
+        index (GeoIndex | None): the index to use, or None to create a new one on next use.
+    """
+    global _geo_index
+    with _geo_index_lock:
+        _geo_index = index
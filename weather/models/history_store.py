@@ -0,0 +1,267 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+RESOLUTIONS = {'raw': None, 'hour': 3600, 'day': 86400}
+
+# Values are stored as scaled integers, which SQLite packs into 1-3 bytes instead of 8 for a REAL
+TEMP_SCALE = 10  # tenths of a degree Farenheit
+WIND_SCALE = 10  # tenths of a mph
+PRECIP_SCALE = 100  # hundredths of an inch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS observations (
+    location_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    temp INTEGER NOT NULL,
+    wind INTEGER NOT NULL,
+    precipitation INTEGER NOT NULL,
+    humidity INTEGER NOT NULL,
+    PRIMARY KEY (location_id, ts)
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    """
+    An append-only store of weather observations per location, backed by SQLite.
+
+    Observations are clustered on (location, timestamp) so a range query for one location
+    reads one contiguous slice of the table. Old observations are compacted to hourly means
+    and eventually dropped.
+
+    Attributes:
+        path (str): The SQLite database path, or ":memory:".
+        raw_retention (int): Seconds raw observations are kept before being compacted to hourly means.
+        retention (int): Seconds any observation is kept.
+    """
+
+    def __init__(self, path: str, raw_retention: int = 7 * 86400, retention: int = 365 * 86400):
+        """
+        Initializes the store, creating its tables if needed.
+
+        Args:
+            path (str): the SQLite database path, or ":memory:".
+            raw_retention (int): seconds raw observations are kept before compaction.
+            retention (int): seconds any observation is kept.
+        """
+        self.path = path
+        self.raw_retention = raw_retention
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._location_ids: dict[str, int] = {}
+
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _location_id(self, location: str, create: bool) -> int | None:
+        """Get the id of a location, inserting it if create is set. Caller must hold the lock."""
+        if location in self._location_ids:
+            return self._location_ids[location]
+        row = self._conn.execute("SELECT id FROM locations WHERE name = ?", (location,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            row = (self._conn.execute("INSERT INTO locations (name) VALUES (?)", (location,)).lastrowid,)
+        self._location_ids[location] = row[0]
+        return row[0]
+
+    def record(self, location: str, temp: float, wind: float, precipitation: float, humidity: int,
+               ts: int | None = None) -> None:
+        """
+        Append an observation. Recording the same location and timestamp again replaces it.
+
+        Args:
+            location (str): the location observed.
+            temp (float): the temperature in Farenheit.
+            wind (float): the wind speed in mph.
+            precipitation (float): the precipitation in inches.
+            humidity (int): the humidity.
+            ts (int | None): the unix time of the observation, defaults to now.
+        """
+        ts = int(time.time()) if ts is None else int(ts)
+        with self._lock:
+            location_id = self._location_id(location, create=True)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?, ?)",
+                (location_id, ts, round(temp * TEMP_SCALE), round(wind * WIND_SCALE),
+                 round(precipitation * PRECIP_SCALE), int(humidity)),
+            )
+
+    def query(self, location: str, start: int, end: int, resolution: str = 'raw') -> list[dict]:
+        """
+        Get the observations for a location within a time range.
+
+        Args:
+            location (str): the location to read.
+            start (int): the unix time to start from, inclusive.
+            end (int): the unix time to stop at, exclusive.
+            resolution (str): 'raw' for every observation, or 'hour'/'day' for min/max/mean per bucket.
+
+        Returns:
+            list[dict]: the observations or buckets, oldest first.
+
+        Raises:
+            ValueError: if the resolution is not supported.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Invalid resolution: {resolution}, should be one of {', '.join(RESOLUTIONS)}.")
+
+        with self._lock:
+            location_id = self._location_id(location, create=False)
+            if location_id is None:
+                return []
+            if resolution == 'raw':
+                rows = self._conn.execute(
+                    "SELECT ts, temp, wind, precipitation, humidity FROM observations "
+                    "WHERE location_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                    (location_id, start, end),
+                ).fetchall()
+            else:
+                bucket = RESOLUTIONS[resolution]
+                rows = self._conn.execute(
+                    "SELECT ts / ? * ? AS bucket, "
+                    "MIN(temp), MAX(temp), AVG(temp), MIN(wind), MAX(wind), AVG(wind), "
+                    "MIN(precipitation), MAX(precipitation), AVG(precipitation), "
+                    "MIN(humidity), MAX(humidity), AVG(humidity), COUNT(*) "
+                    "FROM observations WHERE location_id = ? AND ts >= ? AND ts < ? "
+                    "GROUP BY bucket ORDER BY bucket",
+                    (bucket, bucket, location_id, start, end),
+                ).fetchall()
+
+        if resolution == 'raw':
+            return [{'time': ts, 'temp': temp / TEMP_SCALE, 'wind': wind / WIND_SCALE,
+                     'precipitation': precipitation / PRECIP_SCALE, 'humidity': humidity}
+                    for ts, temp, wind, precipitation, humidity in rows]
+
+        def summary(low, high, mean, scale):
+            return {'min': low / scale, 'max': high / scale, 'mean': round(mean / scale, 2)}
+
+        return [{'time': row[0],
+                 'temp': summary(*row[1:4], TEMP_SCALE),
+                 'wind': summary(*row[4:7], WIND_SCALE),
+                 'precipitation': summary(*row[7:10], PRECIP_SCALE),
+                 'humidity': summary(*row[10:13], 1),
+                 'count': row[13]}
+                for row in rows]
+
+    def compact(self, now: int | None = None) -> dict:
+        """
+        Apply retention: collapse raw observations older than raw_retention into one hourly
+        mean per location, and drop anything older than retention.
+
+        Args:
+            now (int | None): the unix time to measure retention from, defaults to now.
+
+        Returns:
+            dict: the number of rows 'compacted' into hourly means and 'dropped'.
+        """
+        now = int(time.time()) if now is None else int(now)
+        raw_cutoff = (now - self.raw_retention) // 3600 * 3600
+        cutoff = now - self.retention
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                dropped = self._conn.execute("DELETE FROM observations WHERE ts < ?", (cutoff,)).rowcount
+                # Hours that already hold a single row on the hour were compacted before
+                self._conn.execute(
+                    "CREATE TEMP TABLE hourly AS "
+                    "SELECT location_id, ts / 3600 * 3600 AS hour, ROUND(AVG(temp)) AS temp, ROUND(AVG(wind)) AS wind, "
+                    "ROUND(AVG(precipitation)) AS precipitation, ROUND(AVG(humidity)) AS humidity, COUNT(*) AS n, "
+                    "MAX(ts % 3600) AS offset FROM observations WHERE ts < ? GROUP BY location_id, hour",
+                    (raw_cutoff,),
+                )
+                self._conn.execute("DELETE FROM hourly WHERE n = 1 AND offset = 0")
+                compacted = self._conn.execute(
+                    "DELETE FROM observations WHERE ts < ? AND (location_id, ts / 3600 * 3600) IN "
+                    "(SELECT location_id, hour FROM hourly)",
+                    (raw_cutoff,),
+                ).rowcount
+                self._conn.execute(
+                    "INSERT INTO observations SELECT location_id, hour, temp, wind, precipitation, humidity FROM hourly")
+                self._conn.execute("DROP TABLE hourly")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._conn.execute("DROP TABLE IF EXISTS temp.hourly")
+                raise
+
+        if compacted or dropped:
+            logger.info("Compacted %d and dropped %d weather observations.", compacted, dropped)
+        return {'compacted': compacted, 'dropped': dropped}
+
+
+_history_store: HistoryStore | None = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """
+    Get the process-wide history store, opening it on first use.
+
+    The store is configured from HISTORY_DB_PATH, HISTORY_RAW_RETENTION_DAYS and HISTORY_RETENTION_DAYS.
+
+    Returns:
+        HistoryStore: the shared store.
+    """
+    global _history_store
+    if _history_store is None:
+        with _history_store_lock:
+            if _history_store is None:
+                _history_store = HistoryStore(
+                    os.getenv("HISTORY_DB_PATH", "db/history.db"),
+                    raw_retention=int(float(os.getenv("HISTORY_RAW_RETENTION_DAYS", "7")) * 86400),
+                    retention=int(float(os.getenv("HISTORY_RETENTION_DAYS", "365")) * 86400),
+                )
+    return _history_store
+
+
+def set_history_store(store: HistoryStore | None) -> None:
+    """
+    Replace the process-wide history store, e.g. with an in-memory one in tests.
+
+    Args:
+        store (HistoryStore | None): the store to use, or None to reopen from the environment on next use.
+    """
+    global _history_store
+    with _history_store_lock:
+        _history_store = store
+
+
+def record_observation(location: str, weather: tuple, ts: int | None = None) -> None:
+    """
+    Record a fetched observation in the history store. Failures are logged, never raised,
+    so history can not break a weather lookup.
+
+    Args:
+        location (str): the normalized location.
+        weather (tuple): the (temp, wind, precipitation, humidity) values.
+        ts (int | None): the upstream observation time, defaults to now.
+    """
+    try:
+        get_history_store().record(location, *weather, ts=ts)
+    except Exception as e:
+        logger.warning("Failed to record weather history for %s: %s", location, str(e))
@@ -0,0 +1,294 @@
+import logging
+import os
+import re
+import threading
+
+from utils.cache import TTLCache
+from utils.logger import configure_logger
+from utils.redis_cache import cache_get_json, cache_set_json
+from weather.clients.weather_client import get_weather_client
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+_COORDINATES = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+_CANONICAL_KEY = re.compile(r'^id:(\d+)$')
+
+
+def parse_coordinates(location: str) -> tuple[float, float] | None:
+    """
+    Parse a "lat,lon" location query.
+
+    Args:
+        location (str): the location as entered by the user.
+
+    Returns:
+        tuple[float, float] | None: the latitude and longitude, or None if the query is not a
+        valid coordinate pair.
+    """
+    match = _COORDINATES.match(str(location))
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def normalize_location(location: str) -> str:
+    """
+    Normalize a location query so that trivially different spellings share a cache entry.
+
+    Coordinates are rounded to two decimals (about a kilometre) so that nearby points
+    share an entry too.
+
+    Args:
+        location (str): the location as entered by the user.
+
+    Returns:
+        str: the location lowercased with surrounding and repeated whitespace removed.
+    """
+    match = _COORDINATES.match(str(location))
+    if match:
+        return f"{float(match.group(1)):.2f},{float(match.group(2)):.2f}"
+    return " ".join(str(location).split()).lower()
+
+
+class CanonicalLocation:
+    """
+    A location as identified by weatherapi.com.
+
+    Attributes:
+        id (int): The weatherapi.com location id.
+        name (str): The location's name.
+        region (str): The location's region or state.
+        country (str): The location's country.
+        lat (float): The location's latitude.
+        lon (float): The location's longitude.
+    """
+
+    __slots__ = ('id', 'name', 'region', 'country', 'lat', 'lon')
+
+    def __init__(self, id: int, name: str = '', region: str = '', country: str = '',
+                 lat: float | None = None, lon: float | None = None):
+        self.id = int(id)
+        self.name = name
+        self.region = region
+        self.country = country
+        self.lat = lat
+        self.lon = lon
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CanonicalLocation) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"CanonicalLocation({self.key}, {self.label!r})"
+
+    @property
+    def key(self) -> str:
+        """The canonical key every cache and store uses, also accepted by weatherapi as a query."""
+        return f"id:{self.id}"
+
+    @property
+    def label(self) -> str:
+        """The human readable name shown to users."""
+        return ", ".join(part for part in (self.name, self.region, self.country) if part) or self.key
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'name': self.name, 'region': self.region, 'country': self.country,
+                'lat': self.lat, 'lon': self.lon}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CanonicalLocation':
+        return cls(data['id'], data.get('name', ''), data.get('region', ''), data.get('country', ''),
+                   data.get('lat'), data.get('lon'))
+
+
+class LocationIndex:
+    """
+    Resolves free-text location queries to canonical weatherapi.com locations.
+
+    Lookups go through a local alias index, then the shared cache backend (so aliases
+    survive restarts and are shared across workers), and only then through weatherapi's
+    search api. Concurrent lookups of the same unknown alias share one search call.
+
+    Coordinates answered from a nearby observation are kept apart, in this process only and
+    for nearby_ttl seconds, so they stop resolving to that station once its observation would
+    no longer be used for them.
+
+    Attributes:
+        searches (int): The number of search api calls made.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 7 * 86400, nearby_ttl: float = 300.0):
+        """
+        Initializes the index.
+
+        Args:
+            maxsize (int): the maximum number of aliases kept in process.
+            ttl (float): seconds an alias is trusted before it is searched again.
+            nearby_ttl (float): seconds coordinates resolve to the location of a nearby observation.
+        """
+        self.ttl = ttl
+        self._aliases = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._nearby = TTLCache(maxsize=maxsize, ttl=nearby_ttl)
+        self._by_id: dict[int, CanonicalLocation] = {}
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def add(self, alias: str, location: CanonicalLocation) -> None:
+        """
+        Teach the index that an alias refers to a location.
+
+        Args:
+            alias (str): the free-text query.
+            location (CanonicalLocation): the location it resolves to.
+        """
+        with self._lock:
+            self._by_id[location.id] = location
+        self._aliases.set(normalize_location(alias), location)
+        self._aliases.set(normalize_location(location.label), location)
+
+    def add_nearby(self, coordinates: str, location: CanonicalLocation) -> None:
+        """
+        Teach the index, for nearby_ttl seconds, that coordinates were answered by a nearby location.
+
+        Args:
+            coordinates (str): the "lat,lon" query.
+            location (CanonicalLocation): the location whose observation answered it.
+        """
+        with self._lock:
+            self._by_id[location.id] = location
+        self._nearby.set(normalize_location(coordinates), location)
+
+    def resolve(self, query: str) -> CanonicalLocation:
+        """
+        Resolve a location query to its canonical location.
+
+        Args:
+            query (str): a free-text place name, postcode, "lat,lon" pair or canonical "id:<id>" key.
+
+        Returns:
+            CanonicalLocation: the resolved location.
+
+        Raises:
+            ValueError: if the query does not match any location.
+        """
+        alias = normalize_location(query)
+        match = _CANONICAL_KEY.match(alias)
+        if match:
+            with self._lock:
+                return self._by_id.get(int(match.group(1))) or CanonicalLocation(int(match.group(1)))
+        nearby = self._nearby.get(alias)
+        if nearby is not None:
+            return nearby
+        return self._aliases.get_or_load(alias, lambda: self._load(alias))
+
+    def lookup(self, query: str) -> CanonicalLocation | None:
+        """
+        Resolve a location query only if it can be answered without any I/O.
+
+        Args:
+            query (str): a free-text place name, postcode, "lat,lon" pair or canonical "id:<id>" key.
+
+        Returns:
+            CanonicalLocation | None: the resolved location, or None if resolve would have to search.
+        """
+        alias = normalize_location(query)
+        if _CANONICAL_KEY.match(alias):
+            return self.resolve(alias)
+        return self._nearby.get(alias) or self._aliases.get(alias)
+
+    def _load(self, alias: str) -> CanonicalLocation:
+        """Resolve an alias missing from the local index through the shared cache or the search api."""
+        cache_key = f"location:{alias}"
+        cached = cache_get_json(cache_key)
+        if cached is not None:
+            location = CanonicalLocation.from_dict(cached)
+        else:
+            location = self._search(alias)
+            cache_set_json(cache_key, location.to_dict(), int(self.ttl))
+        with self._lock:
+            self._by_id[location.id] = location
+        # The full label is what users see, so it is the spelling most likely to come back
+        if normalize_location(location.label) != alias:
+            self._aliases.set(normalize_location(location.label), location)
+        return location
+
+    def _search(self, alias: str) -> CanonicalLocation:
+        """Call the search api and take its best match."""
+        logger.info("Searching weatherapi for location %s.", alias)
+        self.searches += 1
+        response = get_weather_client().get("search.json", {"q": alias})
+        response.raise_for_status()
+        results = response.json()
+        if not results:
+            raise ValueError(f"{alias} did not match any location.")
+        return CanonicalLocation.from_dict(results[0])
+
+    def stats(self) -> dict:
+        """
+        Get the alias cache counters.
+
+        Returns:
+            dict: the alias cache counters, nearby coordinates held, known locations and search calls made.
+        """
+        with self._lock:
+            locations = len(self._by_id)
+        return {**self._aliases.stats(), 'nearby': len(self._nearby), 'locations': locations,
+                'searches': self.searches}
+
+
+_location_index: LocationIndex | None = None
+_location_index_lock = threading.Lock()
+
+
+def get_location_index() -> LocationIndex:
+    """
+    Get the process-wide location index, creating it on first use.
+
+    The index is configured from LOCATION_ALIAS_CACHE_SIZE and LOCATION_ALIAS_TTL, and keeps
+    coordinates answered by a nearby observation for GEO_MAX_AGE, like the geo index.
+
+    Returns:
+        LocationIndex: the shared index.
+    """
+    global _location_index
+    if _location_index is None:
+        with _location_index_lock:
+            if _location_index is None:
+                _location_index = LocationIndex(
+                    maxsize=int(os.getenv("LOCATION_ALIAS_CACHE_SIZE", "10000")),
+                    ttl=float(os.getenv("LOCATION_ALIAS_TTL", str(7 * 86400))),
+                    nearby_ttl=float(os.getenv("GEO_MAX_AGE", os.getenv("WEATHER_CACHE_TTL", "300"))),
+                )
+    return _location_index
+
+
+def set_location_index(index: LocationIndex | None) -> None:
+    """
+    Replace the process-wide location index, e.g. with a pre-seeded one in tests.
+
+    Args:
+        index (LocationIndex | None): the index to use, or None to create a new one on next use.
+    """
+    global _location_index
+    with _location_index_lock:
+        _location_index = index
+
+
+def resolve_location(query: str) -> CanonicalLocation:
+    """
+    Resolve a location query to its canonical location through the shared index.
+
+    Args:
+        query (str): the location query.
+
+    Returns:
+        CanonicalLocation: the resolved location.
+
+    Raises:
+        ValueError: if the query does not match any location.
+    """
+    return get_location_index().resolve(query)
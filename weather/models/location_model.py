@@ -0,0 +1,52 @@
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from weather.models.location_index import CanonicalLocation
+
+
+class Location(db.Model):
+    __tablename__ = 'locations'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # weatherapi.com location id
+    name = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False, default='')
+    country = db.Column(db.String(100), nullable=False, default='')
+    lat = db.Column(db.Float)
+    lon = db.Column(db.Float)
+
+    @property
+    def label(self) -> str:
+        """The human readable name shown to users."""
+        return self.to_canonical().label
+
+    def to_canonical(self) -> CanonicalLocation:
+        """
+        Get the canonical location for this row.
+
+        Returns:
+            CanonicalLocation: the location.
+        """
+        return CanonicalLocation(self.id, self.name, self.region, self.country, self.lat, self.lon)
+
+    @classmethod
+    def save_canonical(cls, location: CanonicalLocation) -> 'Location':
+        """
+        Insert a canonical location if it is not saved yet. Does not commit.
+
+        Args:
+            location (CanonicalLocation): the location to save.
+
+        Returns:
+            Location: the saved row.
+        """
+        row = db.session.get(cls, location.id)
+        if row is None:
+            row = cls(id=location.id, name=location.name or location.key, region=location.region,
+                      country=location.country, lat=location.lat, lon=location.lon)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(row)
+            except IntegrityError:
+                # Another request saved the same location first
+                row = db.session.get(cls, location.id)
+        return row
@@ -0,0 +1,290 @@
+import logging
+import os
+import threading
+from typing import Any
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db import db
+from utils.bloom import CountingBloomFilter
+from utils.logger import configure_logger
+from weather.models.account_model import User
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class UsernameIndex:
+    """
+    An in-memory membership filter over every username in the users table.
+
+    A username the filter has never seen is reported free without touching the database; only
+    possible matches are confirmed with the indexed query. The filter is built from the users
+    table on a background thread, rebuilt every refresh_interval seconds, and kept in sync with
+    every commit that creates or deletes users in this process. Users created by other workers
+    are only seen after the next rebuild, so a "free" answer is advisory: the unique constraint
+    on the users table stays the authority when the account is created. Until the filter is
+    built, every check runs the query.
+
+    Attributes:
+        error_rate (float): The target false positive rate of the filter.
+        refresh_interval (float): Seconds between rebuilds from the database, 0 to never rebuild.
+        checks (int): The number of availability checks made.
+        definitely_free (int): The checks answered by the filter alone.
+        false_positives (int): The checks the filter flagged that the database found free.
+        rebuilds (int): The number of times the filter was built from the database.
+    """
+
+    def __init__(self, error_rate: float = 0.01, refresh_interval: float = 300.0, min_capacity: int = 10_000):
+        """
+        Initializes the index. Nothing is read from the database until it is rebuilt.
+
+        Args:
+            error_rate (float): the acceptable false positive rate.
+            refresh_interval (float): seconds between rebuilds, 0 to never rebuild.
+            min_capacity (int): the smallest number of usernames the filter is sized for.
+        """
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.min_capacity = min_capacity
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._filter: CountingBloomFilter | None = None
+        self._changes_during_rebuild: list[tuple[bool, str]] | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.checks = 0
+        self.definitely_free = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+
+    @property
+    def built(self) -> bool:
+        """Whether the filter has been built from the database yet."""
+        return self._filter is not None
+
+    def rebuild(self) -> None:
+        """
+        Build the filter from every username in the database, sized to twice the current count.
+        Must run inside an app context.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._changes_during_rebuild = []
+            try:
+                count = db.session.query(db.func.count(User.id)).scalar()
+                bloom = CountingBloomFilter(max(self.min_capacity, 2 * count), self.error_rate)
+                for (username,) in db.session.query(User.username).yield_per(10_000):
+                    bloom.add(username)
+                with self._lock:
+                    # Commits that landed while the table was being read
+                    for added, username in self._changes_during_rebuild:
+                        (bloom.add if added else bloom.discard)(username)
+                    self._filter = bloom
+                    self.rebuilds += 1
+            finally:
+                with self._lock:
+                    self._changes_during_rebuild = None
+        logger.info("Built username index over %d users", len(bloom))
+
+    def might_exist(self, username: str) -> bool:
+        """
+        Check the filter alone.
+
+        Args:
+            username (str): the username to check.
+
+        Returns:
+            bool: False if the filter has never seen the username, True if it may be taken or
+            the filter is not built yet.
+        """
+        bloom = self._filter
+        return bloom is None or username in bloom
+
+    def is_available(self, username: str) -> bool:
+        """
+        Check whether a username is free, querying the database only if the filter may contain it.
+
+        Args:
+            username (str): the username to check.
+
+        Returns:
+            bool: True if no user has the username, as far as this process knows for a username
+            the filter has never seen.
+        """
+        if not self.might_exist(username):
+            with self._lock:
+                self.checks += 1
+                self.definitely_free += 1
+            return True
+        built = self.built
+        taken = db.session.query(User.id).filter_by(username=username).first() is not None
+        with self._lock:
+            self.checks += 1
+            if built and not taken:
+                self.false_positives += 1
+        return not taken
+
+    def is_running(self) -> bool:
+        """Check whether the background thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self, app: Flask) -> None:
+        """
+        Build the filter, then rebuild it every refresh_interval until stop is called.
+
+        Args:
+            app (Flask): the app whose users table is read.
+        """
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    self.rebuild()
+            except Exception as e:
+                logger.error("Failed to build the username index: %s", str(e))
+            if not self.refresh_interval:
+                break
+            self._stop.wait(self.refresh_interval)
+
+    def start(self, app: Flask) -> None:
+        """
+        Build and refresh the filter on a daemon thread inside this process.
+
+        Args:
+            app (Flask): the app whose users table is read.
+        """
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(app,), name="username-index", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Stop refreshing the filter after the current rebuild.
+
+        Args:
+            timeout (float | None): seconds to wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def add(self, *usernames: str) -> None:
+        """
+        Record usernames that now exist. Ignored until the filter is built, since the build reads them.
+
+        Args:
+            usernames (str): the usernames created.
+        """
+        self._apply(True, usernames)
+
+    def discard(self, *usernames: str) -> None:
+        """
+        Record usernames that no longer exist. Ignored until the filter is built.
+
+        Args:
+            usernames (str): the usernames deleted.
+        """
+        self._apply(False, usernames)
+
+    def _apply(self, added: bool, usernames: tuple[str, ...]) -> None:
+        with self._lock:
+            if self._changes_during_rebuild is not None:
+                self._changes_during_rebuild.extend((added, username) for username in usernames)
+            if self._filter is not None:
+                for username in usernames:
+                    (self._filter.add if added else self._filter.discard)(username)
+
+    def stats(self) -> dict:
+        """
+        Get the index counters.
+
+        Returns:
+            dict: the availability checks made, how many the filter answered alone, its false
+            positives and rebuilds, and the filter's sizing once built.
+        """
+        bloom = self._filter
+        return {
+            'checks': self.checks,
+            'definitely_free': self.definitely_free,
+            'false_positives': self.false_positives,
+            'rebuilds': self.rebuilds,
+            'filter': bloom.stats() if bloom is not None else None,
+        }
+
+
+_username_index: UsernameIndex | None = None
+_username_index_lock = threading.Lock()
+
+
+def get_username_index() -> UsernameIndex:
+    """
+    Get the process-wide username index, creating it on first use.
+
+    The index is configured from USERNAME_INDEX_ERROR_RATE, USERNAME_INDEX_REFRESH and
+    USERNAME_INDEX_MIN_CAPACITY.
+
+    Returns:
+        UsernameIndex: the shared index.
+    """
+    global _username_index
+    if _username_index is None:
+        with _username_index_lock:
+            if _username_index is None:
+                _username_index = UsernameIndex(
+                    error_rate=float(os.getenv("USERNAME_INDEX_ERROR_RATE", "0.01")),
+                    refresh_interval=float(os.getenv("USERNAME_INDEX_REFRESH", "300")),
+                    min_capacity=int(os.getenv("USERNAME_INDEX_MIN_CAPACITY", "10000")),
+                )
+    return _username_index
+
+
+def set_username_index(index: UsernameIndex | None) -> None:
+    """
+    Replace the process-wide username index, e.g. with a fresh one in tests.
+
+    Args:
+        index (UsernameIndex | None): the index to use, or None to create a new one on next use.
+    """
+    global _username_index
+    with _username_index_lock:
+        _username_index = index
+
+
+####################################################
+#
+# Sync on commit
+#
+####################################################
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_username_changes(session: Session, flush_context: Any) -> None:
+    """Record the usernames created or deleted by this flush until the transaction commits."""
+    created = [instance.username for instance in session.new if isinstance(instance, User)]
+    deleted = [instance.username for instance in session.deleted if isinstance(instance, User)]
+    if created or deleted:
+        pending = session.info.setdefault('username_changes', ([], []))
+        pending[0].extend(created)
+        pending[1].extend(deleted)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_username_changes(session: Session) -> None:
+    """Push the recorded usernames to the index."""
+    pending = session.info.pop('username_changes', None)
+    if pending and _username_index is not None:
+        _username_index.add(*pending[0])
+        _username_index.discard(*pending[1])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_username_changes(session: Session) -> None:
+    """Forget the usernames recorded by a rolled back transaction."""
+    session.info.pop('username_changes', None)
@@ -0,0 +1,145 @@
+import logging
+import os
+import random
+import threading
+
+from flask import Flask
+
+from utils.logger import configure_logger
+from weather.clients.upstream_scheduler import Priority, upstream_priority
+from weather.models.current_weather import get_current_weather_bulk
+from weather.models.favorites_manager import get_favorited_locations, save_location_weather
+from weather.models.history_store import get_history_store
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class WeatherPrewarmer:
+    """
+    Keeps the weather of every favorited location warm in the background.
+
+    Each cycle collects the distinct favorited locations across all users, fetches them
+    through the bulk weather api (which also refreshes the weather cache and records
+    history), and saves the result on every matching favorite. It then applies the
+    history store's retention. Its upstream calls wait behind interactive ones under the
+    rate limit. Cycles are spaced by the interval plus or minus a
+    random jitter so that several instances do not hit the upstream in lockstep.
+
+    Attributes:
+        app (Flask): The app whose database holds the favorites.
+        interval (float): The average number of seconds between cycles.
+        jitter (float): The fraction of the interval randomly added or removed per cycle.
+    """
+
+    def __init__(self, app: Flask, interval: float = 240.0, jitter: float = 0.1):
+        """
+        Initializes the prewarmer.
+
+        Args:
+            app (Flask): the app whose database holds the favorites.
+            interval (float): the average number of seconds between cycles.
+            jitter (float): the fraction of the interval randomly added or removed per cycle.
+
+        Raises:
+            ValueError: if the interval is not positive or the jitter is not between 0 and 1.
+        """
+        if interval <= 0:
+            raise ValueError(f"Invalid interval: {interval}, should be positive.")
+        if not 0 <= jitter < 1:
+            raise ValueError(f"Invalid jitter: {jitter}, should be between 0 and 1.")
+
+        self.app = app
+        self.interval = interval
+        self.jitter = jitter
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def next_delay(self) -> float:
+        """
+        Get the number of seconds to wait before the next cycle.
+
+        Returns:
+            float: the interval with jitter applied.
+        """
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def refresh_once(self) -> dict:
+        """
+        Run one refresh cycle.
+
+        Returns:
+            dict: the number of 'locations' fetched, 'failed' locations and favorites 'updated'.
+        """
+        with self.app.app_context(), upstream_priority(Priority.BACKGROUND):
+            locations = get_favorited_locations()
+            if not locations:
+                return {'locations': 0, 'failed': 0, 'updated': 0}
+
+            logger.info("Prewarming weather for %d favorited locations.", len(locations))
+            weather = get_current_weather_bulk(locations, refresh=True)
+            failed = [location for location, values in weather.items() if isinstance(values, Exception)]
+            for location in failed:
+                logger.warning("Failed to prewarm %s: %s", location, str(weather[location]))
+            updated = save_location_weather(weather)
+            try:
+                get_history_store().compact()
+            except Exception as e:
+                logger.error("Failed to compact weather history: %s", str(e))
+            return {'locations': len(locations), 'failed': len(failed), 'updated': updated}
+
+    def run(self) -> None:
+        """Run refresh cycles until stop is called. Errors are logged and the next cycle still runs."""
+        logger.info("Weather prewarmer started with a %ss interval.", self.interval)
+        while not self._stop.is_set():
+            try:
+                self.refresh_once()
+            except Exception as e:
+                logger.error("Weather prewarm cycle failed: %s", str(e))
+            self._stop.wait(self.next_delay())
+        logger.info("Weather prewarmer stopped.")
+
+    def start(self) -> None:
+        """Run the prewarmer on a daemon thread inside this process."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="weather-prewarmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Stop the prewarmer after the current cycle.
+
+        Args:
+            timeout (float | None): seconds to wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def prewarmer_from_env(app: Flask) -> WeatherPrewarmer:
+    """
+    Build a prewarmer configured by PREWARM_INTERVAL and PREWARM_JITTER.
+
+    Args:
+        app (Flask): the app whose database holds the favorites.
+
+    Returns:
+        WeatherPrewarmer: the configured prewarmer.
+    """
+    return WeatherPrewarmer(
+        app,
+        interval=float(os.getenv("PREWARM_INTERVAL", "240")),
+        jitter=float(os.getenv("PREWARM_JITTER", "0.1")),
+    )
+
+
+if __name__ == '__main__':
+    # Run as a separate process: python -m weather.prewarmer
+    from app_init import app
+
+    prewarmer_from_env(app).run()
@@ -0,0 +1,260 @@
+"""
+Bulk import and export of users as newline-delimited JSON.
+
+Import records either carry a plain password to hash, {"username": ..., "password": ...}, or an
+already hashed one as written by export, {"username": ..., "salt": ..., "password_hash": ...}.
+
+Usage:
+    python -m weather.user_transfer import users.ndjson [--batch-size 5000] [--workers 0]
+    python -m weather.user_transfer export users.ndjson
+"""
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import json
+import logging
+import os
+import sys
+from typing import Iterable, Iterator
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import db
+from utils.logger import configure_logger
+from weather.models.account_model import User
+from weather.models.username_index import get_username_index
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+# Dialects that can skip duplicate usernames inside the INSERT itself
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def import_batch_size() -> int:
+    """Rows inserted per transaction, read from USER_IMPORT_BATCH_SIZE."""
+    return int(os.getenv("USER_IMPORT_BATCH_SIZE", "5000"))
+
+
+def parse_records(lines: Iterable[str | bytes]) -> Iterator[dict | None]:
+    """
+    Parse newline-delimited JSON records, skipping blank lines.
+
+    Args:
+        lines (Iterable[str | bytes]): the lines of the input.
+
+    Yields:
+        dict | None: each record, or None for a line that is not a JSON object.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield record if isinstance(record, dict) else None
+
+
+def _validate(record: dict | None) -> dict | None:
+    """Get the row a record describes, or None if it is invalid."""
+    if record is None:
+        return None
+    username = record.get('username')
+    if not isinstance(username, str) or not 0 < len(username) <= 80:
+        return None
+    if isinstance(record.get('password'), str):
+        return {'username': username, 'password': record['password']}
+    salt, password_hash = record.get('salt'), record.get('password_hash')
+    if isinstance(salt, str) and isinstance(password_hash, str) and len(salt) <= 32 and len(password_hash) <= 64:
+        return {'username': username, 'salt': salt, 'password': password_hash}
+    return None
+
+
+def _hash_passwords(passwords: list[str]) -> list[tuple[str, str]]:
+    """Salt and hash a batch of passwords. Runs in a worker process when a pool is used."""
+    return [User._generate_hashed_password(password) for password in passwords]
+
+
+def _apply_hashes(rows: list[dict], hashes: list[tuple[str, str]]) -> list[dict]:
+    """Replace the plain passwords of a batch with their salts and hashes, in order."""
+    hashes = iter(hashes)
+    for row in rows:
+        if 'salt' not in row:
+            row['salt'], row['password'] = next(hashes)
+    return rows
+
+
+def _insert_batch(rows: list[dict]) -> int:
+    """
+    Insert a batch of users in one transaction, skipping usernames that already exist.
+
+    Duplicates are detected by the database: on SQLite and PostgreSQL the INSERT skips
+    conflicting usernames and returns the usernames it inserted; elsewhere the existing usernames
+    of the batch are selected first.
+
+    Args:
+        rows (list[dict]): the users, with username, salt and hashed password.
+
+    Returns:
+        int: the number of users inserted.
+    """
+    # Keep the first occurrence of a username repeated within the batch
+    unique = {}
+    for row in rows:
+        unique.setdefault(row['username'], row)
+    unique = list(unique.values())
+    table = User.__table__
+    try:
+        upsert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+        if upsert is not None:
+            statement = upsert(table).on_conflict_do_nothing(index_elements=['username']).returning(table.c.username)
+            inserted = list(db.session.scalars(statement, unique))
+        else:
+            existing = set(db.session.scalars(
+                select(table.c.username).where(table.c.username.in_([row['username'] for row in unique]))))
+            unique = [row for row in unique if row['username'] not in existing]
+            if unique:
+                db.session.execute(insert(table), unique)
+            inserted = [row['username'] for row in unique]
+        db.session.commit()
+        # Core inserts bypass the session's unit of work, so the username index is told directly
+        get_username_index().add(*inserted)
+        return len(inserted)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _batches(records: Iterable[dict | None], batch_size: int) -> Iterator[tuple[list[dict], int]]:
+    """Group records into batches of valid rows, each with the number of invalid records skipped."""
+    rows, invalid = [], 0
+    for record in records:
+        row = _validate(record)
+        if row is None:
+            invalid += 1
+        else:
+            rows.append(row)
+        if len(rows) + invalid >= batch_size:
+            yield rows, invalid
+            rows, invalid = [], 0
+    if rows or invalid:
+        yield rows, invalid
+
+
+def import_users(records: Iterable[dict | None], batch_size: int | None = None, workers: int = 0) -> Iterator[dict]:
+    """
+    Import users in batches, one transaction per batch.
+
+    With workers, passwords are hashed in a process pool a few batches ahead of the batch
+    being inserted, so hashing overlaps with the database writes. Only the command line offers
+    a pool: a salted SHA-256 is cheap enough that hashing in this process is usually as fast,
+    and a web worker should not fork processes of its own.
+
+    Args:
+        records (Iterable[dict | None]): the records to import, e.g. from parse_records.
+        batch_size (int | None): the number of records per transaction, by default USER_IMPORT_BATCH_SIZE.
+        workers (int): the number of hashing processes, or 0 to hash in this process.
+
+    Yields:
+        dict: the running totals after each batch: processed, inserted, skipped (usernames
+            that already existed or repeated) and invalid records.
+
+    Raises:
+        ValueError: if the batch size is not positive or workers is negative.
+    """
+    batch_size = batch_size or import_batch_size()
+    if batch_size <= 0:
+        raise ValueError(f"Invalid batch size: {batch_size}, should be positive.")
+    if workers < 0:
+        raise ValueError(f"Invalid workers: {workers}, should not be negative.")
+
+    progress = {'processed': 0, 'inserted': 0, 'skipped': 0, 'invalid': 0}
+
+    def record_batch(rows: list[dict], invalid: int) -> dict:
+        inserted = _insert_batch(rows) if rows else 0
+        progress['processed'] += len(rows) + invalid
+        progress['inserted'] += inserted
+        progress['skipped'] += len(rows) - inserted
+        progress['invalid'] += invalid
+        logger.info("Imported %d of %d users", progress['inserted'], progress['processed'])
+        return dict(progress)
+
+    if not workers:
+        for rows, invalid in _batches(records, batch_size):
+            passwords = [row['password'] for row in rows if 'salt' not in row]
+            yield record_batch(_apply_hashes(rows, _hash_passwords(passwords)), invalid)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque[tuple[list[dict], int, Future]] = deque()
+        for rows, invalid in _batches(records, batch_size):
+            passwords = [row['password'] for row in rows if 'salt' not in row]
+            pending.append((rows, invalid, pool.submit(_hash_passwords, passwords)))
+            if len(pending) > workers:
+                rows, invalid, hashes = pending.popleft()
+                yield record_batch(_apply_hashes(rows, hashes.result()), invalid)
+        while pending:
+            rows, invalid, hashes = pending.popleft()
+            yield record_batch(_apply_hashes(rows, hashes.result()), invalid)
+
+
+def export_users(batch_size: int | None = None) -> Iterator[dict]:
+    """
+    Export every user with their salt and hashed password, in id order.
+
+    Users are read a batch at a time by id range, so the table is never loaded at once and
+    no cursor is held open between batches.
+
+    Args:
+        batch_size (int | None): the number of users read per query, by default USER_IMPORT_BATCH_SIZE.
+
+    Yields:
+        dict: each user as an import record: username, salt and password_hash.
+    """
+    batch_size = batch_size or import_batch_size()
+    table = User.__table__
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.username, table.c.salt, table.c.password)
+            .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)).all()
+        if not rows:
+            return
+        for row in rows:
+            yield {'username': row.username, 'salt': row.salt, 'password_hash': row.password}
+        last_id = rows[-1].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="import users from newline-delimited JSON")
+    import_parser.add_argument('path', help="the file to read, or - for stdin")
+    import_parser.add_argument('--batch-size', type=int, default=None, help="records per transaction")
+    import_parser.add_argument('--workers', type=int, default=0,
+                               help="password hashing processes, by default 0 to hash in this process")
+    export_parser = commands.add_parser('export', help="export users as newline-delimited JSON")
+    export_parser.add_argument('path', help="the file to write, or - for stdout")
+    args = parser.parse_args()
+
+    from app_init import app
+
+    with app.app_context():
+        if args.command == 'import':
+            source = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8')
+            with source:
+                for progress in import_users(parse_records(source), args.batch_size, args.workers):
+                    print(json.dumps(progress), file=sys.stderr)
+        else:
+            target = sys.stdout if args.path == '-' else open(args.path, 'w', encoding='utf-8')
+            with target:
+                for record in export_users():
+                    target.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()